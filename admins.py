@@ -1,5 +1,5 @@
 import logging
-import database
+import database_async
 
 
 def check_is_admin(user_id: int) -> bool:
@@ -8,26 +8,15 @@ def check_is_admin(user_id: int) -> bool:
     :param user_id: ID пользователя в Telegram
     :return: True если администратор, иначе False
     """
-    conn, cursor = database.postgre_init()
-    if conn is None or cursor is None:
-        logging.error('Ошибка подключения к БД')
-        return False
-
     try:
-        cursor.execute(
+        result = database_async.run_sync(database_async.fetch_one(
             'SELECT is_admin FROM users WHERE user_id = %s AND is_banned = FALSE',
             (user_id,)
-        )
-        result = cursor.fetchone()
+        ))
         return bool(result[0]) if result else False
     except Exception as error:
         logging.error(f'Ошибка проверки прав пользователя: {error}')
         return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 def get_admin_list() -> list:
@@ -35,22 +24,11 @@ def get_admin_list() -> list:
     Возвращает список администраторов.
     :return: Список ID администраторов
     """
-    conn, cursor = database.postgre_init()
-    if conn is None or cursor is None:
-        logging.error('Ошибка подключения к БД')
-        return []
-
     try:
-        cursor.execute(
+        result = database_async.run_sync(database_async.fetch_all(
             'SELECT user_id FROM users WHERE is_admin = TRUE AND is_banned = FALSE'
-        )
-        result = cursor.fetchall()
+        ))
         return [row[0] for row in result] if result else []
     except Exception as error:
         logging.error(f'Ошибка получения списка администраторов: {error}')
         return []
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Кэш ответов ИИ для adjust_sizing_with_ai.
+
+Ключ - sha256 от нормализованного запроса: тип сервиса, параметры сервиса, дополнительные условия
+и модель. Первый уровень - LRU-словарь в памяти процесса с TTL, второй - таблица ai_response_cache
+в PostgreSQL: попадания переживают перезапуск и общие для всех процессов бота.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Optional
+
+import configs
+import database_async
+import metrics
+import utils
+
+
+# cache_key -> (время истечения по time.monotonic, скорректированный результат, комментарий)
+_memory: OrderedDict = OrderedDict()
+_memory_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+_last_purge = 0.0
+
+# Интервал удаления истёкших записей из PostgreSQL, секунд
+PURGE_INTERVAL = 3600
+
+
+def normalize_conditions(additional_conditions: str) -> str:
+    """
+    Нормализует текст дополнительных условий: регистр, ё, пробелы и завершающая пунктуация.
+    :param additional_conditions: Текст от пользователя
+    :return: Нормализованный текст
+    """
+    text = additional_conditions.lower().replace('ё', 'е')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' .!;,')
+
+
+def _normalize_params(service_type: str, base_params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Оставляет только параметры сервиса (служебные поля состояния отбрасываются).
+    Для стека параметры сгруппированы по сервисам и нормализуются для каждого из них.
+    :param service_type: Тип сервиса
+    :param base_params: Входные параметры расчёта
+    :return: Нормализованные параметры
+    """
+    service_params = utils.get_ordered_parameters(service_type)
+    if not service_params:
+        return {name: _normalize_params(name, params) for name, params in base_params.items()
+                if isinstance(params, dict)}
+    return {name: utils.normalize_value(base_params.get(name)) for name in service_params}
+
+
+def make_key(service_type: str, base_params: Dict[str, Any], additional_conditions: str) -> str:
+    """
+    Формирует ключ кэша по нормализованному запросу.
+    В ключ попадают только параметры сервиса (служебные поля состояния отбрасываются).
+    :param service_type: Тип сервиса
+    :param base_params: Входные параметры расчёта
+    :param additional_conditions: Дополнительные условия от пользователя
+    :return: Ключ кэша (hex sha256)
+    """
+    canonical = json.dumps(
+        {
+            'service': service_type,
+            'params': _normalize_params(service_type, base_params),
+            'conditions': normalize_conditions(additional_conditions),
+            'model': configs.openrouter_model,
+        },
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _remember(cache_key: str, adjusted_result: Dict[str, Any], comment: str) -> None:
+    """
+    Кладёт ответ в кэш в памяти, вытесняя самые давно использованные записи.
+    :param cache_key: Ключ кэша
+    :param adjusted_result: Скорректированный результат
+    :param comment: Комментарий ИИ
+    :return: None
+    """
+    with _memory_lock:
+        _memory[cache_key] = (time.monotonic() + configs.ai_cache_ttl, adjusted_result, comment)
+        _memory.move_to_end(cache_key)
+        while len(_memory) > configs.ai_cache_max_size:
+            _memory.popitem(last=False)
+            _stats['evictions'] += 1
+
+
+def get(cache_key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]] | None:
+    """
+    Ищет ответ сначала в памяти, затем в PostgreSQL.
+    :param cache_key: Ключ кэша
+    :return: Кортеж (скорректированный_результат, комментарий_ИИ) или None при промахе
+    """
+    with _memory_lock:
+        entry = _memory.get(cache_key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _memory.move_to_end(cache_key)
+                _stats['memory_hits'] += 1
+                return entry[1], entry[2]
+            del _memory[cache_key]
+
+    response = database_async.run_sync(database_async.fetch_ai_response(cache_key))
+    if response is None:
+        with _memory_lock:
+            _stats['misses'] += 1
+        return None
+
+    _remember(cache_key, response['adjusted_result'], response['comment'])
+    with _memory_lock:
+        _stats['db_hits'] += 1
+    return response['adjusted_result'], response['comment']
+
+
+def put(cache_key: str, adjusted_result: Dict[str, Any], comment: str) -> None:
+    """
+    Сохраняет успешный ответ ИИ в оба уровня кэша.
+    :param cache_key: Ключ кэша
+    :param adjusted_result: Скорректированный результат
+    :param comment: Комментарий ИИ
+    :return: None
+    """
+    global _last_purge
+    _remember(cache_key, adjusted_result, comment)
+    database_async.run_sync(database_async.store_ai_response(
+        cache_key, {'adjusted_result': adjusted_result, 'comment': comment}, configs.ai_cache_ttl
+    ))
+    with _memory_lock:
+        _stats['stores'] += 1
+        purge = time.monotonic() - _last_purge > PURGE_INTERVAL
+        if purge:
+            _last_purge = time.monotonic()
+    if purge:
+        # Очистка не нужна для корректности (истёкшие записи не читаются), поэтому не ждём её
+        database_async.submit(database_async.purge_expired_ai_responses())
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику кэша ответов ИИ.
+    :return: Словарь с размером кэша в памяти, попаданиями и промахами
+    """
+    hits = _stats['memory_hits'] + _stats['db_hits']
+    lookups = hits + _stats['misses']
+    return {
+        'memory_entries': len(_memory),
+        **_stats,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+    }
+
+
+metrics.register('Кэш ответов ИИ', get_stats)
@@ -1,8 +1,124 @@
 import logging
 import requests
 import json
+import time
+from collections import deque
 from typing import Dict, Any, Tuple, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError, ReadTimeoutError
 import configs
+import ai_cache
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+# Общая сессия: соединения с OpenRouter переиспользуются (keep-alive), без повторных DNS/TCP/TLS
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=configs.ai_workers, max_retries=0))
+_session.headers.update({'Content-Type': 'application/json'})
+
+_breaker = CircuitBreaker(
+    'OpenRouter',
+    failure_threshold=configs.openrouter_breaker['failure_threshold'],
+    recovery_timeout=configs.openrouter_breaker['recovery_timeout']
+)
+
+# Задержки последних запросов к OpenRouter, мс
+_latencies: deque = deque(maxlen=500)
+
+
+def _read_body(response: requests.Response, deadline: float) -> bytes:
+    """
+    Читает тело ответа по мере поступления данных и прерывает чтение по общему сроку.
+    Таймаут чтения requests действует на каждое чтение из сокета, поэтому ответ, который
+    сервер отдаёт по нескольку байт (например, пробелами для keep-alive), сам по себе не прерывается.
+    :param response: Ответ, полученный с stream=True
+    :param deadline: Срок по time.monotonic()
+    :return: Тело ответа
+    """
+    chunks = []
+    try:
+        while True:
+            if time.monotonic() >= deadline:
+                raise requests.exceptions.Timeout(
+                    f'ответ не получен за {configs.openrouter_timeout["total"]} с'
+                )
+            chunk = response.raw.read1(65536, decode_content=True)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except ReadTimeoutError as error:
+        response.close()
+        raise requests.exceptions.ReadTimeout(error)
+    except HTTPError as error:
+        response.close()
+        raise requests.exceptions.ConnectionError(error)
+    except BaseException:
+        response.close()
+        raise
+    # Тело прочитано целиком: соединение возвращается в пул сессии
+    response.raw.release_conn()
+    return b''.join(chunks)
+
+
+def _post_to_openrouter(payload: Dict[str, Any]) -> requests.Response:
+    """
+    Отправляет запрос к OpenRouter через общую сессию, записывает задержку и сообщает результат
+    автомату защиты. Проверка автомата и запрос выполняются здесь же, чтобы пропущенный пробный
+    запрос всегда завершался record_success() или record_failure().
+    Запрос ограничен общим сроком configs.openrouter_timeout['total'] (с точностью до одного
+    ожидания чтения из сокета), по его истечении бросается requests.exceptions.Timeout.
+    :param payload: Тело запроса
+    :return: Ответ requests.Response с прочитанным телом
+    :raises CircuitOpenError: Автомат защиты разомкнут
+    """
+    if not _breaker.allow_request():
+        raise CircuitOpenError('OpenRouter')
+    timeout = configs.openrouter_timeout
+    deadline = time.monotonic() + timeout['total']
+    started = time.perf_counter()
+    try:
+        response = _session.post(
+            configs.openrouter_api_url,
+            headers={'Authorization': f'Bearer {configs.openrouter_api_key}'},
+            json=payload,
+            timeout=(timeout['connect'], min(timeout['read'], timeout['total'])),
+            stream=True
+        )
+        # Прочитанное тело сохраняется в ответе: text и json() работают как без stream
+        response._content = _read_body(response, deadline)
+    except BaseException:
+        _breaker.record_failure()
+        raise
+    finally:
+        _latencies.append((time.perf_counter() - started) * 1000)
+
+    # Перегрузка и ошибки сервера - признак деградации OpenRouter, остальные ответы - нет
+    if response.status_code == 429 or response.status_code >= 500:
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+    return response
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """
+    Возвращает состояние автомата защиты и перцентили задержки запросов к OpenRouter.
+    :return: Словарь со статистикой
+    """
+    latencies = sorted(_latencies)
+
+    def percentile(share: float) -> float:
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(share * len(latencies)))], 2)
+
+    return {
+        **_breaker.get_stats(),
+        'requests': len(latencies),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+    }
 
 
 def detect_prompt_injection(text: str) -> bool:
@@ -104,6 +220,12 @@ def validate_adjusted_result(base_result: Dict[str, Any],
             logging.error(f'Тип значения {key} изменился: {type(base_value)} -> {type(value)}')
             return False
 
+        # Результат стека: результаты сервисов вложены словарями
+        if isinstance(value, dict):
+            if not validate_adjusted_result(base_value, value, service_type):
+                return False
+            continue
+
         # Проверка численных значений
         if isinstance(value, (int, float)):
             # Значения не должны быть отрицательными
@@ -146,6 +268,13 @@ def adjust_sizing_with_ai(service_type: str,
         logging.warning(f'Обнаружена попытка prompt injection: {additional_conditions[:100]}...')
         return None, 'PROMPT_INJECTION_DETECTED'
 
+    # Повторные запросы с теми же параметрами и условиями берём из кэша
+    cache_key = ai_cache.make_key(service_type, base_params, additional_conditions)
+    cached = ai_cache.get(cache_key)
+    if cached is not None and validate_adjusted_result(base_result, cached[0], service_type):
+        logging.info(f'Ответ AI для сервиса {service_type} взят из кэша')
+        return cached
+
     # Формирование промпта для ИИ
     system_prompt = """You are an expert infrastructure sizing consultant. Your task is to analyze additional requirements and adjust resource calculations.
 
@@ -192,11 +321,6 @@ Consider:
 Return JSON with adjusted values and explanation in Russian."""
 
     try:
-        headers = {
-            'Authorization': f'Bearer {configs.openrouter_api_key}',
-            'Content-Type': 'application/json',
-        }
-
         payload = {
             'model': configs.openrouter_model,
             'messages': [
@@ -210,12 +334,7 @@ Return JSON with adjusted values and explanation in Russian."""
 
         logging.info(f'Отправка запроса к OpenRouter API для сервиса: {service_type}')
 
-        response = requests.post(
-            configs.openrouter_api_url,
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        response = _post_to_openrouter(payload)
 
         # Детальное логирование ошибок
         if response.status_code != 200:
@@ -263,8 +382,13 @@ Return JSON with adjusted values and explanation in Russian."""
             return None, None
 
         logging.info(f'AI корректировка успешна. Комментарий: {comment[:100]}...')
+        ai_cache.put(cache_key, adjusted_result, comment)
         return adjusted_result, comment
 
+    except CircuitOpenError:
+        # Пока OpenRouter деградирует, не заставляем пользователя ждать таймаута
+        logging.warning('Автомат защиты OpenRouter разомкнут, корректировка ИИ пропущена')
+        return None, None
     except requests.exceptions.Timeout:
         logging.error('Таймаут при запросе к OpenRouter API')
         return None, None
@@ -282,4 +406,7 @@ Return JSON with adjusted values and explanation in Russian."""
         return None, None
     except Exception as error:
         logging.error(f'Неожиданная ошибка при обработке AI: {error}', exc_info=True)
-        return None, None
\ No newline at end of file
+        return None, None
+
+
+metrics.register('OpenRouter', get_http_stats)
@@ -0,0 +1,174 @@
+"""
+Очередь задач AI-корректировки с ограниченным пулом рабочих потоков.
+
+Обработчик TeleBot ставит задачу в очередь и сразу возвращается, не блокируя поток на время запроса к LLM.
+Рабочий поток выполняет ai_processor.adjust_sizing_with_ai и передаёт результат в callback задачи.
+Пока задача ждёт, ей сообщается текущая позиция в очереди.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Any, Optional
+
+import configs
+import ai_processor
+import metrics
+
+
+class AIJob:
+    """
+    Задача AI-корректировки расчёта.
+    :param service_type: Тип сервиса
+    :param base_params: Входные параметры расчёта
+    :param base_result: Базовый результат расчёта
+    :param additional_conditions: Дополнительные условия пользователя
+    :param on_done: Вызывается с (скорректированный_результат, комментарий_ИИ) после обработки
+    :param on_progress: Вызывается с позицией в очереди; 0 - задача взята в работу
+    """
+
+    def __init__(self, service_type: str, base_params: Dict[str, Any], base_result: Dict[str, Any],
+                 additional_conditions: str,
+                 on_done: Callable[[Optional[Dict[str, Any]], Optional[str]], None],
+                 on_progress: Callable[[int], None] = None) -> None:
+        self.service_type = service_type
+        self.base_params = base_params
+        self.base_result = base_result
+        self.additional_conditions = additional_conditions
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.queued_at = time.monotonic()
+        self.last_position = None
+        self.last_progress_at = 0.0
+        # report_progress вызывают и submit(), и рабочие потоки
+        self._progress_lock = threading.Lock()
+
+    def report_progress(self, position: int, force: bool = False) -> None:
+        """
+        Сообщает позицию в очереди, не чаще configs.ai_progress_interval секунд.
+        :param position: Позиция в очереди (0 - задача в работе)
+        :param force: Сообщить без учёта интервала
+        :return: None
+        """
+        if self.on_progress is None:
+            return
+        with self._progress_lock:
+            # После взятия в работу позиция в очереди больше не показывается
+            if position == self.last_position or self.last_position == 0:
+                return
+            now = time.monotonic()
+            if not force and now - self.last_progress_at < configs.ai_progress_interval:
+                return
+            self.last_position = position
+            self.last_progress_at = now
+        try:
+            self.on_progress(position)
+        except Exception as error:
+            logging.error(f'Ошибка обновления прогресса AI-задачи: {error}')
+
+
+_jobs: deque = deque()
+_jobs_condition = threading.Condition()
+_workers: list = []
+_stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'active': 0,
+          'wait_total_ms': 0.0, 'run_total_ms': 0.0}
+
+
+def start_workers() -> None:
+    """
+    Запускает configs.ai_workers рабочих потоков (повторный вызов ничего не делает).
+    :return: None
+    """
+    with _jobs_condition:
+        if _workers:
+            return
+        for index in range(configs.ai_workers):
+            worker = threading.Thread(target=_worker_loop, name=f'ai-worker-{index}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+    logging.info(f'Запущено рабочих потоков AI: {configs.ai_workers}')
+
+
+def submit(job: AIJob) -> int | None:
+    """
+    Ставит задачу в очередь.
+    :param job: Задача AI-корректировки
+    :return: Позиция задачи в очереди (начиная с 1) или None, если очередь переполнена
+    """
+    start_workers()
+    with _jobs_condition:
+        if len(_jobs) >= configs.ai_queue_max_size:
+            _stats['rejected'] += 1
+            logging.warning('Очередь AI-задач переполнена, задача отклонена')
+            return None
+        _jobs.append(job)
+        _stats['submitted'] += 1
+        position = len(_jobs)
+        _jobs_condition.notify()
+    job.report_progress(position, force=True)
+    return position
+
+
+def _worker_loop() -> None:
+    """
+    Цикл рабочего потока: берёт задачи из очереди и выполняет AI-корректировку.
+    :return: None
+    """
+    while True:
+        with _jobs_condition:
+            while not _jobs:
+                _jobs_condition.wait()
+            job = _jobs.popleft()
+            waiting = list(_jobs)
+            _stats['active'] += 1
+            _stats['wait_total_ms'] += (time.monotonic() - job.queued_at) * 1000
+
+        # Остальным задачам сообщаем их новую позицию
+        for position, waiting_job in enumerate(waiting, start=1):
+            waiting_job.report_progress(position)
+        job.report_progress(0, force=True)
+
+        started = time.monotonic()
+        adjusted_result, ai_comment = None, None
+        failed = False
+        try:
+            adjusted_result, ai_comment = ai_processor.adjust_sizing_with_ai(
+                job.service_type, job.base_params, job.base_result, job.additional_conditions
+            )
+        except Exception as error:
+            failed = True
+            logging.error(f'Ошибка выполнения AI-задачи: {error}', exc_info=True)
+        run_ms = (time.monotonic() - started) * 1000
+
+        try:
+            job.on_done(adjusted_result, ai_comment)
+        except Exception as error:
+            logging.error(f'Ошибка завершения AI-задачи: {error}', exc_info=True)
+        finally:
+            with _jobs_condition:
+                _stats['active'] -= 1
+                _stats['failed' if failed else 'completed'] += 1
+                _stats['run_total_ms'] += run_ms
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику очереди AI-задач.
+    :return: Словарь с длиной очереди, числом активных задач и средними временами
+    """
+    finished = _stats['completed'] + _stats['failed']
+    started = finished + _stats['active']
+    return {
+        'queued': len(_jobs),
+        'active': _stats['active'],
+        'workers': len(_workers),
+        'submitted': _stats['submitted'],
+        'rejected': _stats['rejected'],
+        'completed': _stats['completed'],
+        'failed': _stats['failed'],
+        'avg_wait_ms': round(_stats['wait_total_ms'] / started, 2) if started else 0.0,
+        'avg_run_ms': round(_stats['run_total_ms'] / finished, 2) if finished else 0.0,
+    }
+
+
+metrics.register('Очередь AI', get_stats)
@@ -0,0 +1,276 @@
+"""
+Пакетные (векторные) версии функций calculators и payment_calculator.calculate_monthly_cost.
+
+На вход подаются столбцы параметров (DataFrame, одна строка - один сценарий, или словарь массивов),
+на выходе - DataFrame с теми же полями, что возвращают скалярные функции. Формулы повторяют
+скалярные один в один, включая порядок операций, max()/int() и round(..., 2), поэтому значения совпадают.
+Отсутствующий столбец заменяется значением по умолчанию скалярной функции.
+"""
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import configs
+
+
+# Значения по умолчанию скалярных функций (params.get(name, default))
+DEFAULTS = {
+    'kafka': {'messages_per_sec': 1000, 'message_size_kb': 1, 'retention_hours': 24, 'replication_factor': 3},
+    'kubernetes': {'pods_count': 50, 'avg_cpu_per_pod': 0.5, 'avg_ram_per_pod_gb': 1, 'high_availability': True},
+    'redis': {'dataset_size_gb': 10, 'operations_per_sec': 10000, 'high_availability': True, 'persistence': True},
+    'rabbitmq': {'messages_per_sec': 1000, 'message_size_kb': 10, 'queue_depth': 10000, 'high_availability': True},
+}
+
+_BOOL_PARAMS = {'high_availability', 'persistence'}
+
+# Ключевые результаты сервиса для сводных таблиц (sweep, прогноз)
+KEY_RESULTS = {
+    'kafka': ('brokers_count', 'storage_needed_gb', 'ram_per_broker_gb', 'cpu_per_broker'),
+    'kubernetes': ('worker_nodes_count', 'total_cpu_required', 'total_ram_gb_required', 'total_nodes'),
+    'redis': ('total_instances', 'total_memory_gb', 'ram_per_instance_gb', 'cpu_per_instance'),
+    'rabbitmq': ('nodes_count', 'ram_per_node_gb', 'cpu_per_node', 'total_memory_gb'),
+}
+
+
+def _round(values: np.ndarray, digits: int = 2) -> np.ndarray:
+    """
+    Векторный аналог round(x, digits). np.round умножает на 10**digits и может разойтись с round()
+    на значениях вида x.xx5, такие элементы пересчитываются встроенным round().
+    :param values: Массив float
+    :param digits: Число знаков после запятой
+    :return: Округлённый массив
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded[ambiguous] = [round(float(value), digits) for value in values[ambiguous]]
+    return rounded
+
+
+def _floor_int(values: np.ndarray) -> np.ndarray:
+    """Векторный аналог int(x) для float (отбрасывание дробной части)"""
+    return np.trunc(values).astype(np.int64)
+
+
+def _float(values: np.ndarray) -> np.ndarray:
+    """
+    Приводит столбец к float64 для вычислений. Целые в Python не переполняются, а произведения
+    int64 (например, messages_per_sec * message_size_kb * retention_hours) молча переполнились бы.
+    :param values: Входной столбец
+    :return: Массив float64
+    """
+    return np.asarray(values, dtype=np.float64)
+
+
+def _columns(service_type: str, params) -> tuple:
+    """
+    Приводит входные столбцы к массивам одной длины.
+    :param service_type: Тип сервиса
+    :param params: DataFrame или словарь {параметр: массив или скаляр}
+    :return: Кортеж (словарь массивов в исходном типе, число сценариев); для вычислений - _float()
+    """
+    if isinstance(params, pd.DataFrame):
+        params = {name: params[name].to_numpy() for name in params.columns}
+    defaults = DEFAULTS[service_type]
+    arrays = {name: np.asarray(value) for name, value in params.items() if name in defaults}
+    size = max((array.size for array in arrays.values() if array.ndim), default=1)
+
+    columns = {}
+    for name, default in defaults.items():
+        array = arrays.get(name, np.asarray(default))
+        if name in _BOOL_PARAMS:
+            array = array.astype(bool)
+        elif not np.issubdtype(array.dtype, np.number) or array.dtype == bool:
+            array = array.astype(np.float64)
+        columns[name] = np.broadcast_to(array, (size,))
+    return columns, size
+
+
+def calculate_kafka_sizing_batch(params) -> pd.DataFrame:
+    """
+    Пакетный расчёт Kafka, аналог calculators.calculate_kafka_sizing.
+    :param params: DataFrame или словарь столбцов messages_per_sec, message_size_kb, retention_hours, replication_factor
+    :return: DataFrame с результатами, строка на сценарий
+    """
+    columns, size = _columns('kafka', params)
+    messages_per_sec = _float(columns['messages_per_sec'])
+    message_size_kb = _float(columns['message_size_kb'])
+    retention_hours = _float(columns['retention_hours'])
+    replication_factor = _float(columns['replication_factor'])
+
+    throughput_mb_sec = (messages_per_sec * message_size_kb) / 1024
+    daily_data_gb = (throughput_mb_sec * 3600 * retention_hours) / 1024
+    storage_needed_gb = daily_data_gb * replication_factor
+    # Фактор репликации по validation целый, число брокеров - целое, как в скалярной функции
+    brokers_count = _floor_int(np.maximum(3, replication_factor))
+    ram_per_broker_gb = np.maximum(8, _floor_int(storage_needed_gb / brokers_count / 10))
+    cpu_per_broker = np.maximum(4, _floor_int(messages_per_sec / 5000))
+
+    return pd.DataFrame({
+        'throughput_mb_sec': _round(throughput_mb_sec),
+        'storage_needed_gb': _round(storage_needed_gb),
+        'brokers_count': brokers_count,
+        'ram_per_broker_gb': ram_per_broker_gb,
+        'cpu_per_broker': cpu_per_broker,
+        'storage_per_broker_gb': _round(storage_needed_gb / brokers_count * 1.2),
+        'replication_factor': columns['replication_factor'],
+        'message_size_kb': columns['message_size_kb'],
+        'retention_hours': columns['retention_hours'],
+        'messages_per_sec': columns['messages_per_sec'],
+        'calculated_at': np.full(size, time.strftime('%Y-%m-%d %H:%M:%S'), dtype=object),
+    })
+
+
+def calculate_k8s_sizing_batch(params) -> pd.DataFrame:
+    """
+    Пакетный расчёт Kubernetes, аналог calculators.calculate_k8s_sizing.
+    :param params: DataFrame или словарь столбцов pods_count, avg_cpu_per_pod, avg_ram_per_pod_gb, high_availability
+    :return: DataFrame с результатами, строка на сценарий
+    """
+    columns, size = _columns('kubernetes', params)
+    high_availability = columns['high_availability']
+
+    pods_count = _float(columns['pods_count'])
+    total_cpu = pods_count * _float(columns['avg_cpu_per_pod'])
+    total_ram_gb = pods_count * _float(columns['avg_ram_per_pod_gb'])
+    system_overhead = 1.2
+    total_cpu_with_overhead = total_cpu * system_overhead
+    total_ram_with_overhead = total_ram_gb * system_overhead
+
+    min_nodes = np.where(high_availability, 3, 1)
+    cpu_per_node = 8
+    ram_per_node = 32
+    nodes_by_cpu = np.maximum(min_nodes, _floor_int(total_cpu_with_overhead / cpu_per_node) + 1)
+    nodes_by_ram = np.maximum(min_nodes, _floor_int(total_ram_with_overhead / ram_per_node) + 1)
+    nodes_count = np.maximum(nodes_by_cpu, nodes_by_ram)
+    control_plane_nodes = np.where(high_availability, 3, 1)
+
+    return pd.DataFrame({
+        'total_cpu_required': _round(total_cpu_with_overhead),
+        'total_ram_gb_required': _round(total_ram_with_overhead),
+        'worker_nodes_count': nodes_count,
+        'control_plane_nodes': control_plane_nodes,
+        'recommended_node_size': np.full(size, f'{cpu_per_node} vCPU, {ram_per_node} GB RAM', dtype=object),
+        'total_nodes': nodes_count + control_plane_nodes,
+    })
+
+
+def calculate_redis_sizing_batch(params) -> pd.DataFrame:
+    """
+    Пакетный расчёт Redis, аналог calculators.calculate_redis_sizing.
+    :param params: DataFrame или словарь столбцов dataset_size_gb, operations_per_sec, high_availability, persistence
+    :return: DataFrame с результатами, строка на сценарий
+    """
+    columns, size = _columns('redis', params)
+    persistence = columns['persistence']
+
+    memory_overhead = np.where(persistence, 1.5, 1.3)
+    total_memory_gb = _float(columns['dataset_size_gb']) * memory_overhead
+    max_ram_per_instance = 64
+    instances_count = np.maximum(1, _floor_int(total_memory_gb / max_ram_per_instance) + 1)
+    total_instances = np.where(columns['high_availability'], instances_count * 2, instances_count)
+    replicas = np.where(columns['high_availability'], instances_count, 0)
+    cpu_per_instance = np.maximum(4, _floor_int(_float(columns['operations_per_sec']) / 50000))
+    # Без persistence скалярная функция возвращает целый 0, с ней - float: столбец object сохраняет оба типа
+    disk_per_instance_gb = np.where(persistence, _round((total_memory_gb / instances_count) * 1.5).astype(object), 0)
+
+    return pd.DataFrame({
+        'total_memory_gb': _round(total_memory_gb),
+        'master_instances': instances_count,
+        'replica_instances': replicas,
+        'total_instances': total_instances,
+        'ram_per_instance_gb': _round(total_memory_gb / instances_count),
+        'cpu_per_instance': cpu_per_instance,
+        'disk_per_instance_gb': disk_per_instance_gb,
+    })
+
+
+def calculate_rabbitmq_sizing_batch(params) -> pd.DataFrame:
+    """
+    Пакетный расчёт RabbitMQ, аналог calculators.calculate_rabbitmq_sizing.
+    :param params: DataFrame или словарь столбцов messages_per_sec, message_size_kb, queue_depth, high_availability
+    :return: DataFrame с результатами, строка на сценарий
+    """
+    columns, size = _columns('rabbitmq', params)
+    messages_per_sec = _float(columns['messages_per_sec'])
+    message_size_kb = _float(columns['message_size_kb'])
+
+    queue_memory_gb = (_float(columns['queue_depth']) * message_size_kb) / (1024 * 1024)
+    system_overhead = 2.0
+    total_memory_gb = queue_memory_gb * system_overhead
+    nodes_count = np.where(columns['high_availability'], 3, 1)
+    ram_per_node_gb = np.maximum(8, _floor_int(total_memory_gb / nodes_count))
+    cpu_per_node = np.maximum(4, _floor_int(messages_per_sec / 10000))
+    disk_per_node_gb = ram_per_node_gb * 2
+    throughput_mb_sec = (messages_per_sec * message_size_kb) / 1024
+
+    return pd.DataFrame({
+        'nodes_count': nodes_count,
+        'ram_per_node_gb': ram_per_node_gb,
+        'cpu_per_node': cpu_per_node,
+        'disk_per_node_gb': disk_per_node_gb,
+        'throughput_mb_sec': _round(throughput_mb_sec),
+        'total_memory_gb': _round(total_memory_gb),
+        'queue_memory_gb': _round(queue_memory_gb),
+    })
+
+
+BATCH_CALCULATORS = {
+    'kafka': calculate_kafka_sizing_batch,
+    'kubernetes': calculate_k8s_sizing_batch,
+    'redis': calculate_redis_sizing_batch,
+    'rabbitmq': calculate_rabbitmq_sizing_batch,
+}
+
+
+def calculate_batch(service_type: str, params) -> pd.DataFrame:
+    """
+    Пакетный расчёт для сервиса.
+    :param service_type: Тип сервиса (kafka, kubernetes, redis, rabbitmq)
+    :param params: DataFrame (строка на сценарий) или словарь {параметр: массив или скаляр}
+    :return: DataFrame с результатами, строка на сценарий
+    """
+    calculator = BATCH_CALCULATORS.get(service_type)
+    if calculator is None:
+        raise ValueError(f'Неизвестный тип сервиса: {service_type}')
+    return calculator(params)
+
+
+def calculate_monthly_cost_batch(service_type: str, results: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Пакетный расчёт месячной стоимости, аналог payment_calculator.calculate_monthly_cost.
+    :param service_type: Тип сервиса
+    :param results: Результаты calculate_batch
+    :return: Словарь {компонент: массив стоимости}, итог - в ключе 'total_monthly_rub'
+    """
+    pricing = configs.pricing[service_type]
+    if service_type == 'kafka':
+        components = {
+            'brokers': results['brokers_count'].to_numpy() * pricing['broker'],
+            'storage': results['storage_needed_gb'].to_numpy() * pricing['storage_gb'],
+        }
+    elif service_type == 'kubernetes':
+        components = {
+            'control_plane': results['control_plane_nodes'].to_numpy() * pricing['control_plane_node'],
+            'workers': results['worker_nodes_count'].to_numpy() * pricing['worker_node'],
+        }
+    elif service_type == 'redis':
+        components = {
+            'instances': results['total_instances'].to_numpy() * pricing['instance'],
+            'ram': results['total_memory_gb'].to_numpy() * pricing['ram_gb'],
+        }
+    elif service_type == 'rabbitmq':
+        components = {
+            'nodes': results['nodes_count'].to_numpy() * pricing['node'],
+            'ram': results['total_memory_gb'].to_numpy() * pricing['ram_gb'],
+        }
+    else:
+        raise ValueError(f'Неизвестный тип сервиса: {service_type}')
+
+    first, second = components.values()
+    components['total_monthly_rub'] = _round(first + second)
+    return components
@@ -0,0 +1,73 @@
+"""
+Пакетный расчёт batch_calculators против цикла по скалярным функциям calculators.
+
+Сценарии берутся случайно в границах validation из configs.SERVICE_CONFIGS, результаты
+пакетного расчёта сверяются со скалярными поле в поле.
+
+Запуск из корня проекта (нужен configs.py):
+    python benchmarks/batch_benchmark.py [количество сценариев]
+"""
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_calculators  # noqa: E402
+import calculators  # noqa: E402
+import configs  # noqa: E402
+import payment_calculator  # noqa: E402
+
+
+def random_scenarios(service_type: str, count: int, rng: np.random.Generator) -> pd.DataFrame:
+    columns = {}
+    for name, param_config in configs.SERVICE_CONFIGS[service_type]['parameters'].items():
+        validation = param_config['validation']
+        if validation['type'] is bool:
+            columns[name] = rng.random(count) < 0.5
+        elif validation['type'] is int:
+            columns[name] = rng.integers(validation['min'], validation['max'] + 1, count)
+        else:
+            columns[name] = np.round(rng.uniform(validation['min'], validation['max'], count), 2)
+    return pd.DataFrame(columns)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = np.random.default_rng(42)
+    # Скалярные функции пишут в лог каждый расчёт
+    logging.disable(logging.INFO)
+
+    for service_type in batch_calculators.BATCH_CALCULATORS:
+        scenarios = random_scenarios(service_type, count, rng)
+        calculator = getattr(calculators, configs.SERVICE_CONFIGS[service_type]['calculator'])
+        rows = scenarios.to_dict('records')
+
+        started = time.perf_counter()
+        scalar = [calculator(row) for row in rows]
+        scalar_costs = [payment_calculator.calculate_monthly_cost(service_type, result) for result in scalar]
+        scalar_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = batch_calculators.calculate_batch(service_type, scenarios)
+        batch_costs = batch_calculators.calculate_monthly_cost_batch(service_type, batch)
+        batch_seconds = time.perf_counter() - started
+
+        mismatches = 0
+        for index, result in enumerate(scalar):
+            for field, value in result.items():
+                if field != 'calculated_at' and batch[field].iat[index] != value:
+                    mismatches += 1
+            if batch_costs['total_monthly_rub'][index] != scalar_costs[index]['total_monthly_rub']:
+                mismatches += 1
+
+        print(f'{service_type:10}: цикл {scalar_seconds * 1000:8.1f} мс, пакет {batch_seconds * 1000:6.1f} мс, '
+              f'расхождений {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Время расчёта monte_carlo.run_simulation на configs.montecarlo_max_samples выборках
+для каждого сервиса: все параметры с числовыми границами задаются треугольным распределением.
+
+Запуск из корня проекта (нужен configs.py):
+    python benchmarks/monte_carlo_benchmark.py [количество выборок]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_calculators  # noqa: E402
+import configs  # noqa: E402
+import monte_carlo  # noqa: E402
+
+
+def main() -> None:
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else configs.montecarlo_max_samples
+
+    for service_type in batch_calculators.BATCH_CALCULATORS:
+        distributions = []
+        for name, param_config in configs.SERVICE_CONFIGS[service_type]['parameters'].items():
+            validation = param_config['validation']
+            if 'min' in validation:
+                low, high = validation['min'], validation['max']
+                distributions.append(monte_carlo.Distribution(name, 'triangular', (low, low + (high - low) / 4, high)))
+
+        started = time.perf_counter()
+        percentiles = monte_carlo.run_simulation(service_type, batch_calculators.DEFAULTS[service_type],
+                                                 distributions, samples, seed=42)
+        seconds = time.perf_counter() - started
+
+        p99 = percentiles.loc['total_monthly_rub', 'P99']
+        print(f'{service_type:10}: {samples} выборок за {seconds * 1000:6.1f} мс, P99 стоимости {p99:.2f} RUB')
+
+
+if __name__ == '__main__':
+    main()
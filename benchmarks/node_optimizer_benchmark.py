@@ -0,0 +1,71 @@
+"""
+Время подбора пула нод node_optimizer.optimize на крупных кластерах и случайных каталогах типов нод.
+Результат сверяется с полным перебором числа нод всех типов на небольших каталогах и кластерах.
+
+Запуск из корня проекта (нужен configs.py):
+    python benchmarks/node_optimizer_benchmark.py [количество типов нод]
+"""
+import itertools
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import node_optimizer  # noqa: E402
+
+
+def random_flavors(count: int, rng: np.random.Generator) -> list:
+    flavors = []
+    for index in range(count):
+        cpu = int(rng.choice([2, 4, 8, 16, 32, 48, 64]))
+        ram = cpu * int(rng.choice([2, 4, 8]))
+        flavors.append({'name': f'f{index}-{cpu}-{ram}', 'cpu': cpu, 'ram_gb': ram,
+                        'price': round((cpu * 700 + ram * 120) * float(rng.uniform(0.85, 1.15)))})
+    return flavors
+
+
+def brute_force(cpu_required: float, ram_required: float, min_nodes: int, flavors: list) -> float:
+    """Перебор всех наборов числа нод: число нод каждого типа - до покрытия требований одним этим типом"""
+    limits = [range(max(math.ceil(cpu_required / flavor['cpu']), math.ceil(ram_required / flavor['ram_gb']),
+                        min_nodes) + 1)
+              for flavor in flavors]
+    best = math.inf
+    for counts in itertools.product(*limits):
+        if (sum(count * flavor['cpu'] for count, flavor in zip(counts, flavors)) >= cpu_required
+                and sum(count * flavor['ram_gb'] for count, flavor in zip(counts, flavors)) >= ram_required
+                and sum(counts) >= min_nodes):
+            best = min(best, sum(count * flavor['price'] for count, flavor in zip(counts, flavors)))
+    return best
+
+
+def main() -> None:
+    flavor_count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    rng = np.random.default_rng(7)
+    flavors = random_flavors(flavor_count, rng)
+
+    for pods, cpu_per_pod, ram_per_pod in ((1000, 0.5, 1), (5000, 1, 4), (10000, 1, 3), (10000, 2, 2)):
+        cpu_required, ram_required = pods * cpu_per_pod * 1.2, pods * ram_per_pod * 1.2
+        started = time.perf_counter()
+        plan = node_optimizer.optimize(cpu_required, ram_required, 3, cpu_per_pod, ram_per_pod, flavors)
+        elapsed = (time.perf_counter() - started) * 1000
+        pools = ', '.join(f'{pool.count}×{pool.flavor}' for pool in plan.pools)
+        print(f'{pods:6} подов: {elapsed:6.1f} мс, {plan.monthly_cost:12.2f} RUB, {pools}')
+
+    for min_nodes in (1, 3):
+        mismatches = 0
+        for _ in range(200):
+            catalog = random_flavors(4, rng)
+            cpu_required, ram_required = float(rng.uniform(1, 64)), float(rng.uniform(1, 256))
+            plan = node_optimizer.optimize(cpu_required, ram_required, min_nodes, flavors=catalog)
+            if abs(plan.monthly_cost - brute_force(cpu_required, ram_required, min_nodes, catalog)) > 0.01:
+                mismatches += 1
+        print(f'Сверка с полным перебором (200 каталогов из 4 типов, min_nodes={min_nodes}): '
+              f'расхождений {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Стоимость выбора обработчика на одно обновление: цепочка фильтров TeleBot против таблиц router.
+
+Цепочка повторяет прежние лямбда-фильтры main.py (проверяются по очереди до первого совпадения),
+маршрутизатор разбирает текст/callback_data словарным поиском.
+
+Запуск из корня проекта (нужен configs.py):
+    python benchmarks/router_benchmark.py [количество повторов]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import router  # noqa: E402
+
+
+LEGACY_MESSAGE_FILTERS = [
+    lambda text: text.lower() in ['☕ kafka', 'kafka', 'кафка'],
+    lambda text: text.lower() in ['⎈ kubernetes', 'kubernetes', 'k8s', 'кубер'],
+    lambda text: text.lower() in ['🗄️ redis', 'redis', 'редис'],
+    lambda text: text.lower() in ['🐰 rabbitmq', 'rabbitmq', 'rabbit', 'раббит'],
+    lambda text: text == '💰 История платежей',
+    lambda text: text == '📊 История расчётов',
+    lambda text: text == '📤 Экспорт в Excel',
+    lambda text: text == 'ℹ️ Помощь',
+    lambda text: True,
+]
+
+LEGACY_CALLBACK_FILTERS = [
+    lambda data: data.startswith('range_'),
+    lambda data: data.startswith('custom_'),
+    lambda data: data.startswith('back_from_'),
+    lambda data: data.startswith('back_') and not data.startswith('back_from_'),
+    lambda data: data == 'skip_conditions',
+    lambda data: data.startswith('pay_calc_'),
+    lambda data: data.startswith(('calc_page_', 'pay_page_')),
+]
+
+MESSAGES = ['☕ Kafka', 'redis', '📊 История расчётов', 'ℹ️ Помощь', '1500', 'нужна высокая доступность']
+CALLBACKS = ['range_messages_per_sec_1000', 'custom_pods_count', 'back_from_retention_hours',
+             'back_message_size_kb', 'skip_conditions', 'pay_calc_42', 'calc_page_older_17']
+
+
+def legacy_message(text: str) -> int:
+    for index, check in enumerate(LEGACY_MESSAGE_FILTERS):
+        if check(text):
+            return index
+    return -1
+
+
+def legacy_callback(data: str) -> tuple:
+    for index, check in enumerate(LEGACY_CALLBACK_FILTERS):
+        if check(data):
+            # Прежние обработчики разбирали callback_data повторно
+            return index, data.split('_')
+    return -1, None
+
+
+def main() -> None:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    cases = (
+        ('сообщения, фильтры', lambda: [legacy_message(text) for text in MESSAGES], len(MESSAGES)),
+        ('сообщения, router ', lambda: [router.resolve_text(text) for text in MESSAGES], len(MESSAGES)),
+        ('callback, фильтры  ', lambda: [legacy_callback(data) for data in CALLBACKS], len(CALLBACKS)),
+        ('callback, router   ', lambda: [router.resolve_callback(data) for data in CALLBACKS], len(CALLBACKS)),
+    )
+    for name, func, per_call in cases:
+        seconds = min(timeit.repeat(func, number=repeats // per_call, repeat=3))
+        print(f'{name}: {seconds / (repeats // per_call * per_call) * 1e9:8.1f} нс на обновление')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Сравнение хранилищ состояний: StateMemoryStorage и StatePostgresStorage.
+
+Имитирует шаги диалога расчёта (set_state, retrieve_data с записью параметра, get_state)
+для нескольких пользователей и выводит пропускную способность и задержки операций.
+
+Запуск из корня проекта (нужен configs.py и доступная БД):
+    python benchmarks/state_storage_benchmark.py [количество шагов]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telebot.storage import StateMemoryStorage  # noqa: E402
+
+import configs  # noqa: E402
+import database  # noqa: E402
+import storages  # noqa: E402
+
+
+def run_flow(storage, steps: int) -> dict:
+    """
+    Выполняет steps шагов диалога и замеряет задержку каждого.
+    :param storage: Хранилище состояний
+    :param steps: Количество шагов
+    :return: Словарь с результатами
+    """
+    latencies = []
+    started = time.perf_counter()
+    for step in range(steps):
+        user_id = 1_000_000 + step % 50
+        step_started = time.perf_counter()
+        storage.set_state(user_id, user_id, f'KafkaSizing:param_{step % 5}')
+        with storage.get_interactive_data(user_id, user_id) as data:
+            data['service_name'] = 'kafka'
+            data[f'param_{step % 5}'] = step
+            data['last_message_id'] = step
+        storage.get_state(user_id, user_id)
+        latencies.append((time.perf_counter() - step_started) * 1000)
+    total = time.perf_counter() - started
+
+    for user_id in range(1_000_000, 1_000_050):
+        storage.delete_state(user_id, user_id)
+
+    latencies.sort()
+    return {
+        'steps_per_sec': steps / total,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main() -> None:
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    database.apply_migrations()
+
+    for name, storage in (
+        ('memory', StateMemoryStorage()),
+        ('postgres', storages.StatePostgresStorage(ttl=configs.state_ttl)),
+    ):
+        result = run_flow(storage, steps)
+        print(f'{name:>8}: {result["steps_per_sec"]:10.1f} шагов/с, '
+              f'p50 {result["p50_ms"]:.3f} мс, p95 {result["p95_ms"]:.3f} мс')
+
+    database.close_pool()
+
+
+if __name__ == '__main__':
+    main()
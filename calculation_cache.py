@@ -0,0 +1,177 @@
+"""
+Кэш расчётов без корректировки ИИ: результат калькулятора, отформатированный текст и стоимость.
+
+Кнопки с готовыми значениями приводят к тому, что большинство расчётов повторяют одни и те же
+входные параметры. Ключ - версия каталога, сервис и нормализованные параметры сервиса, поэтому
+после перезагрузки каталога старые записи не находятся; invalidate() дополнительно освобождает
+память и вызывается подпиской на config_loader.
+
+Расчёты всех комбинаций кнопок (декартово произведение ranges) заранее заполняются в таблицу
+готовых расчётов при старте и после перезагрузки каталога. Таблица не вытесняется и подменяется
+целиком, LRU хранит расчёты с введёнными вручную значениями.
+"""
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, Any
+
+import calculators
+import config_loader
+import configs
+import metrics
+import node_optimizer
+import payment_calculator
+import utils
+
+
+CalculationEntry = namedtuple('CalculationEntry', ['result', 'text', 'cost_details'])
+
+# (версия каталога, сервис, значения параметров) -> CalculationEntry
+_memory: OrderedDict = OrderedDict()
+_memory_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'preset_hits': 0}
+
+# Таблица готовых расчётов: (версия каталога, сервис, значения параметров) -> CalculationEntry
+_presets: Dict[tuple, CalculationEntry] = {}
+_presets_version = None
+_presets_lock = threading.Lock()
+_preset_stats = {'preset_entries': 0, 'preset_warm_ms': 0.0, 'preset_warmed_at': None, 'preset_skipped': ()}
+
+
+def make_key(service_type: str, params: Dict[str, Any]) -> tuple:
+    """
+    Формирует ключ кэша. Служебные поля состояния в ключ не попадают.
+    :param service_type: Тип сервиса
+    :param params: Входные параметры расчёта
+    :return: Кортеж (версия каталога, сервис, значения параметров в порядке следования)
+    """
+    values = tuple(utils.normalize_value(params.get(name)) for name in utils.get_ordered_parameters(service_type))
+    return config_loader.get_catalog().version, service_type, values
+
+
+def _compute(service_type: str, params: Dict[str, Any]) -> CalculationEntry:
+    """
+    Выполняет расчёт, форматирование и расчёт стоимости.
+    :param service_type: Тип сервиса
+    :param params: Входные параметры расчёта
+    :return: CalculationEntry
+    """
+    calculator = getattr(calculators, utils.get_service_config(service_type)['calculator'])
+    result = calculator(params)
+    text = calculators.format_result(service_type, result)
+    if service_type == 'kubernetes':
+        node_plan_text = node_optimizer.recommend_for_k8s(params, result)
+        if node_plan_text:
+            text = f'{text}\n{node_plan_text}'
+    return CalculationEntry(result, text, payment_calculator.calculate_monthly_cost(service_type, result))
+
+
+def calculate(service_type: str, params: Dict[str, Any]) -> CalculationEntry:
+    """
+    Возвращает расчёт из кэша или выполняет и запоминает его.
+    Результат в возвращаемой записи - копия, её можно изменять.
+    :param service_type: Тип сервиса
+    :param params: Входные параметры расчёта
+    :return: CalculationEntry
+    """
+    cache_key = make_key(service_type, params)
+    entry = _presets.get(cache_key)
+    with _memory_lock:
+        if entry is not None:
+            _stats['preset_hits'] += 1
+        else:
+            entry = _memory.get(cache_key)
+            if entry is not None:
+                _memory.move_to_end(cache_key)
+                _stats['hits'] += 1
+            else:
+                _stats['misses'] += 1
+
+    if entry is None:
+        entry = _compute(service_type, params)
+        # Ошибки калькулятора не кэшируются
+        if 'error' in entry.result:
+            return entry
+        with _memory_lock:
+            _memory[cache_key] = entry
+            while len(_memory) > configs.calculation_cache_max_size:
+                _memory.popitem(last=False)
+                _stats['evictions'] += 1
+
+    result = dict(entry.result)
+    if 'calculated_at' in result:
+        result['calculated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return entry._replace(result=result)
+
+
+def warm_presets() -> None:
+    """
+    Заполняет таблицу готовых расчётов для всех комбинаций кнопок текущего каталога.
+    Сервисы, у которых комбинаций больше configs.preset_table_max_size, пропускаются.
+    Повторный вызов для той же версии каталога ничего не делает.
+    :return: None
+    """
+    global _presets, _presets_version
+    with _presets_lock:
+        version = config_loader.get_catalog().version
+        if version == _presets_version:
+            return
+
+        started = time.perf_counter()
+        presets, skipped = {}, []
+        for service_type, service_config in configs.SERVICE_CONFIGS.items():
+            names = utils.get_ordered_parameters(service_type)
+            choices = [[value for value, _ in service_config['parameters'][name]['ranges']] for name in names]
+            combinations = 1
+            for values in choices:
+                combinations *= len(values)
+            if combinations > configs.preset_table_max_size:
+                skipped.append(service_type)
+                logging.warning(f'Готовые расчёты {service_type} пропущены: {combinations} комбинаций')
+                continue
+
+            for values in itertools.product(*choices):
+                params = dict(zip(names, values))
+                entry = _compute(service_type, params)
+                if 'error' not in entry.result:
+                    presets[make_key(service_type, params)] = entry
+
+        # Подмена целиком: читающие потоки видят либо старую, либо новую таблицу
+        _presets, _presets_version = presets, version
+        warm_ms = round((time.perf_counter() - started) * 1000, 1)
+        _preset_stats.update(preset_entries=len(presets), preset_warm_ms=warm_ms,
+                             preset_warmed_at=time.strftime('%Y-%m-%d %H:%M:%S'), preset_skipped=tuple(skipped))
+    logging.info(f'Таблица готовых расчётов заполнена: {len(presets)} комбинаций за {warm_ms} мс')
+
+
+def invalidate(catalog: config_loader.Catalog = None) -> None:
+    """
+    Очищает кэш и заново заполняет таблицу готовых расчётов (подписчик перезагрузки каталога).
+    :param catalog: Новый каталог
+    :return: None
+    """
+    with _memory_lock:
+        _memory.clear()
+        _stats['invalidations'] += 1
+    logging.info('Кэш расчётов очищен')
+    warm_presets()
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику кэша расчётов.
+    :return: Словарь с размером кэша, попаданиями, промахами и состоянием таблицы готовых расчётов
+    """
+    hits = _stats['hits'] + _stats['preset_hits']
+    lookups = hits + _stats['misses']
+    return {
+        'entries': len(_memory),
+        **_stats,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        **_preset_stats,
+    }
+
+
+metrics.register('Кэш расчётов', get_stats)
@@ -0,0 +1,115 @@
+"""
+Автомат защиты (circuit breaker) для вызовов внешних сервисов.
+
+closed    - запросы проходят, подряд идущие ошибки считаются;
+open      - после failure_threshold ошибок подряд запросы сразу отклоняются на recovery_timeout секунд;
+half_open - по истечении паузы пропускается один пробный запрос: успех замыкает автомат, ошибка снова размыкает.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Any
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонён разомкнутым автоматом защиты"""
+
+
+class CircuitBreaker:
+    """
+    Потокобезопасный автомат защиты.
+    :param name: Имя защищаемого сервиса (для логов)
+    :param failure_threshold: Количество ошибок подряд до размыкания
+    :param recovery_timeout: Пауза в секундах перед пробным запросом
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._rejected = 0
+        self._opened_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """
+        Текущее состояние с учётом истёкшей паузы.
+        :return: closed, open или half_open
+        """
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Проверяет, можно ли выполнить запрос сейчас.
+        В состоянии half_open разрешается только один пробный запрос, поэтому после True
+        вызывающий обязан сообщить результат через record_success() или record_failure().
+        :return: True если запрос можно выполнять
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self._rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self._rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """
+        Отмечает успешный запрос и замыкает автомат.
+        :return: None
+        """
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.info(f'Автомат защиты {self.name} замкнут, сервис снова доступен')
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """
+        Отмечает неудачный запрос; при достижении порога (или ошибке пробного запроса) размыкает автомат.
+        :return: None
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened_count += 1
+                    logging.warning(
+                        f'Автомат защиты {self.name} разомкнут на {self.recovery_timeout} с '
+                        f'после {self._failures} ошибок подряд'
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние автомата и счётчики.
+        :return: Словарь со статистикой
+        """
+        state = self.state
+        return {
+            'state': state,
+            'consecutive_failures': self._failures,
+            'opened': self._opened_count,
+            'rejected': self._rejected,
+        }
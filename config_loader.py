@@ -0,0 +1,331 @@
+"""
+Каталог сайзинга и цен (configs.SERVICE_CONFIGS и configs.pricing) с перезагрузкой без рестарта.
+
+Каталог читается из YAML/JSON-файла configs.catalog_path, проверяется по схеме и превращается
+в неизменяемые структуры (MappingProxyType и кортежи). Новая версия целиком подменяет старую
+присваиванием, поэтому читающие потоки не берут блокировок и всегда видят согласованный каталог.
+Перезагрузка выполняется при изменении файла (фоновый поток) или командой администратора.
+После подмены вызываются подписчики (перестроение индекса utils и таблиц router).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List
+
+import yaml
+
+import configs
+import calculators
+import classes
+import metrics
+
+
+class CatalogError(ValueError):
+    """Каталог не соответствует схеме"""
+
+
+Catalog = namedtuple('Catalog', ['version', 'pricing', 'services', 'source', 'loaded_at'])
+
+# Тарифы, без которых payment_calculator не сможет посчитать стоимость
+REQUIRED_PRICING = {
+    'kafka': ('broker', 'storage_gb'),
+    'kubernetes': ('control_plane_node', 'worker_node'),
+    'redis': ('instance', 'ram_gb'),
+    'rabbitmq': ('node', 'ram_gb'),
+}
+
+_VALUE_TYPES = {'int': int, 'float': float, 'bool': bool}
+
+_catalog = Catalog(0, configs.pricing, configs.SERVICE_CONFIGS, 'configs.py', time.time())
+_subscribers: List[Callable[[Catalog], None]] = []
+_reload_lock = threading.Lock()
+_watcher: threading.Thread | None = None
+_file_signature = None
+_stats = {'reloads': 0, 'failures': 0, 'last_error': None}
+
+
+def parse_bool(text: str) -> bool:
+    """
+    Разбирает ответ пользователя на вопрос да/нет.
+    :param text: Введённый текст
+    :return: True для положительного ответа
+    """
+    return text.lower() in ['да', 'yes', 'y', 'д', '+']
+
+
+def _freeze(value):
+    """
+    Рекурсивно превращает словари в MappingProxyType, а списки в кортежи.
+    :param value: Значение из разобранного файла
+    :return: Неизменяемая копия
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _is_number(value) -> bool:
+    """Проверяет, что значение - число (bool числом не считается)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _require(condition: bool, path: str, message: str) -> None:
+    """
+    Бросает CatalogError с путём до ошибочного поля.
+    :param condition: Условие корректности
+    :param path: Путь до поля в каталоге
+    :param message: Описание ошибки
+    :return: None
+    """
+    if not condition:
+        raise CatalogError(f'{path}: {message}')
+
+
+def _validate_pricing(pricing) -> Dict[str, Dict[str, float]]:
+    """
+    Проверяет раздел pricing.
+    :param pricing: Раздел каталога
+    :return: Словарь тарифов
+    """
+    _require(isinstance(pricing, dict), 'pricing', 'ожидается словарь')
+    for service_name, prices in pricing.items():
+        path = f'pricing.{service_name}'
+        _require(isinstance(service_name, str), path, 'название сервиса должно быть строкой')
+        _require(isinstance(prices, dict), path, 'ожидается словарь')
+        for name, price in prices.items():
+            _require(isinstance(name, str), f'{path}.{name}', 'название тарифа должно быть строкой')
+            _require(_is_number(price) and price >= 0, f'{path}.{name}', 'ожидается неотрицательное число')
+    for service_name, names in REQUIRED_PRICING.items():
+        for name in names:
+            _require(name in pricing.get(service_name, {}), f'pricing.{service_name}.{name}', 'отсутствует тариф')
+    return pricing
+
+
+def _validate_parameter(path: str, param_config) -> Dict[str, Any]:
+    """
+    Проверяет параметр сервиса и приводит его к формату SERVICE_CONFIGS.
+    :param path: Путь до параметра в каталоге
+    :param param_config: Описание параметра
+    :return: Конфигурация параметра (validation.type - класс, для bool добавляется custom_parse)
+    """
+    _require(isinstance(param_config, dict), path, 'ожидается словарь')
+    _require(isinstance(param_config.get('order'), int), f'{path}.order', 'ожидается целое число')
+    _require(isinstance(param_config.get('text'), str), f'{path}.text', 'ожидается строка')
+    _require(isinstance(param_config.get('display', ''), str), f'{path}.display', 'ожидается строка')
+
+    validation = param_config.get('validation')
+    _require(isinstance(validation, dict), f'{path}.validation', 'ожидается словарь')
+    value_type = validation.get('type')
+    # Проверка типа до поиска в словаре: список или словарь вместо имени типа не хешируются
+    _require(isinstance(value_type, (str, type)), f'{path}.validation.type', 'ожидается int, float или bool')
+    value_type = _VALUE_TYPES.get(value_type, value_type)
+    _require(value_type in _VALUE_TYPES.values(), f'{path}.validation.type', 'ожидается int, float или bool')
+    _require(isinstance(validation.get('error'), str), f'{path}.validation.error', 'ожидается строка')
+
+    bounds = None
+    if 'min' in validation or 'max' in validation:
+        lower, upper = validation.get('min'), validation.get('max')
+        _require(_is_number(lower) and _is_number(upper), f'{path}.validation',
+                 'min и max задаются вместе и должны быть числами')
+        _require(lower <= upper, f'{path}.validation', 'min больше max')
+        bounds = (lower, upper)
+
+    ranges = param_config.get('ranges')
+    _require(isinstance(ranges, (list, tuple)) and ranges, f'{path}.ranges', 'ожидается непустой список')
+    for position, preset in enumerate(ranges):
+        preset_path = f'{path}.ranges[{position}]'
+        _require(isinstance(preset, (list, tuple)) and len(preset) == 2, preset_path,
+                 'ожидается пара [значение, подпись]')
+        value, label = preset
+        _require(isinstance(label, str), preset_path, 'подпись должна быть строкой')
+        if value_type is bool:
+            _require(isinstance(value, bool), preset_path, 'ожидается true или false')
+        else:
+            _require(_is_number(value), preset_path, 'ожидается число')
+            _require(bounds is None or bounds[0] <= value <= bounds[1], preset_path, 'значение вне диапазона min/max')
+
+    result = dict(param_config)
+    result['validation'] = {**validation, 'type': value_type}
+    if value_type is bool and 'custom_parse' not in result:
+        result['custom_parse'] = parse_bool
+    return result
+
+
+def _validate_services(services) -> Dict[str, Dict[str, Any]]:
+    """
+    Проверяет раздел services.
+    :param services: Раздел каталога
+    :return: Словарь в формате configs.SERVICE_CONFIGS
+    """
+    _require(isinstance(services, dict) and services, 'services', 'ожидается непустой словарь')
+    result = {}
+    for service_name, service_config in services.items():
+        path = f'services.{service_name}'
+        _require(isinstance(service_name, str), path, 'название сервиса должно быть строкой')
+        _require(isinstance(service_config, dict), path, 'ожидается словарь')
+        _require(isinstance(service_config.get('display_name'), str), f'{path}.display_name', 'ожидается строка')
+
+        calculator = service_config.get('calculator')
+        _require(isinstance(calculator, str) and callable(getattr(calculators, calculator, None)),
+                 f'{path}.calculator', f'функция {calculator} не найдена в calculators')
+
+        state_group_name = service_config.get('state_group')
+        _require(isinstance(state_group_name, str), f'{path}.state_group', 'ожидается строка')
+        state_group = getattr(classes, state_group_name.rpartition('.')[2], None)
+        _require(state_group is not None, f'{path}.state_group', f'группа состояний {state_group_name} не найдена')
+
+        parameters = service_config.get('parameters')
+        _require(isinstance(parameters, dict) and parameters, f'{path}.parameters', 'ожидается непустой словарь')
+        checked_parameters = {}
+        for param_name, param_config in parameters.items():
+            param_path = f'{path}.parameters.{param_name}'
+            _require(isinstance(param_name, str), param_path, 'название параметра должно быть строкой')
+            _require(getattr(state_group, param_name, None) is not None, param_path,
+                     f'в {state_group_name} нет состояния для параметра')
+            checked_parameters[param_name] = _validate_parameter(param_path, param_config)
+
+        orders = [param_config['order'] for param_config in checked_parameters.values()]
+        _require(len(set(orders)) == len(orders), f'{path}.parameters', 'значения order повторяются')
+        result[service_name] = {**service_config, 'parameters': checked_parameters}
+    return result
+
+
+def validate(raw) -> tuple:
+    """
+    Проверяет каталог по схеме.
+    :param raw: Разобранное содержимое файла каталога
+    :return: Кортеж (pricing, services) в формате configs.pricing и configs.SERVICE_CONFIGS
+    """
+    _require(isinstance(raw, dict), 'catalog', 'ожидается словарь с разделами pricing и services')
+    return _validate_pricing(raw.get('pricing')), _validate_services(raw.get('services'))
+
+
+def read_file(path: str):
+    """
+    Читает файл каталога (.json - JSON, иначе YAML).
+    :param path: Путь до файла
+    :return: Разобранное содержимое
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        if path.endswith('.json'):
+            return json.load(file)
+        return yaml.safe_load(file)
+
+
+def get_catalog() -> Catalog:
+    """Возвращает текущую версию каталога"""
+    return _catalog
+
+
+def subscribe(callback: Callable[[Catalog], None]) -> None:
+    """
+    Регистрирует функцию, вызываемую после подмены каталога.
+    :param callback: Функция, принимающая новый Catalog
+    :return: None
+    """
+    _subscribers.append(callback)
+
+
+def _signature(path: str) -> tuple | None:
+    """Возвращает (mtime, размер) файла или None, если файла нет"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload(path: str = None) -> Catalog:
+    """
+    Читает и проверяет каталог, атомарно подменяет configs.pricing и configs.SERVICE_CONFIGS
+    и оповещает подписчиков. При ошибке текущий каталог остаётся в силе.
+    :param path: Путь до файла (по умолчанию configs.catalog_path)
+    :return: Новый Catalog
+    """
+    global _catalog, _file_signature
+    path = path or configs.catalog_path
+    with _reload_lock:
+        signature = _signature(path)
+        try:
+            pricing, services = validate(read_file(path))
+        except (OSError, ValueError, yaml.YAMLError) as error:
+            _stats['failures'] += 1
+            _stats['last_error'] = str(error)
+            logging.error(f'Каталог {path} не загружен: {error}')
+            raise CatalogError(str(error)) from error
+
+        catalog = Catalog(_catalog.version + 1, _freeze(pricing), _freeze(services), path, time.time())
+        _catalog = catalog
+        configs.pricing = catalog.pricing
+        configs.SERVICE_CONFIGS = catalog.services
+        _file_signature = signature
+        _stats['reloads'] += 1
+        _stats['last_error'] = None
+
+        for callback in list(_subscribers):
+            try:
+                callback(catalog)
+            except Exception as error:
+                logging.error(f'Ошибка обработчика перезагрузки каталога: {error}', exc_info=True)
+
+    logging.info(f'Загружен каталог {path}, версия {catalog.version}')
+    return catalog
+
+
+def _watch_loop() -> None:
+    """
+    Следит за файлом каталога и перезагружает его при изменении.
+    :return: None
+    """
+    global _file_signature
+    while True:
+        time.sleep(configs.catalog_watch_interval)
+        signature = _signature(configs.catalog_path)
+        if signature is None or signature == _file_signature:
+            continue
+        try:
+            reload()
+        except CatalogError:
+            # Повторно ту же версию файла не разбираем, ждём следующего изменения
+            _file_signature = signature
+
+
+def start() -> None:
+    """
+    Загружает каталог из файла (если он есть) и запускает поток наблюдения за ним.
+    Без файла используются значения из configs.py.
+    :return: None
+    """
+    global _watcher
+    if os.path.exists(configs.catalog_path):
+        reload()
+    else:
+        logging.info(f'Файл каталога {configs.catalog_path} не найден, используются значения из configs.py')
+
+    if configs.catalog_watch_interval and (_watcher is None or not _watcher.is_alive()):
+        _watcher = threading.Thread(target=_watch_loop, name='catalog-watcher', daemon=True)
+        _watcher.start()
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает состояние каталога.
+    :return: Словарь с версией, источником и счётчиками перезагрузок
+    """
+    catalog = _catalog
+    return {
+        'version': catalog.version,
+        'source': catalog.source,
+        'loaded_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(catalog.loaded_at)),
+        'services': len(catalog.services),
+        **_stats
+    }
+
+
+metrics.register('Каталог', get_stats)
@@ -1,93 +1,57 @@
-import json
+"""
+Синхронный интерфейс к базе данных. Запросы выполняются асинхронным слоем database_async,
+функции этого модуля - тонкие обёртки, дожидающиеся результата.
+"""
+import concurrent.futures
 import logging
+import threading
+import time
+import uuid
+from typing import Dict, List, Any
+
 import psycopg
-from typing import Tuple, Dict, List, Any
+from psycopg import sql
+
 import configs
+import database_async
+import metrics
+import migrations
+
+
+# Кэш статусов блокировки: множество заблокированных и время последней отрицательной проверки
+_banned_users: set = set()
+_not_banned_checked: Dict[int, float] = {}
+_ban_cache_stats = {'hits': 0, 'db_lookups': 0, 'notifications': 0}
+_ban_cache_lock = threading.Lock()
+_ban_listener: threading.Thread | None = None
+
+# Наличие расчётов у пользователя: user_id -> (есть расчёты, время проверки)
+_has_calculations: Dict[int, tuple] = {}
+_has_calculations_lock = threading.Lock()
+
+
+def close_pool() -> None:
+    """
+    Закрывает пул соединений с PostgreSQL.
+    :return: None
+    """
+    database_async.run_sync(database_async.close_pool())
 
 
-def postgre_init() -> Tuple[psycopg.Connection | None, psycopg.Cursor | None]:
+def get_pool_stats() -> Dict[str, Any]:
     """
-    Устанавливает соединение с PostgreSQL и возвращает объекты подключения и курсор
-    :return: Кортеж из соединения и курсора. В случае ошибки вернёт None, None
+    Возвращает статистику пула соединений.
+    :return: Словарь с размерами пула, очередью ожидания и задержкой получения соединения
     """
-    try:
-        conn = psycopg.connect(
-            dbname=configs.sql_database['db_name'],
-            user=configs.sql_database['user'],
-            password=configs.sql_database['password'],
-            host=configs.sql_database['host'],
-            port=configs.sql_database['port']
-        )
-        cursor = conn.cursor()
-        logging.info('Успешное подключение к базе данных PostgreSQL')
-        return conn, cursor
-    except psycopg.Error as error:
-        logging.error(f'Ошибка подключения к БД PostgreSQL: {error}')
-        return None, None
+    return database_async.get_pool_stats()
 
 
-def create_tables() -> None:
+def apply_migrations() -> None:
     """
-    Создаёт необходимые таблицы в базе данных PostgreSQL.
+    Приводит схему базы данных к актуальной версии.
     :return: None
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return
-    try:
-        # Таблица пользователей
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                user_data JSONB NOT NULL,
-                is_admin BOOLEAN NOT NULL DEFAULT FALSE,
-                is_banned BOOLEAN NOT NULL DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
-        # Таблица расчётов
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS calculations (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                service_type TEXT NOT NULL,
-                input_params JSONB NOT NULL,
-                result_params JSONB NOT NULL,
-                ai_adjustments TEXT,
-                additional_conditions TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            """
-        )
-        # Таблица платежей
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS payments (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                calculation_id INTEGER NOT NULL,
-                amount NUMERIC(10, 2) NOT NULL,
-                currency TEXT NOT NULL DEFAULT 'RUB',
-                provider_payment_charge_id TEXT,
-                telegram_payment_charge_id TEXT,
-                payload TEXT NOT NULL,
-                payment_status TEXT NOT NULL DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                FOREIGN KEY (calculation_id) REFERENCES calculations (id)
-            )
-            """
-        )
-        conn.commit()
-        logging.info('Таблицы успешно созданы или проверены')
-    except psycopg.Error as error:
-        logging.error(f'Ошибка создания таблиц: {error}')
-    finally:
-        conn.close()
+    database_async.run_sync(migrations.apply_migrations())
 
 
 def insert_user_data(user_id: int, user_data: Dict[str, Any]) -> None:
@@ -97,26 +61,35 @@ def insert_user_data(user_id: int, user_data: Dict[str, Any]) -> None:
     :param user_data: Словарь с данными пользователя
     :return: None
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return
-    user_data_json = json.dumps(user_data)
-    try:
-        cursor.execute(
-            """
-            INSERT INTO users (user_id, user_data, is_admin) 
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id)
-            DO UPDATE SET user_data = EXCLUDED.user_data
-            """,
-            (user_id, user_data_json, False)
-        )
-        conn.commit()
-        logging.info('Данные пользователя успешно сохранены в БД')
-    except psycopg.Error as error:
-        logging.error(f'Ошибка записи в таблицу users: {error}')
-    finally:
-        conn.close()
+    database_async.run_sync(database_async.insert_user_data(user_id, user_data))
+
+
+def submit_save_calculation(user_id: int, service_type: str, input_params: Dict,
+                            result_params: Dict, ai_adjustments: str = None,
+                            additional_conditions: str = None,
+                            group_id: uuid.UUID = None) -> concurrent.futures.Future:
+    """
+    Запускает сохранение расчёта и сразу возвращает future с ID расчёта,
+    чтобы вызывающий код мог параллельно отправлять сообщения.
+    :param user_id: ID пользователя
+    :param service_type: Тип сервиса (kafka, k8s, redis, rabbitmq)
+    :param input_params: Входные параметры расчёта
+    :param result_params: Результаты расчёта
+    :param ai_adjustments: Корректировки от ИИ
+    :param additional_conditions: Дополнительные условия пользователя
+    :param group_id: Группа расчётов стека (None для расчёта одного сервиса)
+    :return: concurrent.futures.Future с int calculation id
+    """
+    future = database_async.submit(database_async.save_calculation(
+        user_id, service_type, input_params, result_params, ai_adjustments, additional_conditions, group_id
+    ))
+
+    def _on_saved(done: concurrent.futures.Future) -> None:
+        if not done.cancelled() and done.exception() is None and done.result():
+            set_has_calculations(user_id)
+
+    future.add_done_callback(_on_saved)
+    return future
 
 
 def save_calculation(user_id: int, service_type: str, input_params: Dict,
@@ -132,154 +105,193 @@ def save_calculation(user_id: int, service_type: str, input_params: Dict,
     :param additional_conditions: Дополнительные условия пользователя
     :return: int calculation id
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return
-    try:
-        cursor.execute(
-            """
-            INSERT INTO calculations (user_id, service_type, input_params, result_params, 
-                                     ai_adjustments, additional_conditions)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (user_id, service_type, json.dumps(input_params), json.dumps(result_params),
-             ai_adjustments, additional_conditions)
-        )
-        conn.commit()
-        result = cursor.fetchone()
-        logging.info(f'Расчёт для {service_type} сохранён в БД: {result[0]}')
-        return int(result[0]) if result else 0
-    except psycopg.Error as error:
-        logging.error(f'Ошибка сохранения расчёта: {error}')
-        return 0
-    finally:
-        conn.close()
+    return submit_save_calculation(
+        user_id, service_type, input_params, result_params, ai_adjustments, additional_conditions
+    ).result()
 
 
 def ban_user(user_id: int) -> None:
     """
-    Блокирует пользователя в базе данных.
+    Блокирует пользователя в базе данных, обновляет локальный кэш
+    и уведомляет другие процессы бота через NOTIFY.
     :param user_id: ID пользователя
     :return: None
     """
-    conn, cursor = postgre_init()
-    if conn is None:
+    _mark_banned(user_id)
+    database_async.run_sync(database_async.ban_user(user_id))
+
+
+def _mark_banned(user_id: int) -> None:
+    """
+    Добавляет пользователя в локальный кэш заблокированных.
+    :param user_id: ID пользователя
+    :return: None
+    """
+    with _ban_cache_lock:
+        _banned_users.add(user_id)
+        _not_banned_checked.pop(user_id, None)
+    # Заблокированным пользователям кнопки истории и экспорта не показываются
+    with _has_calculations_lock:
+        _has_calculations.pop(user_id, None)
+
+
+def load_banned_users() -> None:
+    """
+    Загружает множество заблокированных пользователей в кэш и сбрасывает отрицательные записи.
+    :return: None
+    """
+    global _banned_users, _not_banned_checked
+    banned_ids = database_async.run_sync(database_async.fetch_banned_user_ids())
+    if banned_ids is None:
         return
-    try:
-        cursor.execute(
-            """
-            UPDATE users SET is_banned = TRUE WHERE user_id = %s
-            """,
-            (user_id,)
-        )
-        conn.commit()
-        logging.warning(f'Пользователь {user_id} заблокирован')
-    except psycopg.Error as error:
-        logging.error(f'Ошибка блокировки пользователя: {error}')
-    finally:
-        conn.close()
+
+    # Новые множество и словарь подменяют старые одним присваиванием: читатели не видят пустой кэш
+    banned_users = set(banned_ids)
+    with _ban_cache_lock:
+        _banned_users, _not_banned_checked = banned_users, {}
+    logging.info(f'Загружено заблокированных пользователей: {len(banned_ids)}')
 
 
 def is_user_banned(user_id: int) -> bool:
     """
     Проверяет, заблокирован ли пользователь.
+    Ответ берётся из кэша: заблокированные хранятся постоянно,
+    отрицательный результат - в течение configs.ban_cache_ttl секунд.
     :param user_id: ID пользователя
     :return: True если заблокирован, False иначе
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return False
-    try:
-        cursor.execute(
-            """
-            SELECT is_banned FROM users WHERE user_id = %s
-            """,
-            (user_id,)
-        )
-        result = cursor.fetchone()
-        return bool(result[0]) if result else False
-    except psycopg.Error as error:
-        logging.error(f'Ошибка проверки бана пользователя: {error}')
+    with _ban_cache_lock:
+        if user_id in _banned_users:
+            _ban_cache_stats['hits'] += 1
+            return True
+
+        checked_at = _not_banned_checked.get(user_id)
+        if checked_at is not None and time.monotonic() - checked_at < configs.ban_cache_ttl:
+            _ban_cache_stats['hits'] += 1
+            return False
+
+        _ban_cache_stats['db_lookups'] += 1
+
+    banned = database_async.run_sync(database_async.fetch_user_banned(user_id))
+    if banned is None:
         return False
+    if banned:
+        _mark_banned(user_id)
+    else:
+        with _ban_cache_lock:
+            if len(_not_banned_checked) >= configs.ban_cache_max_size:
+                _not_banned_checked.clear()
+            _not_banned_checked[user_id] = time.monotonic()
+    return banned
+
+
+def _listen_ban_notifications() -> None:
+    """
+    Слушает канал configs.ban_notify_channel и добавляет заблокированных
+    другими процессами пользователей в локальный кэш. При обрыве соединения переподключается.
+    :return: None
+    """
+    while True:
+        try:
+            with psycopg.connect(database_async.get_conninfo(), autocommit=True) as conn:
+                conn.execute(sql.SQL('LISTEN {}').format(sql.Identifier(configs.ban_notify_channel)))
+                # Уведомления, пришедшие пока соединения не было, подхватываем полной перезагрузкой
+                load_banned_users()
+                logging.info(f'Подписка на канал блокировок {configs.ban_notify_channel} активна')
+                for notify in conn.notifies():
+                    try:
+                        _mark_banned(int(notify.payload))
+                        with _ban_cache_lock:
+                            _ban_cache_stats['notifications'] += 1
+                    except ValueError:
+                        logging.error(f'Некорректное уведомление о блокировке: {notify.payload}')
+        except psycopg.Error as error:
+            logging.error(f'Ошибка подписки на уведомления о блокировках: {error}')
+        time.sleep(5)
+
+
+def start_ban_listener() -> None:
+    """
+    Запускает фоновый поток, синхронизирующий кэш блокировок между процессами бота.
+    :return: None
+    """
+    global _ban_listener
+    if _ban_listener is not None and _ban_listener.is_alive():
+        return
+    _ban_listener = threading.Thread(target=_listen_ban_notifications, name='ban-listener', daemon=True)
+    _ban_listener.start()
+
+
+def get_ban_cache_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику кэша блокировок.
+    :return: Словарь с размерами кэша и счётчиками обращений
+    """
+    return {
+        'banned': len(_banned_users),
+        'negative_entries': len(_not_banned_checked),
+        **_ban_cache_stats
+    }
+
+
+def set_has_calculations(user_id: int) -> None:
+    """
+    Отмечает в кэше, что у пользователя есть сохранённые расчёты.
+    Вызывается после успешного сохранения расчёта.
+    :param user_id: ID пользователя
+    :return: None
+    """
+    with _has_calculations_lock:
+        if len(_has_calculations) >= configs.has_calculations_cache_size:
+            _has_calculations.clear()
+        _has_calculations[user_id] = (True, time.monotonic())
 
 
 def user_has_calculations(user_id: int) -> bool:
     """
     Проверяет, есть ли у пользователя сохранённые расчёты.
+    Положительный ответ кэшируется навсегда (расчёты не удаляются),
+    отрицательный - на configs.has_calculations_ttl секунд.
     :param user_id: ID пользователя
     :return: True если есть расчёты, False иначе
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return False
-    try:
-        cursor.execute(
-                """
-                SELECT COUNT(*) 
-                FROM calculations as c 
-                INNER JOIN users as u ON c.user_id = u.user_id 
-                WHERE (c.user_id = %s) AND (u.is_banned = FALSE)
-                """,
-                (user_id,)
-        )
-        result = cursor.fetchone()
-        return result[0] > 0 if result else False
-    except psycopg.Error as error:
-        logging.error(f'Ошибка проверки расчётов пользователя (id {user_id}): {error}')
-        return False
-    finally:
-        conn.close()
+    cached = _has_calculations.get(user_id)
+    if cached is not None:
+        has_calculations, checked_at = cached
+        if has_calculations or time.monotonic() - checked_at < configs.has_calculations_ttl:
+            return has_calculations
+
+    has_calculations = database_async.run_sync(database_async.user_has_calculations(user_id))
+    with _has_calculations_lock:
+        if len(_has_calculations) >= configs.has_calculations_cache_size:
+            _has_calculations.clear()
+        _has_calculations[user_id] = (has_calculations, time.monotonic())
+    return has_calculations
 
 
-def get_user_calculations_history(user_id: int, limit: int = 1) -> list:
+def get_user_calculations_history(user_id: int, limit: int = 1,
+                                  cursor_id: int = None, direction: str = 'older') -> list:
     """
-    Получает историю расчётов пользователя.
+    Получает историю расчётов пользователя с keyset-пагинацией по (created_at, id).
     :param user_id: ID пользователя
     :param limit: Максимальное количество записей (по умолчанию 1)
-    :return: Список расчётов в формате словарей
-    """
-    conn, cursor = postgre_init()
-    if conn is None or cursor is None:
-        return []
-
-    try:
-        cursor.execute(
-            """
-            SELECT id, created_at, service_type, input_params, result_params, 
-                   ai_adjustments, additional_conditions
-            FROM calculations 
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-            LIMIT %s
-            """,
-            (user_id, limit)
-        )
-        results = cursor.fetchall()
-        calculations = []
-
-        for row in results:
-            # row - это кортеж, обращаемся по индексам
-            calculation = {
-                'id': row[0],
-                'created_at': row[1].strftime("%d.%m.%Y %H:%M") if row[1] else None,
-                'service_type': row[2],
-                'input_params': row[3] if isinstance(row[3], dict) else json.loads(json.dumps(row[3])),
-                'result_params': row[4] if isinstance(row[4], dict) else json.loads(json.dumps(row[4])),
-                'ai_adjustments': row[5] or 'Без корректировок',
-                'additional_conditions': row[6] or 'Не указаны'
-            }
-            calculations.append(calculation)
-
-        return calculations
-    except psycopg.Error as error:
-        logging.error(f'Ошибка получения истории расчётов: {error}')
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    :param cursor_id: ID расчёта, от которого отсчитывается страница (None - самые новые)
+    :param direction: 'older' - записи старше курсора, 'newer' - новее курсора
+    :return: Список расчётов в формате словарей, от новых к старым
+    """
+    return database_async.run_sync(database_async.get_user_calculations_history(
+        user_id, limit, cursor_id, direction
+    ))
+
+
+def get_calculation_for_payment(user_id: int, calculation_id: int) -> tuple | None:
+    """
+    Получает расчёт пользователя вместе с уже созданным платежом (если он есть).
+    :param user_id: ID пользователя
+    :param calculation_id: ID расчёта
+    :return: Кортеж (service_type, result_params, payment_id, payment_status) или None
+    """
+    return database_async.run_sync(database_async.get_calculation_for_payment(user_id, calculation_id))
 
 
 def save_payment(user_id: int, calculation_id: int, amount: float, currency: str = 'RUB',
@@ -293,28 +305,7 @@ def save_payment(user_id: int, calculation_id: int, amount: float, currency: str
     :param payload: Данные платежа
     :return: ID созданного платежа
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return 0
-    try:
-        cursor.execute(
-            """
-            INSERT INTO payments (user_id, calculation_id, amount, currency, payload)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (user_id, calculation_id, amount, currency, payload)
-        )
-        conn.commit()
-        result = cursor.fetchone()
-        payment_id = result[0] if result else None
-        logging.info(f'Платёж #{payment_id} для расчёта {calculation_id} успешно сохранён в БД')
-        return payment_id
-    except psycopg.Error as error:
-        logging.error(f'Ошибка сохранения платежа: {error}')
-        return 0
-    finally:
-        conn.close()
+    return database_async.run_sync(database_async.save_payment(user_id, calculation_id, amount, currency, payload))
 
 
 def update_payment_status(payment_id: int, status: str,
@@ -328,71 +319,23 @@ def update_payment_status(payment_id: int, status: str,
     :param telegram_charge_id: ID платежа в Telegram
     :return: True если успешно, False иначе
     """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return False
-    try:
-        cursor.execute(
-            """
-            UPDATE payments 
-            SET payment_status = %s, 
-                provider_payment_charge_id = %s, 
-                telegram_payment_charge_id = %s
-            WHERE id = %s
-            """,
-            (status, provider_charge_id, telegram_charge_id, payment_id)
-        )
-        conn.commit()
-        logging.info(f'Статус платежа #{payment_id} обновлён на {status}')
-        return True
-    except psycopg.Error as error:
-        logging.error(f'Ошибка обновления статуса платежа: {error}')
-        return False
-    finally:
-        conn.close()
+    return database_async.run_sync(database_async.update_payment_status(
+        payment_id, status, provider_charge_id, telegram_charge_id
+    ))
 
 
-def get_user_payments(user_id: int, limit: int = 1) -> List[Dict[str, Any]]:
+def get_user_payments(user_id: int, limit: int = 1,
+                      cursor_id: int = None, direction: str = 'older') -> List[Dict[str, Any]]:
     """
-    Получает историю платежей пользователя.
+    Получает историю платежей пользователя с keyset-пагинацией по (created_at, id).
     :param user_id: ID пользователя
     :param limit: Максимальное количество записей
-    :return: Список платежей
-    """
-    conn, cursor = postgre_init()
-    if conn is None:
-        return []
-    try:
-        cursor.execute(
-            """
-            SELECT p.id, p.amount, p.currency, p.payment_status, p.created_at,
-                   c.service_type, c.result_params
-            FROM payments p
-            JOIN calculations c ON p.calculation_id = c.id
-            WHERE p.user_id = %s
-            ORDER BY p.created_at DESC
-            LIMIT %s
-            """,
-            (user_id, limit)
-        )
-        results = cursor.fetchall()
-        payments = []
-
-        for row in results:
-            payment = {
-                'id': row[0],
-                'amount': float(row[1]),
-                'currency': row[2],
-                'status': row[3],
-                'created_at': row[4].strftime("%d.%m.%Y %H:%M") if row[4] else None,
-                'service_type': row[5],
-                'result_params': row[6] if isinstance(row[6], dict) else json.loads(json.dumps(row[6]))
-            }
-            payments.append(payment)
-
-        return payments
-    except psycopg.Error as error:
-        logging.error(f'Ошибка получения истории платежей: {error}')
-        return []
-    finally:
-        conn.close()
+    :param cursor_id: ID платежа, от которого отсчитывается страница (None - самые новые)
+    :param direction: 'older' - записи старше курсора, 'newer' - новее курсора
+    :return: Список платежей, от новых к старым
+    """
+    return database_async.run_sync(database_async.get_user_payments(user_id, limit, cursor_id, direction))
+
+
+metrics.register('Пул PostgreSQL', get_pool_stats)
+metrics.register('Кэш блокировок', get_ban_cache_stats)
@@ -0,0 +1,596 @@
+"""
+Асинхронный слой доступа к PostgreSQL на базе psycopg AsyncConnection и AsyncConnectionPool.
+
+Все запросы выполняются в отдельном потоке с собственным event loop. Синхронный код (обработчики TeleBot)
+может запустить запрос через submit() и продолжить работу (например, отправку сообщения),
+а результат забрать позже через future.result(). Синхронные обёртки находятся в database.py.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List, Any, AsyncIterator, Coroutine
+
+import psycopg
+from psycopg import sql
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+import configs
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+_pool: AsyncConnectionPool | None = None
+_pool_lock = asyncio.Lock()
+
+# Статистика ожидания свободного соединения из пула
+_acquire_stats = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'timeouts': 0}
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Возвращает event loop слоя БД, запуская его в фоновом потоке при первом обращении.
+    :return: Объект event loop
+    """
+    global _loop
+    if _loop is not None:
+        return _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='db-loop', daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+def submit(coro: Coroutine) -> concurrent.futures.Future:
+    """
+    Планирует корутину в event loop слоя БД и сразу возвращает future.
+    Нельзя вызывать из самого event loop слоя БД.
+    :param coro: Корутина из этого модуля
+    :return: concurrent.futures.Future с результатом корутины
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    Выполняет корутину в event loop слоя БД и дожидается результата.
+    :param coro: Корутина из этого модуля
+    :return: Результат корутины
+    """
+    return submit(coro).result()
+
+
+def get_conninfo() -> str:
+    """
+    Формирует строку подключения к PostgreSQL из настроек configs.sql_database.
+    :return: Строка подключения в формате libpq
+    """
+    return psycopg.conninfo.make_conninfo(
+        dbname=configs.sql_database['db_name'],
+        user=configs.sql_database['user'],
+        password=configs.sql_database['password'],
+        host=configs.sql_database['host'],
+        port=configs.sql_database['port']
+    )
+
+
+async def get_pool() -> AsyncConnectionPool:
+    """
+    Возвращает общий пул соединений с PostgreSQL, создавая его при первом обращении.
+    :return: Объект AsyncConnectionPool
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                conninfo=get_conninfo(),
+                min_size=configs.sql_pool['min_size'],
+                max_size=configs.sql_pool['max_size'],
+                timeout=configs.sql_pool['timeout'],
+                max_lifetime=configs.sql_pool['max_lifetime'],
+                max_idle=configs.sql_pool['max_idle'],
+                check=AsyncConnectionPool.check_connection,
+                name='sizing_bot',
+                open=False
+            )
+            await pool.open(wait=False)
+            _pool = pool
+            logging.info(
+                f'Пул соединений PostgreSQL создан '
+                f'(min {configs.sql_pool["min_size"]}, max {configs.sql_pool["max_size"]})'
+            )
+    return _pool
+
+
+async def close_pool() -> None:
+    """
+    Закрывает пул соединений с PostgreSQL.
+    :return: None
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+            logging.info('Пул соединений PostgreSQL закрыт')
+
+
+@asynccontextmanager
+async def db_connection() -> AsyncIterator[psycopg.AsyncConnection]:
+    """
+    Выдаёт соединение из пула на время блока async with.
+    При успешном выходе транзакция фиксируется, при исключении - откатывается.
+    Если свободное соединение не получено за configs.sql_pool['timeout'] секунд,
+    выбрасывается psycopg_pool.PoolTimeout (наследник psycopg.OperationalError).
+    :return: Соединение psycopg.AsyncConnection
+    """
+    pool = await get_pool()
+    started = time.perf_counter()
+    try:
+        conn = await pool.getconn()
+    except PoolTimeout:
+        _acquire_stats['timeouts'] += 1
+        raise
+
+    waited_ms = (time.perf_counter() - started) * 1000
+    _acquire_stats['count'] += 1
+    _acquire_stats['total_ms'] += waited_ms
+    _acquire_stats['max_ms'] = max(_acquire_stats['max_ms'], waited_ms)
+
+    try:
+        yield conn
+        await conn.commit()
+    except BaseException:
+        if not conn.closed:
+            await conn.rollback()
+        raise
+    finally:
+        await pool.putconn(conn)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику пула соединений.
+    :return: Словарь с размерами пула, очередью ожидания и задержкой получения соединения
+    """
+    acquire = dict(_acquire_stats)
+    stats = _pool.get_stats() if _pool is not None else {}
+    pool_size = stats.get('pool_size', 0)
+    pool_available = stats.get('pool_available', 0)
+    return {
+        'pool_size': pool_size,
+        'in_use': pool_size - pool_available,
+        'available': pool_available,
+        'waiting': stats.get('requests_waiting', 0),
+        'acquire_count': acquire['count'],
+        'acquire_avg_ms': round(acquire['total_ms'] / acquire['count'], 2) if acquire['count'] else 0.0,
+        'acquire_max_ms': round(acquire['max_ms'], 2),
+        'acquire_timeouts': acquire['timeouts'],
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+async def fetch_one(query: str | sql.Composable, params: tuple = ()) -> tuple | None:
+    """
+    Выполняет запрос и возвращает первую строку результата.
+    :param query: SQL-запрос
+    :param params: Параметры запроса
+    :return: Кортеж со строкой или None
+    """
+    async with db_connection() as conn:
+        cursor = await conn.execute(query, params)
+        return await cursor.fetchone()
+
+
+async def fetch_all(query: str | sql.Composable, params: tuple = ()) -> List[tuple]:
+    """
+    Выполняет запрос и возвращает все строки результата.
+    :param query: SQL-запрос
+    :param params: Параметры запроса
+    :return: Список кортежей
+    """
+    async with db_connection() as conn:
+        cursor = await conn.execute(query, params)
+        return await cursor.fetchall()
+
+
+async def insert_user_data(user_id: int, user_data: Dict[str, Any]) -> None:
+    """
+    Вставляет или обновляет данные пользователя в базе данных.
+    :param user_id: ID пользователя Telegram
+    :param user_data: Словарь с данными пользователя
+    :return: None
+    """
+    user_data_json = json.dumps(user_data)
+    try:
+        async with db_connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO users (user_id, user_data, is_admin)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id)
+                DO UPDATE SET user_data = EXCLUDED.user_data
+                """,
+                (user_id, user_data_json, False)
+            )
+        logging.info('Данные пользователя успешно сохранены в БД')
+    except psycopg.Error as error:
+        logging.error(f'Ошибка записи в таблицу users: {error}')
+
+
+async def save_calculation(user_id: int, service_type: str, input_params: Dict,
+                           result_params: Dict, ai_adjustments: str = None,
+                           additional_conditions: str = None, group_id: uuid.UUID = None) -> int:
+    """
+    Сохраняет результаты расчёта в базу данных.
+    :param user_id: ID пользователя
+    :param service_type: Тип сервиса (kafka, k8s, redis, rabbitmq)
+    :param input_params: Входные параметры расчёта
+    :param result_params: Результаты расчёта
+    :param ai_adjustments: Корректировки от ИИ
+    :param additional_conditions: Дополнительные условия пользователя
+    :param group_id: Группа расчётов стека (None для расчёта одного сервиса)
+    :return: int calculation id
+    """
+    try:
+        async with db_connection() as conn:
+            cursor = await conn.execute(
+                """
+                INSERT INTO calculations (user_id, service_type, input_params, result_params,
+                                         ai_adjustments, additional_conditions, group_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+                """,
+                (user_id, service_type, json.dumps(input_params), json.dumps(result_params),
+                 ai_adjustments, additional_conditions, group_id)
+            )
+            result = await cursor.fetchone()
+        logging.info(f'Расчёт для {service_type} сохранён в БД: {result[0]}')
+        return int(result[0]) if result else 0
+    except psycopg.Error as error:
+        logging.error(f'Ошибка сохранения расчёта: {error}')
+        return 0
+
+
+async def ban_user(user_id: int) -> None:
+    """
+    Блокирует пользователя в базе данных и уведомляет все процессы бота через NOTIFY.
+    :param user_id: ID пользователя
+    :return: None
+    """
+    try:
+        async with db_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE users SET is_banned = TRUE WHERE user_id = %s
+                """,
+                (user_id,)
+            )
+            # Уведомление доставляется слушателям только после фиксации транзакции
+            await conn.execute('SELECT pg_notify(%s, %s)', (configs.ban_notify_channel, str(user_id)))
+        logging.warning(f'Пользователь {user_id} заблокирован')
+    except psycopg.Error as error:
+        logging.error(f'Ошибка блокировки пользователя: {error}')
+
+
+async def fetch_user_banned(user_id: int) -> bool | None:
+    """
+    Читает статус блокировки пользователя из базы данных.
+    :param user_id: ID пользователя
+    :return: True/False, либо None при ошибке БД
+    """
+    try:
+        result = await fetch_one(
+            """
+            SELECT is_banned FROM users WHERE user_id = %s
+            """,
+            (user_id,)
+        )
+        return bool(result[0]) if result else False
+    except psycopg.Error as error:
+        logging.error(f'Ошибка проверки бана пользователя: {error}')
+        return None
+
+
+async def fetch_banned_user_ids() -> List[int] | None:
+    """
+    Возвращает ID всех заблокированных пользователей.
+    :return: Список ID, либо None при ошибке БД
+    """
+    try:
+        rows = await fetch_all('SELECT user_id FROM users WHERE is_banned = TRUE')
+        return [row[0] for row in rows]
+    except psycopg.Error as error:
+        logging.error(f'Ошибка загрузки списка заблокированных пользователей: {error}')
+        return None
+
+
+async def user_has_calculations(user_id: int) -> bool:
+    """
+    Проверяет, есть ли у пользователя сохранённые расчёты.
+    :param user_id: ID пользователя
+    :return: True если есть расчёты, False иначе
+    """
+    try:
+        result = await fetch_one(
+            """
+            SELECT EXISTS (
+                SELECT 1
+                FROM calculations as c
+                INNER JOIN users as u ON c.user_id = u.user_id
+                WHERE (c.user_id = %s) AND (u.is_banned = FALSE)
+            )
+            """,
+            (user_id,)
+        )
+        return bool(result[0]) if result else False
+    except psycopg.Error as error:
+        logging.error(f'Ошибка проверки расчётов пользователя (id {user_id}): {error}')
+        return False
+
+
+def _keyset_parts(table: str, cursor_id: int | None, direction: str, alias: str = None) -> Dict[str, sql.Composable]:
+    """
+    Формирует условие и направление сортировки для keyset-пагинации по (created_at, id).
+    Позиция курсора берётся подзапросом по его id, поэтому в callback_data достаточно хранить только id.
+    :param table: Имя таблицы (calculations или payments)
+    :param cursor_id: ID записи-курсора или None для первой страницы
+    :param direction: 'older' или 'newer'
+    :param alias: Псевдоним таблицы в основном запросе
+    :return: Словарь с частями запроса keyset и order
+    """
+    newer = direction == 'newer'
+    order = sql.SQL('ASC' if newer else 'DESC')
+    if not cursor_id:
+        return {'keyset': sql.SQL(''), 'order': order}
+
+    prefix = sql.SQL('{}.').format(sql.Identifier(alias)) if alias else sql.SQL('')
+    keyset = sql.SQL(
+        'AND ({prefix}created_at, {prefix}id) {op} '
+        '(SELECT created_at, id FROM {table} WHERE id = %s AND user_id = %s)'
+    ).format(prefix=prefix, op=sql.SQL('>' if newer else '<'), table=sql.Identifier(table))
+    return {'keyset': keyset, 'order': order}
+
+
+async def get_user_calculations_history(user_id: int, limit: int = 1,
+                                        cursor_id: int = None, direction: str = 'older') -> list:
+    """
+    Получает историю расчётов пользователя с keyset-пагинацией по (created_at, id).
+    :param user_id: ID пользователя
+    :param limit: Максимальное количество записей (по умолчанию 1)
+    :param cursor_id: ID расчёта, от которого отсчитывается страница (None - самые новые)
+    :param direction: 'older' - записи старше курсора, 'newer' - новее курсора
+    :return: Список расчётов в формате словарей, от новых к старым
+    """
+    query = sql.SQL(
+        """
+        SELECT id, created_at, service_type, input_params, result_params,
+               ai_adjustments, additional_conditions
+        FROM calculations
+        WHERE user_id = %s {keyset}
+        ORDER BY created_at {order}, id {order}
+        LIMIT %s
+        """
+    ).format(**_keyset_parts('calculations', cursor_id, direction))
+    params = (user_id, cursor_id, user_id, limit) if cursor_id else (user_id, limit)
+
+    try:
+        results = await fetch_all(query, params)
+    except psycopg.Error as error:
+        logging.error(f'Ошибка получения истории расчётов: {error}')
+        return []
+
+    if direction == 'newer':
+        results.reverse()
+
+    calculations = []
+    for row in results:
+        # row - это кортеж, обращаемся по индексам
+        calculation = {
+            'id': row[0],
+            'created_at': row[1].strftime("%d.%m.%Y %H:%M") if row[1] else None,
+            'service_type': row[2],
+            'input_params': row[3] if isinstance(row[3], dict) else json.loads(json.dumps(row[3])),
+            'result_params': row[4] if isinstance(row[4], dict) else json.loads(json.dumps(row[4])),
+            'ai_adjustments': row[5] or 'Без корректировок',
+            'additional_conditions': row[6] or 'Не указаны'
+        }
+        calculations.append(calculation)
+
+    return calculations
+
+
+async def get_calculation_for_payment(user_id: int, calculation_id: int) -> tuple | None:
+    """
+    Получает расчёт пользователя вместе с уже созданным платежом (если он есть).
+    :param user_id: ID пользователя
+    :param calculation_id: ID расчёта
+    :return: Кортеж (service_type, result_params, payment_id, payment_status) или None
+    """
+    try:
+        return await fetch_one(
+            """
+            SELECT c.service_type, c.result_params, p.id as payment_id, p.payment_status
+            FROM calculations c
+            LEFT JOIN payments p ON c.id = p.calculation_id AND p.user_id = %s
+            WHERE c.id = %s AND c.user_id = %s
+            """,
+            (user_id, calculation_id, user_id)
+        )
+    except psycopg.Error as error:
+        logging.error(f'Ошибка получения расчёта {calculation_id} для оплаты: {error}')
+        return None
+
+
+async def save_payment(user_id: int, calculation_id: int, amount: float, currency: str = 'RUB',
+                       payload: str = '') -> int | None:
+    """
+    Сохраняет информацию о платеже в базу данных.
+    :param user_id: ID пользователя
+    :param calculation_id: ID расчёта
+    :param amount: Сумма платежа
+    :param currency: Валюта
+    :param payload: Данные платежа
+    :return: ID созданного платежа
+    """
+    try:
+        result = await fetch_one(
+            """
+            INSERT INTO payments (user_id, calculation_id, amount, currency, payload)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
+            """,
+            (user_id, calculation_id, amount, currency, payload)
+        )
+        payment_id = result[0] if result else None
+        logging.info(f'Платёж #{payment_id} для расчёта {calculation_id} успешно сохранён в БД')
+        return payment_id
+    except psycopg.Error as error:
+        logging.error(f'Ошибка сохранения платежа: {error}')
+        return 0
+
+
+async def update_payment_status(payment_id: int, status: str,
+                                provider_charge_id: str = None,
+                                telegram_charge_id: str = None) -> bool:
+    """
+    Обновляет статус платежа.
+    :param payment_id: ID платежа
+    :param status: Новый статус
+    :param provider_charge_id: ID платежа у провайдера
+    :param telegram_charge_id: ID платежа в Telegram
+    :return: True если успешно, False иначе
+    """
+    try:
+        async with db_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE payments
+                SET payment_status = %s,
+                    provider_payment_charge_id = %s,
+                    telegram_payment_charge_id = %s
+                WHERE id = %s
+                """,
+                (status, provider_charge_id, telegram_charge_id, payment_id)
+            )
+        logging.info(f'Статус платежа #{payment_id} обновлён на {status}')
+        return True
+    except psycopg.Error as error:
+        logging.error(f'Ошибка обновления статуса платежа: {error}')
+        return False
+
+
+async def get_user_payments(user_id: int, limit: int = 1,
+                            cursor_id: int = None, direction: str = 'older') -> List[Dict[str, Any]]:
+    """
+    Получает историю платежей пользователя с keyset-пагинацией по (created_at, id).
+    :param user_id: ID пользователя
+    :param limit: Максимальное количество записей
+    :param cursor_id: ID платежа, от которого отсчитывается страница (None - самые новые)
+    :param direction: 'older' - записи старше курсора, 'newer' - новее курсора
+    :return: Список платежей, от новых к старым
+    """
+    query = sql.SQL(
+        """
+        SELECT p.id, p.amount, p.currency, p.payment_status, p.created_at,
+               c.service_type, c.result_params
+        FROM payments p
+        JOIN calculations c ON p.calculation_id = c.id
+        WHERE p.user_id = %s {keyset}
+        ORDER BY p.created_at {order}, p.id {order}
+        LIMIT %s
+        """
+    ).format(**_keyset_parts('payments', cursor_id, direction, alias='p'))
+    params = (user_id, cursor_id, user_id, limit) if cursor_id else (user_id, limit)
+
+    try:
+        results = await fetch_all(query, params)
+    except psycopg.Error as error:
+        logging.error(f'Ошибка получения истории платежей: {error}')
+        return []
+
+    if direction == 'newer':
+        results.reverse()
+
+    payments = []
+    for row in results:
+        payment = {
+            'id': row[0],
+            'amount': float(row[1]),
+            'currency': row[2],
+            'status': row[3],
+            'created_at': row[4].strftime("%d.%m.%Y %H:%M") if row[4] else None,
+            'service_type': row[5],
+            'result_params': row[6] if isinstance(row[6], dict) else json.loads(json.dumps(row[6]))
+        }
+        payments.append(payment)
+
+    return payments
+
+
+async def fetch_ai_response(cache_key: str) -> Dict[str, Any] | None:
+    """
+    Читает неистёкший ответ ИИ из таблицы кэша.
+    :param cache_key: Ключ запроса (sha256 нормализованного запроса)
+    :return: Словарь {'adjusted_result': ..., 'comment': ...} или None
+    """
+    try:
+        result = await fetch_one(
+            """
+            SELECT response FROM ai_response_cache
+            WHERE cache_key = %s AND expires_at > CURRENT_TIMESTAMP
+            """,
+            (cache_key,)
+        )
+        return result[0] if result else None
+    except psycopg.Error as error:
+        logging.error(f'Ошибка чтения кэша ответов ИИ: {error}')
+        return None
+
+
+async def store_ai_response(cache_key: str, response: Dict[str, Any], ttl: int) -> None:
+    """
+    Сохраняет ответ ИИ в таблицу кэша (перезаписывая прежний ответ с тем же ключом).
+    :param cache_key: Ключ запроса
+    :param response: Словарь {'adjusted_result': ..., 'comment': ...}
+    :param ttl: Время жизни записи в секундах
+    :return: None
+    """
+    try:
+        async with db_connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO ai_response_cache (cache_key, response, expires_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                ON CONFLICT (cache_key) DO UPDATE
+                SET response = EXCLUDED.response,
+                    created_at = CURRENT_TIMESTAMP,
+                    expires_at = EXCLUDED.expires_at
+                """,
+                (cache_key, json.dumps(response, ensure_ascii=False), ttl)
+            )
+    except psycopg.Error as error:
+        logging.error(f'Ошибка записи в кэш ответов ИИ: {error}')
+
+
+async def purge_expired_ai_responses() -> int:
+    """
+    Удаляет истёкшие записи кэша ответов ИИ.
+    :return: Количество удалённых записей
+    """
+    try:
+        async with db_connection() as conn:
+            cursor = await conn.execute('DELETE FROM ai_response_cache WHERE expires_at <= CURRENT_TIMESTAMP')
+            return cursor.rowcount
+    except psycopg.Error as error:
+        logging.error(f'Ошибка очистки кэша ответов ИИ: {error}')
+        return 0
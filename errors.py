@@ -5,6 +5,7 @@ import traceback
 import telebot
 
 import admins
+import outbound
 
 
 def error_save(short_error:str,bot: telebot.TeleBot):
@@ -24,10 +25,12 @@ def error_save(short_error:str,bot: telebot.TeleBot):
     for admin_id in admins.get_admin_list():
         try:
             logging.info(f'Отправка сообщения администратору с id: {admin_id}')
-            bot.send_document(
-                chat_id=admin_id,
-                document=open(error_path, 'rb'),
-                caption=f'Произошла ошибка в работе бота: {short_error}'
-            )
+            with open(error_path, 'rb') as document:
+                outbound.send_document(
+                    bot,
+                    chat_id=admin_id,
+                    document=document,
+                    caption=f'Произошла ошибка в работе бота: {short_error}'
+                )
         except (Exception, BaseException) as error:
             logging.error(f'Ошибка при отправке сообщения администратору: {error} \n {traceback.format_exc()}')
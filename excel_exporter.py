@@ -3,6 +3,26 @@ from io import BytesIO
 import logging
 from typing import Dict, Any, Optional
 
+
+def _autofit_columns(worksheet) -> None:
+    """
+    Подбирает ширину колонок листа по самому длинному значению.
+    :param worksheet: Лист openpyxl
+    :return: None
+    """
+    for column in worksheet.columns:
+        max_length = 0
+        column_letter = column[0].column_letter
+        for cell in column:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+        adjusted_width = (max_length + 2)
+        worksheet.column_dimensions[column_letter].width = adjusted_width
+
+
 def export_calculation_to_excel(calculation_data: Dict[str, Any]) -> Optional[BytesIO]:
     """
     Экспортирует данные расчёта в Excel файл
@@ -38,18 +58,7 @@ def export_calculation_to_excel(calculation_data: Dict[str, Any]) -> Optional[By
             df.to_excel(writer, index=False, sheet_name='Результат расчёта')
             
             # Автоматическая ширина колонок
-            worksheet = writer.sheets['Результат расчёта']
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+            _autofit_columns(writer.sheets['Результат расчёта'])
         
         output.seek(0)
         logging.info('Экспорт расчёта в Excel выполнен успешно')
@@ -57,3 +66,24 @@ def export_calculation_to_excel(calculation_data: Dict[str, Any]) -> Optional[By
     except Exception as error:
         logging.error(f'Ошибка при экспорте в Excel: {error}')
         return None
+
+
+def export_tables_to_excel(tables: Dict[str, pd.DataFrame]) -> Optional[BytesIO]:
+    """
+    Экспортирует таблицы в Excel файл, каждую на свой лист
+    :param tables: Словарь {название листа: DataFrame}
+    :return: BytesIO объект с Excel файлом или None в случае ошибки
+    """
+    try:
+        output = BytesIO()
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            for sheet_name, table in tables.items():
+                table.to_excel(writer, index=False, sheet_name=sheet_name)
+                _autofit_columns(writer.sheets[sheet_name])
+
+        output.seek(0)
+        logging.info(f'Экспорт таблиц в Excel выполнен успешно: {", ".join(tables)}')
+        return output
+    except Exception as error:
+        logging.error(f'Ошибка при экспорте таблиц в Excel: {error}')
+        return None
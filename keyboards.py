@@ -4,9 +4,10 @@ from telebot import types
 import database
 
 
-def main_keyboard(user_id: int) -> types.ReplyKeyboardMarkup:
+def _build_main_keyboard(with_export: bool) -> types.ReplyKeyboardMarkup:
     """
     Создаёт основную клавиатуру для главного меню бота.
+    :param with_export: Добавить кнопки истории расчётов и экспорта в Excel
     :return: Объект ReplyKeyboardMarkup с кнопками главного меню
     """
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
@@ -21,17 +22,33 @@ def main_keyboard(user_id: int) -> types.ReplyKeyboardMarkup:
     markup.add(button_3, button_4)
 
     # Добавляем кнопку экспорта только если есть расчёты
-    if database.user_has_calculations(user_id=user_id):
+    if with_export:
         button_export = types.KeyboardButton('📤 Экспорт в Excel')
         markup.add(calc_history_button, button_export)
         markup.add(pay_history_button, help_button)
     else:
         markup.add(pay_history_button, help_button)
 
-    logging.info('Создана клавиатура для главного меню')
     return markup
 
 
+# Оба варианта главного меню строятся один раз при импорте
+_MAIN_KEYBOARD = _build_main_keyboard(with_export=False)
+_MAIN_KEYBOARD_WITH_EXPORT = _build_main_keyboard(with_export=True)
+
+
+def main_keyboard(user_id: int) -> types.ReplyKeyboardMarkup:
+    """
+    Возвращает клавиатуру главного меню для пользователя.
+    Признак наличия расчётов берётся из кэша database.user_has_calculations.
+    :param user_id: ID пользователя
+    :return: Объект ReplyKeyboardMarkup с кнопками главного меню
+    """
+    if database.user_has_calculations(user_id=user_id):
+        return _MAIN_KEYBOARD_WITH_EXPORT
+    return _MAIN_KEYBOARD
+
+
 def help_keyboard() -> types.InlineKeyboardMarkup:
     """
     Создаёт inline-клавиатуру для меню помощи.
@@ -133,4 +150,26 @@ def additional_conditions_keyboard() -> types.InlineKeyboardMarkup:
     markup.add(skip_button)
     markup.add(custom_button)
     markup.add(back_button)
-    return markup
\ No newline at end of file
+    return markup
+
+
+def pagination_keyboard(prefix: str, newer_cursor: int = None,
+                        older_cursor: int = None) -> types.InlineKeyboardMarkup | None:
+    """
+    Создаёт inline-клавиатуру для перелистывания страниц истории.
+    :param prefix: Префикс callback_data (например, calc_page или pay_page)
+    :param newer_cursor: ID первой записи страницы, если есть более новые записи
+    :param older_cursor: ID последней записи страницы, если есть более старые записи
+    :return: InlineKeyboardMarkup или None, если листать некуда
+    """
+    buttons = []
+    if newer_cursor:
+        buttons.append(types.InlineKeyboardButton(text="◀️ Новее", callback_data=f"{prefix}_newer_{newer_cursor}"))
+    if older_cursor:
+        buttons.append(types.InlineKeyboardButton(text="Старее ▶️", callback_data=f"{prefix}_older_{older_cursor}"))
+    if not buttons:
+        return None
+
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*buttons)
+    return markup
@@ -0,0 +1,149 @@
+"""
+Упорядоченная по чатам параллельная обработка обновлений.
+
+LanedTeleBot распределяет входящие Update по configs.lanes['count'] рабочим полосам по хешу chat_id.
+Обновления одного чата попадают в одну полосу и обрабатываются строго по очереди (двойное нажатие
+кнопки не приводит к гонке на retrieve_data/set_state), обновления разных чатов - параллельно.
+Очередь полосы ограничена, поэтому при перегрузке приём новых обновлений (polling или webhook) замедляется.
+"""
+import logging
+import queue
+import threading
+import time
+from typing import List, Dict, Any
+
+from telebot import TeleBot, types
+
+import configs
+import metrics
+
+
+def get_update_chat_id(update: types.Update) -> int:
+    """
+    Определяет чат (или пользователя), к которому относится обновление.
+    :param update: Обновление Telegram
+    :return: ID чата; для обновлений без чата - ID пользователя или update_id
+    """
+    for message in (update.message, update.edited_message, update.channel_post, update.edited_channel_post):
+        if message is not None:
+            return message.chat.id
+    if update.callback_query is not None:
+        if update.callback_query.message is not None:
+            return update.callback_query.message.chat.id
+        return update.callback_query.from_user.id
+    for query in (update.pre_checkout_query, update.shipping_query, update.inline_query,
+                  update.chosen_inline_result):
+        if query is not None:
+            return query.from_user.id
+    for member in (update.my_chat_member, update.chat_member, update.chat_join_request):
+        if member is not None:
+            return member.chat.id
+    return update.update_id
+
+
+class Lane:
+    """
+    Рабочая полоса: очередь обновлений и поток, обрабатывающий их по одному.
+    """
+
+    def __init__(self, index: int, queue_size: int) -> None:
+        self.index = index
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.thread: threading.Thread | None = None
+
+
+class LanedTeleBot(TeleBot):
+    """
+    TeleBot, обрабатывающий обновления в полосах по chat_id.
+    Собственный пул потоков TeleBot не используется (threaded=False): обработчики выполняются в потоке полосы.
+    :param lanes: Количество полос
+    :param lane_queue_size: Максимальная длина очереди одной полосы
+    """
+
+    def __init__(self, token: str, lanes: int, lane_queue_size: int, **kwargs) -> None:
+        kwargs['threaded'] = False
+        super().__init__(token, **kwargs)
+        self.lanes = [Lane(index, lane_queue_size) for index in range(lanes)]
+        self._lanes_lock = threading.Lock()
+
+    def start_lanes(self) -> None:
+        """
+        Запускает потоки полос (повторный вызов ничего не делает).
+        :return: None
+        """
+        with self._lanes_lock:
+            for lane in self.lanes:
+                if lane.thread is None:
+                    lane.thread = threading.Thread(
+                        target=self._lane_loop, args=(lane,), name=f'lane-{lane.index}', daemon=True
+                    )
+                    lane.thread.start()
+
+    def process_new_updates(self, updates: List[types.Update]) -> None:
+        """
+        Раскладывает обновления по полосам и сразу возвращается
+        (блокируется, только если очередь нужной полосы заполнена).
+        :param updates: Список обновлений
+        :return: None
+        """
+        self.start_lanes()
+        for update in updates:
+            # Смещение для getUpdates сдвигаем сразу, иначе polling получит те же обновления повторно
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            lane = self.lanes[hash(get_update_chat_id(update)) % len(self.lanes)]
+            lane.queue.put((update, time.monotonic()))
+
+    def _lane_loop(self, lane: Lane) -> None:
+        """
+        Цикл полосы: обрабатывает обновления по одному штатными обработчиками TeleBot.
+        :param lane: Полоса
+        :return: None
+        """
+        while True:
+            update, _ = lane.queue.get()
+            started = time.perf_counter()
+            try:
+                super().process_new_updates([update])
+            except Exception as error:
+                lane.failed += 1
+                logging.error(f'Ошибка обработки обновления {update.update_id} в полосе {lane.index}: {error}',
+                              exc_info=True)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            lane.processed += 1
+            lane.total_ms += elapsed_ms
+            lane.max_ms = max(lane.max_ms, elapsed_ms)
+
+    def get_lane_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает длину очереди и задержку обработчиков для каждой полосы.
+        :return: Словарь {полоса: описание}
+        """
+        stats = {}
+        for lane in self.lanes:
+            avg_ms = round(lane.total_ms / lane.processed, 2) if lane.processed else 0.0
+            stats[f'lane_{lane.index}'] = (
+                f'queue={lane.queue.qsize()} processed={lane.processed} failed={lane.failed} '
+                f'avg_ms={avg_ms} max_ms={round(lane.max_ms, 2)}'
+            )
+        return stats
+
+
+def create_bot(state_storage) -> LanedTeleBot:
+    """
+    Создаёт бота с полосами обработки по настройкам configs.lanes.
+    :param state_storage: Хранилище состояний
+    :return: Объект LanedTeleBot
+    """
+    bot = LanedTeleBot(
+        configs.telegram_bot_token,
+        lanes=configs.lanes['count'],
+        lane_queue_size=configs.lanes['queue_size'],
+        state_storage=state_storage
+    )
+    metrics.register('Полосы обработки', bot.get_lane_stats)
+    return bot
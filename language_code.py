@@ -18,6 +18,30 @@ messages = {
         'conditions_too_short': 'Пожалуйста, опишите условия подробнее (минимум {} символов) или напишите "нет"/"skip" для пропуска.',
         'prompt_injection_detected': '⚠️ Обнаружена попытка prompt injection. Ваш аккаунт заблокирован.',
         'ai_processing': '🤖 Анализирую дополнительные условия с помощью ИИ...',
+        'ai_queued': '🤖 Запрос поставлен в очередь на анализ ИИ. Позиция в очереди: {}',
+        'ai_queue_full': '⚠️ Сервис ИИ сейчас перегружен. Используются базовые расчёты.',
+        'session_expired': '⌛ Сессия расчёта истекла из-за долгого бездействия. Пожалуйста, начните расчёт заново.',
+        'config_reloaded': '✅ Каталог обновлён: версия {}, источник {}',
+        'config_reload_failed': '❌ Каталог не обновлён, продолжает действовать прежняя версия.\n{}',
+        'sweep_usage': 'Использование: /sweep <сервис> <параметр>=<диапазон> [<параметр>=<диапазон>] '
+                       '[<параметр>=<значение> ...] [xlsx]\n'
+                       'Диапазон: 100..10000 (шаги по умолчанию), 100..10000:50 (50 шагов), '
+                       '0.5x..10x (множители базового значения) или список 100;500;1000.\n'
+                       'Пример: /sweep kafka messages_per_sec=0.5x..10x retention_hours=24;168;720',
+        'forecast_usage': 'Использование: /forecast <сервис> [months=<месяцев>] <параметр>=[<значение>]+<рост>% '
+                          '[<параметр>=<значение> ...] [xlsx]\n'
+                          'Рост задаётся в процентах в месяц (сложный процент), начальное значение необязательно.\n'
+                          'Пример: /forecast k8s months=24 pods_count=100+5% avg_ram_per_pod_gb=+2%',
+        'montecarlo_usage': 'Использование: /montecarlo <сервис> [samples=<выборок>] [seed=<зерно>] '
+                            '<параметр>=<распределение> [<параметр>=<значение> ...]\n'
+                            'Распределение: 500;1000;5000 (минимум;наиболее вероятное;максимум), '
+                            '500..5000 (равномерное) или 1000±200 (нормальное, можно 1000+-200).\n'
+                            'Пример: /montecarlo kafka messages_per_sec=500;2000;10000 retention_hours=72',
+        'stack_usage': 'Использование: /stack [<сервис> <сервис> ...]\n'
+                       'Без списка сервисов рассчитывается стек из всех сервисов.\n'
+                       'Пример: /stack kafka k8s redis',
+        'stack_started': '🧱 Расчёт стека: {}\nПараметры сервисов вводятся по очереди, '
+                         'дополнительные условия - один раз для всего стека.',
         'ai_error': '❌ Ошибка при обработке через ИИ. Используются базовые расчёты.',
     },
     'en': {
@@ -31,6 +55,30 @@ messages = {
         'conditions_too_short': 'Please describe the conditions in more detail (minimum {} characters) or write "no"/"skip" to skip.',
         'prompt_injection_detected': '⚠️ Prompt injection attempt detected. Your account has been banned.',
         'ai_processing': '🤖 Analyzing additional conditions using AI...',
+        'ai_queued': '🤖 Your request is queued for AI analysis. Position in queue: {}',
+        'ai_queue_full': '⚠️ The AI service is overloaded right now. Using basic calculations.',
+        'session_expired': '⌛ The sizing session expired due to inactivity. Please start the calculation again.',
+        'config_reloaded': '✅ Catalog reloaded: version {}, source {}',
+        'config_reload_failed': '❌ Catalog not reloaded, the previous version stays in effect.\n{}',
+        'sweep_usage': 'Usage: /sweep <service> <parameter>=<range> [<parameter>=<range>] '
+                       '[<parameter>=<value> ...] [xlsx]\n'
+                       'Range: 100..10000 (default steps), 100..10000:50 (50 steps), '
+                       '0.5x..10x (multipliers of the base value) or a list 100;500;1000.\n'
+                       'Example: /sweep kafka messages_per_sec=0.5x..10x retention_hours=24;168;720',
+        'forecast_usage': 'Usage: /forecast <service> [months=<months>] <parameter>=[<value>]+<growth>% '
+                          '[<parameter>=<value> ...] [xlsx]\n'
+                          'Growth is a monthly compound percentage, the starting value is optional.\n'
+                          'Example: /forecast k8s months=24 pods_count=100+5% avg_ram_per_pod_gb=+2%',
+        'montecarlo_usage': 'Usage: /montecarlo <service> [samples=<samples>] [seed=<seed>] '
+                            '<parameter>=<distribution> [<parameter>=<value> ...]\n'
+                            'Distribution: 500;1000;5000 (min;most likely;max), '
+                            '500..5000 (uniform) or 1000±200 (normal, 1000+-200 also works).\n'
+                            'Example: /montecarlo kafka messages_per_sec=500;2000;10000 retention_hours=72',
+        'stack_usage': 'Usage: /stack [<service> <service> ...]\n'
+                       'Without a service list the stack includes all services.\n'
+                       'Example: /stack kafka k8s redis',
+        'stack_started': '🧱 Stack sizing: {}\nService parameters are entered one after another, '
+                         'additional conditions once for the whole stack.',
         'ai_error': '❌ Error processing via AI. Using basic calculations.',
     }
 }
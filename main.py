@@ -5,33 +5,55 @@ import os
 import json
 from io import BytesIO
 
-from telebot import TeleBot, types
+from telebot import types
 from telebot import apihelper
 
-from telebot.storage import StateMemoryStorage
-
 import configs
 import logs
 import database
 import keyboards
 import supports
 import errors
+import calculation_cache
 import calculators
+import config_loader
 import language_code
-import ai_processor
+import ai_queue
+import lanes
 import payment_calculator
+import projection
+import router
+import stack
 import excel_exporter
 import utils
-import classes
+import admins
+import metrics
+import monte_carlo
+import node_optimizer
+import outbound
+import storages
+import sweep
+import webhook
 
 
 apihelper.ENABLE_MIDDLEWARE = True
 
 # Инициализация бота с state storage
-state_storage = StateMemoryStorage()
-bot = TeleBot(token=configs.telegram_bot_token, state_storage=state_storage)
+state_storage = storages.create_state_storage()
+bot = lanes.create_bot(state_storage)
 
 
+def service_not_found_text(user_id: int, chat_id: int) -> str:
+    """
+    Текст для случая, когда в данных пользователя нет сервиса:
+    уведомление об истёкшей сессии, если она была удалена по простою, иначе сообщение об ошибке.
+    :param user_id: ID пользователя
+    :param chat_id: ID чата
+    :return: Текст сообщения
+    """
+    if state_storage.pop_expired(chat_id, user_id, bot_id=bot.bot_id):
+        return language_code.messages['ru']['session_expired']
+    return 'Ошибка: сервис не определён'
 
 
 # Middleware для проверки бана
@@ -39,7 +61,8 @@ bot = TeleBot(token=configs.telegram_bot_token, state_storage=state_storage)
 def check_ban_middleware(bot_instance, message):
     user_id = message.from_user.id
     if database.is_user_banned(user_id):
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
             text='⛔ Ваш аккаунт заблокирован за попытку prompt injection.'
         )
@@ -59,7 +82,7 @@ def start_handler(message: types.Message) -> None:
     user_id = message.from_user.id
 
     if database.is_user_banned(user_id):
-        bot.send_message(message.chat.id, '⛔ Ваш аккаунт заблокирован.')
+        outbound.send_message(bot, message.chat.id, '⛔ Ваш аккаунт заблокирован.')
         return
 
     language = message.from_user.language_code
@@ -74,10 +97,12 @@ def start_handler(message: types.Message) -> None:
     welcome_text = language_code.hello_dict[language]
     welcome_text += "\n\nВыберите сервис из меню ниже для расчёта необходимых ресурсов."
 
-    bot.send_message(
+    outbound.send_message(
+        bot,
         chat_id=message.chat.id,
         text=welcome_text,
-        reply_markup=keyboards.main_keyboard(user_id)
+        reply_markup=keyboards.main_keyboard(user_id),
+        priority=outbound.PRIORITY_LOW
     )
     logging.info(f'Пользователь {message.from_user.full_name} (id {user_id}) запустил бота')
 
@@ -97,6 +122,10 @@ def help_handler(message: types.Message) -> None:
 /start - Запуск бота
 /help - Справка
 /menu - Главное меню
+/sweep - Анализ чувствительности расчёта к параметрам
+/forecast - Прогноз сайзинга и стоимости при росте нагрузки
+/montecarlo - Перцентили сайзинга и стоимости при неопределённой нагрузке
+/stack - Расчёт стека из нескольких сервисов одним запросом
 
 Доступные расчёты:
 ☕ Kafka - расчёт брокеров и хранилища
@@ -108,10 +137,12 @@ def help_handler(message: types.Message) -> None:
 
 Просто выберите нужный сервис из меню!
 """
-    bot.send_message(
+    outbound.send_message(
+        bot,
         chat_id=message.chat.id,
         text=help_text,
-        reply_markup=keyboards.help_keyboard()
+        reply_markup=keyboards.help_keyboard(),
+        priority=outbound.PRIORITY_LOW
     )
 
 
@@ -123,35 +154,226 @@ def menu_handler(message: types.Message) -> None:
     :param message: Объект сообщения от пользователя
     :return: None
     """
-    bot.send_message(
+    outbound.send_message(
+        bot,
         chat_id=message.chat.id,
         text='Главное меню. Выберите сервис:',
-        reply_markup=keyboards.main_keyboard(message.from_user.id)
+        reply_markup=keyboards.main_keyboard(message.from_user.id),
+        priority=outbound.PRIORITY_LOW
+    )
+
+
+# Обработчик команды /stats (только для администраторов)
+@bot.message_handler(commands=['stats'])
+def stats_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /stats. Показывает администратору метрики бота.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    if not admins.check_is_admin(message.from_user.id):
+        unknown_message(message)
+        return
+
+    outbound.send_message(bot, chat_id=message.chat.id, text=metrics.format_stats(), priority=outbound.PRIORITY_LOW)
+
+
+# Обработчик команды /reload_config (только для администраторов)
+@bot.message_handler(commands=['reload_config'])
+def reload_config_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /reload_config. Перечитывает каталог сайзинга и цен без перезапуска бота.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    if not admins.check_is_admin(message.from_user.id):
+        unknown_message(message)
+        return
+
+    try:
+        catalog = config_loader.reload()
+        text = language_code.messages['ru']['config_reloaded'].format(catalog.version, catalog.source)
+    except config_loader.CatalogError as error:
+        text = language_code.messages['ru']['config_reload_failed'].format(error)
+    outbound.send_message(bot, chat_id=message.chat.id, text=text)
+
+
+def send_command_error(chat_id: int, error: Exception, usage_key: str) -> None:
+    """
+    Отправляет ошибку разбора команды вместе с подсказкой по её формату.
+    :param chat_id: ID чата
+    :param error: Ошибка разбора
+    :param usage_key: Ключ подсказки в language_code.messages
+    :return: None
+    """
+    outbound.send_message(
+        bot,
+        chat_id=chat_id,
+        text=f'❌ {error}\n\n' + language_code.messages['ru'][usage_key],
+        priority=outbound.PRIORITY_LOW
     )
 
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['☕ kafka', 'kafka', 'кафка'])
-def kafka_start(message: types.Message) -> None:
-    """Начало процесса расчёта Kafka"""
-    start_service_flow('kafka', message)
+def send_excel_tables(chat_id: int, tables: dict, file_name: str, caption: str) -> None:
+    """
+    Отправляет таблицы файлом Excel, по листу на таблицу.
+    :param chat_id: ID чата
+    :param tables: {название листа: DataFrame}
+    :param file_name: Имя файла
+    :param caption: Подпись к файлу
+    :return: None
+    """
+    excel_buffer = excel_exporter.export_tables_to_excel(tables)
+    if excel_buffer is None:
+        outbound.send_message(bot, chat_id=chat_id, text='❌ Ошибка при создании Excel файла. Попробуйте позже.')
+        return
+    outbound.send_document(bot, chat_id=chat_id, document=excel_buffer.getvalue(),
+                           visible_file_name=file_name, caption=caption)
+    excel_buffer.close()
+
+
+# Обработчик команды /sweep (анализ чувствительности)
+@bot.message_handler(commands=['sweep'])
+def sweep_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /sweep. Показывает, как меняются результаты расчёта и стоимость
+    при изменении одного или двух параметров: таблицей в сообщении или файлом Excel.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    chat_id = message.chat.id
+    try:
+        request = sweep.parse_request(message.text)
+        frame = sweep.run_sweep(request.service, request.base_params, request.axes)
+    except sweep.SweepError as error:
+        send_command_error(chat_id, error, 'sweep_usage')
+        return
+
+    if not request.as_excel:
+        outbound.send_message(bot, chat_id=chat_id, text=sweep.format_table(request, frame), parse_mode='HTML')
+        return
+
+    send_excel_tables(chat_id, {'Sweep': frame}, f'sweep_{request.service}.xlsx',
+                      f'📐 Анализ чувствительности: {len(frame)} точек')
+
+
+# Обработчик команды /forecast (прогноз роста)
+@bot.message_handler(commands=['forecast'])
+def forecast_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /forecast. Прогнозирует сайзинг и стоимость по месяцам при росте нагрузки:
+    сводкой в сообщении или файлом Excel.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    chat_id = message.chat.id
+    try:
+        request = projection.parse_request(message.text)
+        result = projection.run_projection(request.service, request.base_params, request.growth, request.months)
+    except projection.ProjectionError as error:
+        send_command_error(chat_id, error, 'forecast_usage')
+        return
+
+    if not request.as_excel:
+        outbound.send_message(bot, chat_id=chat_id, text=projection.format_summary(request, result))
+        return
+
+    send_excel_tables(chat_id, {'Прогноз': result.timeline, 'Изменения': result.steps},
+                      f'forecast_{request.service}_{request.months}m.xlsx', f'📈 Прогноз на {request.months} мес.')
+
+
+# Обработчик команды /montecarlo (расчёт с неопределённостью)
+@bot.message_handler(commands=['montecarlo'])
+def montecarlo_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /montecarlo. Параметры задаются распределениями, в ответ приходят
+    перцентили P50/P90/P99 ключевых показателей и месячной стоимости.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    chat_id = message.chat.id
+    try:
+        request = monte_carlo.parse_request(message.text)
+        percentiles = monte_carlo.run_simulation(request.service, request.base_params, request.distributions,
+                                                 request.samples, request.seed)
+    except monte_carlo.MonteCarloError as error:
+        send_command_error(chat_id, error, 'montecarlo_usage')
+        return
+
+    outbound.send_message(bot, chat_id=chat_id, text=monte_carlo.format_summary(request, percentiles),
+                          parse_mode='HTML')
+
+
+# Обработчик команды /stack (расчёт стека сервисов)
+@bot.message_handler(commands=['stack'])
+def stack_handler(message: types.Message) -> None:
+    """
+    Обработчик команды /stack. Запускает ввод параметров нескольких сервисов подряд:
+    дополнительные условия задаются один раз, результат и стоимость приходят одним сообщением.
+    :param message: Объект сообщения от пользователя
+    :return: None
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    try:
+        services = stack.parse_services(message.text)
+    except stack.StackError as error:
+        send_command_error(chat_id, error, 'stack_usage')
+        return
+
+    bot.delete_state(user_id, chat_id)
+    outbound.send_message(bot, chat_id, language_code.messages['ru']['stack_started'].format(
+        stack.format_services(services)))
+    start_service_flow(services[0], message)
 
+    with bot.retrieve_data(user_id, chat_id) as data:
+        data['stack'] = {'services': services, 'params': {}}
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['⎈ kubernetes', 'kubernetes', 'k8s', 'кубер'])
-def k8s_start(message: types.Message) -> None:
-    """Начало процесса расчёта Kubernetes"""
-    start_service_flow('kubernetes', message)
 
+def advance_stack(user_id: int, chat_id: int, service_name: str, message_id: int) -> bool:
+    """
+    После последнего параметра сервиса стека переходит к параметрам следующего сервиса.
+    :param user_id: ID пользователя
+    :param chat_id: ID чата
+    :param service_name: Сервис, ввод параметров которого завершён
+    :param message_id: ID сообщения с экраном параметра
+    :return: True, если показан первый параметр следующего сервиса; False - расчёт не стека или сервис последний
+    """
+    with bot.retrieve_data(user_id, chat_id) as data:
+        stack_data = data.get('stack')
+        next_service = stack.next_service(stack_data['services'], service_name) if stack_data else None
+        if next_service is None:
+            return False
+
+        # Параметры убираются из общих данных: у Kafka и RabbitMQ есть параметры с одинаковыми именами
+        params = stack.service_params(service_name, data)
+        for name in params:
+            del data[name]
+        stack_data['params'][service_name] = params
+        data['stack'] = stack_data
+        data['service_name'] = next_service
+
+        config = utils.get_service_config(next_service)
+        first_param = utils.get_ordered_parameters(next_service)[0]
+        param_config = config['parameters'][first_param]
+        position = stack_data['services'].index(next_service) + 1
+        text = (f'{config["display_name"]} Расчёт кластера ({position}/{len(stack_data["services"])})\n\n'
+                f'{param_config["text"]}')
+        markup = keyboards.range_keyboard(first_param, param_config['ranges'])
+        try:
+            outbound.edit_message_text(bot, chat_id=chat_id, message_id=message_id, text=text, reply_markup=markup)
+        except Exception:
+            data['last_message_id'] = outbound.send_message(bot, chat_id=chat_id, text=text,
+                                                            reply_markup=markup).message_id
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['🗄️ redis', 'redis', 'редис'])
-def redis_start(message: types.Message) -> None:
-    """Начало процесса расчёта Redis"""
-    start_service_flow('redis', message)
+    bot.set_state(user_id, utils.get_state_enum(next_service, first_param), chat_id)
+    return True
 
 
-@bot.message_handler(func=lambda message: message.text.lower() in ['🐰 rabbitmq', 'rabbitmq', 'rabbit', 'раббит'])
-def rabbitmq_start(message: types.Message) -> None:
-    """Начало процесса расчёта RabbitMQ"""
-    start_service_flow('rabbitmq', message)
+@router.message_route('service')
+def service_start(message: types.Message, route: router.TextRoute) -> None:
+    """Начало процесса расчёта сервиса по кнопке меню или названию (в том числе синонимам)"""
+    start_service_flow(route.service, message)
 
 
 def start_service_flow(service_name: str, message: types.Message) -> None:
@@ -161,18 +383,19 @@ def start_service_flow(service_name: str, message: types.Message) -> None:
 
     config = utils.get_service_config(service_name)
     if not config:
-        bot.send_message(chat_id, 'Ошибка: неизвестный сервис')
+        outbound.send_message(bot, chat_id, 'Ошибка: неизвестный сервис')
         return
 
     params = utils.get_ordered_parameters(service_name)
     if not params:
-        bot.send_message(chat_id, 'Ошибка: параметры не настроены')
+        outbound.send_message(bot, chat_id, 'Ошибка: параметры не настроены')
         return
 
     first_param = params[0]
     param_config = config['parameters'][first_param]
 
-    msg = bot.send_message(
+    msg = outbound.send_message(
+        bot,
         chat_id=chat_id,
         text=f'{config["display_name"]} Расчёт кластера\n\n{param_config["text"]}',
         reply_markup=keyboards.range_keyboard(first_param, param_config['ranges'])
@@ -185,27 +408,29 @@ def start_service_flow(service_name: str, message: types.Message) -> None:
     with bot.retrieve_data(user_id, chat_id) as data:
         data['last_message_id'] = msg.message_id
         data['service_name'] = service_name
+        # Расчёт одного сервиса прерывает незавершённый расчёт стека
+        data.pop('stack', None)
 
 
 # === УНИВЕРСАЛЬНЫЕ CALLBACK HANDLERS ===
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('range_'))
-def handle_range_selection(call: types.CallbackQuery) -> None:
+@router.callback_route('range')
+def handle_range_selection(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Универсальный обработчик выбора диапазона для любого параметра любого сервиса"""
     user_id = call.from_user.id
     chat_id = call.message.chat.id
 
-    # Парсим callback_data: range_param_name_value
-    parts = call.data.split('_')
-    param_name = '_'.join(parts[1:-1])
-    value_str = parts[-1]
+    # callback_data range_<param>_<value> уже разобран маршрутизатором
+    param_name = route.param
+    value_str = route.value
 
     # Получаем сервис из данных пользователя
     with bot.retrieve_data(user_id, chat_id) as data:
         service_name = data.get('service_name')
 
     if not service_name:
-        bot.answer_callback_query(call.id, "Ошибка: сервис не определён")
+        bot.answer_callback_query(call.id, service_not_found_text(call.from_user.id, call.message.chat.id),
+                                  show_alert=True)
         return
 
     service_config = utils.get_service_config(service_name)
@@ -232,12 +457,19 @@ def handle_range_selection(call: types.CallbackQuery) -> None:
     # Переходим к следующему шагу
     next_param = utils.get_next_parameter(service_name, param_name)
 
+    if next_param == 'additional_conditions' and advance_stack(user_id, chat_id, service_name,
+                                                               call.message.message_id):
+        # Стек: показан первый параметр следующего сервиса
+        bot.answer_callback_query(call.id)
+        return
+
     if next_param == 'additional_conditions':
         # Последний шаг - показываем экран доп. условий
         with bot.retrieve_data(user_id, chat_id) as data:
             summary = utils.format_summary(service_name, data)
 
-        bot.edit_message_text(
+        outbound.edit_message_text(
+            bot,
             chat_id=chat_id,
             message_id=call.message.message_id,
             text=summary + language_code.messages['ru']['additional_conditions'].format(
@@ -245,8 +477,7 @@ def handle_range_selection(call: types.CallbackQuery) -> None:
             reply_markup=keyboards.additional_conditions_keyboard()
         )
 
-        state_group = service_config.get('state_group')
-        additional_state = getattr(eval(state_group), 'additional_conditions', None)
+        additional_state = utils.get_state_enum(service_name, 'additional_conditions')
         if additional_state:
             bot.set_state(user_id, additional_state, chat_id)
     else:
@@ -260,13 +491,14 @@ def handle_range_selection(call: types.CallbackQuery) -> None:
     bot.answer_callback_query(call.id)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('custom_'))
-def handle_custom_input_request(call: types.CallbackQuery) -> None:
+@router.callback_route('custom')
+def handle_custom_input_request(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Универсальный обработчик запроса на ввод своего значения"""
-    param_name = call.data.replace('custom_', '')
+    param_name = route.param
 
     if param_name == 'conditions':
-        bot.edit_message_text(
+        outbound.edit_message_text(
+            bot,
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
             text='✏️ ' + language_code.messages['ru']['additional_conditions'].format(
@@ -280,7 +512,8 @@ def handle_custom_input_request(call: types.CallbackQuery) -> None:
         service_name = data.get('service_name')
 
     if not service_name:
-        bot.answer_callback_query(call.id, "Ошибка: сервис не определён")
+        bot.answer_callback_query(call.id, service_not_found_text(call.from_user.id, call.message.chat.id),
+                                  show_alert=True)
         return
 
     service_config = utils.get_service_config(service_name)
@@ -295,7 +528,8 @@ def handle_custom_input_request(call: types.CallbackQuery) -> None:
     if 'min' in validation and 'max' in validation:
         hint = f'\nВведите число от {validation["min"]} до {validation["max"]}:'
 
-    bot.edit_message_text(
+    outbound.edit_message_text(
+        bot,
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
         text=f'✏️ {param_config["text"]}{hint}'
@@ -303,20 +537,21 @@ def handle_custom_input_request(call: types.CallbackQuery) -> None:
     bot.answer_callback_query(call.id)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('back_from_'))
-def handle_back_navigation(call: types.CallbackQuery) -> None:
+@router.callback_route('back_from')
+def handle_back_navigation(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Универсальный обработчик кнопки 'Назад'"""
     user_id = call.from_user.id
     chat_id = call.message.chat.id
 
-    current_param = call.data.replace('back_from_', '')
+    current_param = route.param
 
     # Получаем сервис
     with bot.retrieve_data(user_id, chat_id) as data:
         service_name = data.get('service_name')
 
     if not service_name:
-        bot.answer_callback_query(call.id, "Ошибка: сервис не определён")
+        bot.answer_callback_query(call.id, service_not_found_text(call.from_user.id, call.message.chat.id),
+                                  show_alert=True)
         return
 
     # Определяем предыдущий параметр
@@ -326,10 +561,12 @@ def handle_back_navigation(call: types.CallbackQuery) -> None:
         # Возврат в главное меню
         bot.delete_state(user_id, chat_id)
         bot.delete_message(chat_id, call.message.message_id)
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=chat_id,
             text='Главное меню. Выберите сервис:',
-            reply_markup=keyboards.main_keyboard(user_id)
+            reply_markup=keyboards.main_keyboard(user_id),
+            priority=outbound.PRIORITY_LOW
         )
         bot.answer_callback_query(call.id)
         return
@@ -343,11 +580,11 @@ def handle_back_navigation(call: types.CallbackQuery) -> None:
     bot.answer_callback_query(call.id)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('back_') and not call.data.startswith('back_from_'))
-def handle_back_after_validation_error(call: types.CallbackQuery) -> None:
+@router.callback_route('back')
+def handle_back_after_validation_error(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Возврат к выбору после ошибки валидации"""
     user_id = call.from_user.id
-    param_name = call.data.replace('back_', '')
+    param_name = route.param
 
     with bot.retrieve_data(user_id, call.message.chat.id) as data:
         service_name = data.get('service_name')
@@ -357,8 +594,8 @@ def handle_back_after_validation_error(call: types.CallbackQuery) -> None:
     bot.answer_callback_query(call.id)
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'skip_conditions')
-def handle_skip_conditions(call: types.CallbackQuery) -> None:
+@router.callback_route('skip_conditions')
+def handle_skip_conditions(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Обработка пропуска дополнительных условий"""
     bot.answer_callback_query(call.id)
     bot.delete_message(call.message.chat.id, call.message.message_id)
@@ -369,7 +606,7 @@ def handle_skip_conditions(call: types.CallbackQuery) -> None:
         params = data
 
     if not service_name:
-        bot.send_message(call.message.chat.id, 'Ошибка: сервис не определён')
+        outbound.send_message(bot, call.message.chat.id, service_not_found_text(call.from_user.id, call.message.chat.id))
         return
 
     # Выполняем расчет
@@ -378,116 +615,263 @@ def handle_skip_conditions(call: types.CallbackQuery) -> None:
 
 def perform_calculation(service_name: str, message: types.Message, params: dict, additional_conditions: str = None):
     """Универсальная функция выполнения расчёта для любого сервиса"""
+    if params.get('stack'):
+        perform_stack_calculation(message, params, additional_conditions)
+        return
+
     service_config = utils.get_service_config(service_name)
     if not service_config:
-        bot.send_message(message.chat.id, 'Ошибка: неизвестный сервис')
+        outbound.send_message(bot, message.chat.id, 'Ошибка: неизвестный сервис')
         return
 
     user_id = message.chat.id
+    chat_id = message.chat.id
 
     logging.info(f'Пользователь {user_id} запустил расчёт {service_name}')
 
-    # Получаем функцию калькулятора
+    # Калькулятор вызывается кэшем расчётов, здесь только проверяем, что он существует
     calculator_name = service_config.get('calculator')
-    calculator_func = getattr(calculators, calculator_name, None)
-
-    if not calculator_func:
-        bot.send_message(message.chat.id, f'Ошибка: калькулятор {calculator_name} не найден')
+    if not callable(getattr(calculators, calculator_name, None)):
+        outbound.send_message(bot, message.chat.id, f'Ошибка: калькулятор {calculator_name} не найден')
         return
 
-    # Базовый расчёт
+    # Базовый расчёт (повторные расчёты с теми же параметрами берутся из кэша)
     try:
-        base_result = calculator_func(params)
+        calculation = calculation_cache.calculate(service_name, params)
     except Exception as e:
         logging.error(f'Ошибка расчёта {service_name}: {e}')
-        bot.send_message(message.chat.id, 'Ошибка при выполнении расчёта')
+        outbound.send_message(bot, message.chat.id, 'Ошибка при выполнении расчёта')
         return
 
-    final_result = base_result.copy()
-    ai_comment = None
+    # Диалог завершается здесь, в полосе чата. finish_calculation может выполниться позже в потоке ИИ,
+    # и сброс состояния оттуда стёр бы диалог, начатый пользователем за время ожидания
+    bot.delete_state(user_id, chat_id)
+    params = dict(params)
 
-    # ИИ обработка
-    if additional_conditions:
-        bot.send_message(message.chat.id, language_code.messages['ru']['ai_processing'])
-        adjusted_result, ai_comment = ai_processor.adjust_sizing_with_ai(
-            service_name, params, base_result, additional_conditions
-        )
+    if not additional_conditions:
+        finish_calculation(service_name, chat_id, user_id, params, calculation)
+        return
 
+    # ИИ обработка выполняется в очереди, поток обработчика освобождается сразу
+    processing_msg = outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_processing'])
+
+    job = ai_queue.AIJob(
+        service_name, params, calculation.result, additional_conditions,
+        on_done=lambda adjusted_result, ai_comment: finish_calculation(
+            service_name, chat_id, user_id, params, calculation,
+            adjusted_result, ai_comment, additional_conditions
+        ),
+        on_progress=lambda position: show_ai_progress(chat_id, processing_msg.message_id, position)
+    )
+    if ai_queue.submit(job) is None:
+        outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_queue_full'])
+        finish_calculation(service_name, chat_id, user_id, params, calculation)
+
+
+def show_ai_progress(chat_id: int, message_id: int, position: int) -> None:
+    """
+    Обновляет сообщение о ходе AI-обработки.
+    :param chat_id: ID чата
+    :param message_id: ID сообщения "Анализирую..."
+    :param position: Позиция в очереди (0 - запрос обрабатывается)
+    :return: None
+    """
+    if position > 0:
+        text = language_code.messages['ru']['ai_queued'].format(position)
+    else:
+        text = language_code.messages['ru']['ai_processing']
+
+    def _on_edited(done) -> None:
+        # Telegram отклоняет редактирование без изменения текста - это не ошибка
+        if done.exception() is not None:
+            logging.debug(f'Не удалось обновить сообщение о прогрессе AI: {done.exception()}')
+
+    # Результат не ждём: рабочий поток AI не должен простаивать в очереди исходящих сообщений
+    future = outbound.submit(chat_id, bot.edit_message_text, text, chat_id, message_id,
+                             priority=outbound.PRIORITY_LOW)
+    future.add_done_callback(_on_edited)
+
+
+def finish_calculation(service_name: str, chat_id: int, user_id: int, params: dict,
+                       calculation: calculation_cache.CalculationEntry,
+                       adjusted_result: dict = None, ai_comment: str = None,
+                       additional_conditions: str = None) -> None:
+    """
+    Завершает расчёт: применяет корректировку ИИ, форматирует результат,
+    считает стоимость, сохраняет расчёт и отправляет его пользователю.
+    Без корректировки ИИ текст и стоимость берутся из calculation - той же записи кэша,
+    что и базовый результат, даже если каталог успел перезагрузиться.
+    """
+    final_result = calculation.result.copy()
+    adjusted = False
+
+    if additional_conditions:
         if ai_comment == 'PROMPT_INJECTION_DETECTED':
-            database.ban_user(user_id)
-            bot.send_message(
-                message.chat.id,
-                language_code.messages['ru']['prompt_injection_detected']
-            )
-            bot.delete_state(user_id, message.chat.id)
-            logging.warning(f'Пользователь {user_id} забанен за prompt injection')
+            ban_for_prompt_injection(user_id, chat_id)
             return
 
         if adjusted_result:
             final_result = adjusted_result
+            adjusted = True
         elif ai_comment is None:
-            bot.send_message(message.chat.id, language_code.messages['ru']['ai_error'])
-
-    # Формирование результата
-    result_text = calculators.format_result(service_name, final_result, ai_comment)
-    cost_details = payment_calculator.calculate_monthly_cost(service_name, final_result)
+            outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_error'])
+
+    # Формирование результата: без корректировки ИИ текст и стоимость уже посчитаны
+    if adjusted:
+        result_text = calculators.format_result(service_name, final_result, ai_comment)
+        if service_name == 'kubernetes':
+            node_plan_text = node_optimizer.recommend_for_k8s(params, final_result)
+            if node_plan_text:
+                result_text = f'{result_text}\n{node_plan_text}'
+        cost_details = payment_calculator.calculate_monthly_cost(service_name, final_result)
+    else:
+        result_text, cost_details = calculation.text, calculation.cost_details
 
-    # Сохранение в БД
-    calculation_id = database.save_calculation(
+    # Сохранение в БД выполняется параллельно с отправкой результата
+    save_future = database.submit_save_calculation(
         user_id, service_name, params, final_result,
         ai_comment, additional_conditions
     )
 
     # Отправка результата
-    bot.send_message(chat_id=message.chat.id, text=result_text)
-    bot.delete_state(user_id, message.chat.id)
-    offer_payment_for_calculation(message, calculation_id, cost_details)
+    outbound.send_message(bot, chat_id=chat_id, text=result_text)
+    calculation_id = save_future.result()
+    offer_payment_for_calculation(chat_id, calculation_id, cost_details)
+
+
+def ban_for_prompt_injection(user_id: int, chat_id: int) -> None:
+    """
+    Блокирует пользователя, в дополнительных условиях которого обнаружен prompt injection.
+    :param user_id: ID пользователя
+    :param chat_id: ID чата
+    :return: None
+    """
+    database.ban_user(user_id)
+    outbound.send_message(
+        bot,
+        chat_id,
+        language_code.messages['ru']['prompt_injection_detected']
+    )
+    logging.warning(f'Пользователь {user_id} забанен за prompt injection')
+
+
+def perform_stack_calculation(message: types.Message, data: dict, additional_conditions: str = None) -> None:
+    """
+    Расчёт стека: калькуляторы всех сервисов и одна корректировка ИИ на весь стек.
+    :param message: Сообщение, в чат которого отправляется результат
+    :param data: Данные состояния (параметры собранных сервисов в data['stack'], последнего - в самих данных)
+    :param additional_conditions: Дополнительные условия ко всему стеку
+    :return: None
+    """
+    user_id = message.chat.id
+    chat_id = message.chat.id
+
+    stack_params = dict(data['stack']['params'])
+    stack_params[data['service_name']] = stack.service_params(data['service_name'], data)
+    logging.info(f'Пользователь {user_id} запустил расчёт стека {", ".join(stack_params)}')
+
+    try:
+        base_results = stack.calculate(stack_params)
+    except Exception as e:
+        logging.error(f'Ошибка расчёта стека: {e}')
+        outbound.send_message(bot, chat_id, 'Ошибка при выполнении расчёта')
+        return
+
+    # Как и в perform_calculation, состояние сбрасывается до постановки в очередь ИИ
+    bot.delete_state(user_id, chat_id)
+
+    if not additional_conditions:
+        finish_stack_calculation(chat_id, user_id, stack_params, base_results)
+        return
+
+    # Один запрос к ИИ на весь стек вместо отдельного запроса на каждый сервис
+    processing_msg = outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_processing'])
+
+    job = ai_queue.AIJob(
+        stack.STACK_SERVICE, stack_params, base_results, additional_conditions,
+        on_done=lambda adjusted_results, ai_comment: finish_stack_calculation(
+            chat_id, user_id, stack_params, base_results,
+            adjusted_results, ai_comment, additional_conditions
+        ),
+        on_progress=lambda position: show_ai_progress(chat_id, processing_msg.message_id, position)
+    )
+    if ai_queue.submit(job) is None:
+        outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_queue_full'])
+        finish_stack_calculation(chat_id, user_id, stack_params, base_results)
+
+
+def finish_stack_calculation(chat_id: int, user_id: int, stack_params: dict, base_results: dict,
+                             adjusted_results: dict = None, ai_comment: str = None,
+                             additional_conditions: str = None) -> None:
+    """
+    Завершает расчёт стека: применяет корректировку ИИ, отправляет общий результат и общую стоимость,
+    сохраняет расчёты сервисов одной группой.
+    """
+    final_results = base_results
+
+    if additional_conditions:
+        if ai_comment == 'PROMPT_INJECTION_DETECTED':
+            ban_for_prompt_injection(user_id, chat_id)
+            return
+
+        if adjusted_results:
+            final_results = adjusted_results
+        elif ai_comment is None:
+            outbound.send_message(bot, chat_id, language_code.messages['ru']['ai_error'])
+
+    result_text = stack.format_result(stack_params, final_results, ai_comment)
+    cost_details = stack.calculate_cost(final_results)
+
+    # Расчёты сервисов сохраняются параллельно друг с другом и с отправкой результата
+    group_id = stack.new_group_id()
+    save_futures = [
+        database.submit_save_calculation(
+            user_id, service_name, stack_params[service_name], result,
+            ai_comment, additional_conditions, group_id
+        )
+        for service_name, result in final_results.items()
+    ]
+
+    outbound.send_message(bot, chat_id=chat_id, text=result_text)
+    calculation_ids = [future.result() for future in save_futures]
+    logging.info(f'Расчёт стека {group_id} сохранён: {calculation_ids}')
+    outbound.send_message(bot, chat_id=chat_id, text=payment_calculator.format_payment_invoice(cost_details))
 
 
 # === УНИВЕРСАЛЬНЫЙ MESSAGE HANDLER ===
 
-@bot.message_handler(state=[
-    classes.KafkaSizing.messages_per_sec, classes.KafkaSizing.message_size_kb,
-    classes.KafkaSizing.retention_hours, classes.KafkaSizing.replication_factor,
-    classes.K8sSizing.pods_count, classes.K8sSizing.avg_cpu_per_pod,
-    classes.K8sSizing.avg_ram_per_pod_gb, classes.K8sSizing.high_availability,
-    classes.RedisSizing.dataset_size_gb, classes.RedisSizing.operations_per_sec,
-    classes.RedisSizing.high_availability, classes.RedisSizing.persistence,
-    classes.RabbitMQSizing.messages_per_sec, classes.RabbitMQSizing.message_size_kb,
-    classes.RabbitMQSizing.queue_depth, classes.RabbitMQSizing.high_availability
-])
-def handle_parameter_input(message: types.Message) -> None:
+@router.message_route('parameter')
+def handle_parameter_input(message: types.Message, route: router.StateRoute) -> None:
     """Универсальный обработчик ввода параметров для всех сервисов"""
     if message.text == '❌ Отмена':
         bot.delete_state(message.from_user.id, message.chat.id)
-        bot.send_message(message.chat.id, 'Операция отменена.',
-                         reply_markup=keyboards.main_keyboard(message.from_user.id))
+        outbound.send_message(bot, message.chat.id, 'Операция отменена.',
+                              reply_markup=keyboards.main_keyboard(message.from_user.id))
         return
 
     user_id = message.from_user.id
     chat_id = message.chat.id
 
-    # Определяем сервис и параметр из состояния
-    current_state = bot.get_state(user_id, chat_id)
-
     with bot.retrieve_data(user_id, chat_id) as data:
         service_name = data.get('service_name')
 
     if not service_name:
-        bot.send_message(chat_id, 'Ошибка: сервис не определён')
+        # Сервис не определён - сбрасываем состояние
+        bot.delete_state(user_id, chat_id)
+        outbound.send_message(
+            bot,
+            chat_id=chat_id,
+            text='Произошла ошибка. Пожалуйста, начните заново.',
+            reply_markup=keyboards.main_keyboard(user_id)
+        )
         return
 
-    # Определяем параметр из состояния
-    service_name_from_state, param_name = utils.get_service_by_state(str(current_state))
-
-    if not param_name:
-        # Пытаемся извлечь имя параметра из имени состояния
-        state_name = str(current_state).split(':')[-1]
-        param_name = state_name
+    # Параметр определён маршрутизатором по состоянию
+    param_name = route.param
 
     service_config = utils.get_service_config(service_name)
     if not service_config or param_name not in service_config['parameters']:
-        bot.send_message(chat_id, f'Ошибка: параметр {param_name} не найден')
+        outbound.send_message(bot, chat_id, f'Ошибка: параметр {param_name} не найден')
         return
 
     param_config = service_config['parameters'][param_name]
@@ -510,13 +894,18 @@ def handle_parameter_input(message: types.Message) -> None:
         # Переходим к следующему шагу
         next_param = utils.get_next_parameter(service_name, param_name)
 
+        if next_param == 'additional_conditions' and advance_stack(user_id, chat_id, service_name, last_msg_id):
+            # Стек: показан первый параметр следующего сервиса
+            return
+
         if next_param == 'additional_conditions':
             # Последний шаг
             with bot.retrieve_data(user_id, chat_id) as data:
                 summary = utils.format_summary(service_name, data)
 
             try:
-                bot.edit_message_text(
+                outbound.edit_message_text(
+                    bot,
                     chat_id=chat_id,
                     message_id=last_msg_id,
                     text=summary + language_code.messages['ru']['additional_conditions'].format(
@@ -524,7 +913,8 @@ def handle_parameter_input(message: types.Message) -> None:
                     reply_markup=keyboards.additional_conditions_keyboard()
                 )
             except:
-                msg = bot.send_message(
+                msg = outbound.send_message(
+                    bot,
                     chat_id=chat_id,
                     text=summary + language_code.messages['ru']['additional_conditions'].format(
                         configs.min_additional_conditions_length),
@@ -534,8 +924,7 @@ def handle_parameter_input(message: types.Message) -> None:
                     data['last_message_id'] = msg.message_id
 
             # Устанавливаем состояние additional_conditions
-            state_group = service_config.get('state_group')
-            additional_state = getattr(eval(state_group), 'additional_conditions', None)
+            additional_state = utils.get_state_enum(service_name, 'additional_conditions')
             if additional_state:
                 bot.set_state(user_id, additional_state, chat_id)
         else:
@@ -550,24 +939,21 @@ def handle_parameter_input(message: types.Message) -> None:
 
     except ValueError as e:
         error_msg = param_config['validation'].get('error', str(e))
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id,
             error_msg,
             reply_markup=keyboards.numeric_validation_keyboard(param_name)
         )
 
 
-@bot.message_handler(state=[
-    classes.KafkaSizing.additional_conditions,
-    classes.K8sSizing.additional_conditions,
-    classes.RedisSizing.additional_conditions,
-    classes.RabbitMQSizing.additional_conditions
-])
-def handle_additional_conditions(message: types.Message) -> None:
+@router.message_route('conditions')
+def handle_additional_conditions(message: types.Message, route: router.StateRoute) -> None:
     """Универсальный обработчик дополнительных условий для всех сервисов"""
     if message.text == '❌ Отмена':
         bot.delete_state(message.from_user.id, message.chat.id)
-        bot.send_message(
+        outbound.send_message(
+            bot,
             message.chat.id,
             'Операция отменена.',
             reply_markup=keyboards.main_keyboard(message.from_user.id)
@@ -580,7 +966,8 @@ def handle_additional_conditions(message: types.Message) -> None:
     if additional_conditions.lower() in ['нет', 'no', 'skip', '-']:
         additional_conditions = None
     elif len(additional_conditions) < configs.min_additional_conditions_length:
-        bot.send_message(
+        outbound.send_message(
+            bot,
             message.chat.id,
             language_code.messages['ru']['conditions_too_short'].format(configs.min_additional_conditions_length),
             reply_markup=keyboards.additional_conditions_keyboard()
@@ -593,7 +980,7 @@ def handle_additional_conditions(message: types.Message) -> None:
         last_msg_id = data.get('last_message_id')
 
     if not service_name:
-        bot.send_message(message.chat.id, 'Ошибка: сервис не определён')
+        outbound.send_message(bot, message.chat.id, service_not_found_text(message.from_user.id, message.chat.id))
         return
 
     # Удаляем последнее inline-сообщение
@@ -607,7 +994,7 @@ def handle_additional_conditions(message: types.Message) -> None:
 
 
 # === ФУНКЦИЯ ФОРМИРОВАНИЯ ПЛАТЕЖА ПОСЛЕ РАСЧЁТА ===
-def offer_payment_for_calculation(message: types.Message, calculation_id: int, cost_details: dict) -> None:
+def offer_payment_for_calculation(chat_id: int, calculation_id: int, cost_details: dict) -> None:
     """
     Предлагает пользователю оплатить расчёт
     """
@@ -621,44 +1008,31 @@ def offer_payment_for_calculation(message: types.Message, calculation_id: int, c
     )
     markup.add(pay_button)
 
-    bot.send_message(
-        chat_id=message.chat.id,
+    outbound.send_message(
+        bot,
+        chat_id=chat_id,
         text=payment_text + "\n\nХотите оплатить этот расчёт?",
         reply_markup=markup
     )
     logging.info(f'Предложение пользователю оплатить расчёт {calculation_id}')
 
 # === ОБРАБОТЧИК НАЖАТИЯ КНОПКИ ОПЛАТЫ ===
-@bot.callback_query_handler(func=lambda call: call.data.startswith('pay_calc_'))
-def handle_payment_request(call: types.CallbackQuery) -> None:
+@router.callback_route('pay')
+def handle_payment_request(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
     """Обработка запроса на оплату расчёта"""
-    calculation_id = int(call.data.split('_')[-1])
+    calculation_id = int(route.value)
     user_id = call.from_user.id
 
     logging.info(f'Поиск расчёта {calculation_id} пользователя {user_id}')
 
     # Получаем детали расчёта из базы
-    conn, cursor = database.postgre_init()
-    if conn is None:
-        bot.answer_callback_query(call.id, "Ошибка подключения к базе данных")
+    result = database.get_calculation_for_payment(user_id, calculation_id)
+
+    if not result:
+        bot.answer_callback_query(call.id, "Расчёт не найден")
         return
 
     try:
-        cursor.execute(
-            """
-            SELECT c.service_type, c.result_params, p.id as payment_id, p.payment_status
-            FROM calculations c
-            LEFT JOIN payments p ON c.id = p.calculation_id AND p.user_id = %s
-            WHERE c.id = %s AND c.user_id = %s
-            """,
-            (user_id, calculation_id, user_id)
-        )
-        result = cursor.fetchone()
-
-        if not result:
-            bot.answer_callback_query(call.id, "Расчёт не найден")
-            return
-
         service_type = result[0]
         result_params = result[1] if isinstance(result[1], dict) else json.loads(json.dumps(result[1]))
         # Рассчитываем стоимость
@@ -691,7 +1065,8 @@ def handle_payment_request(call: types.CallbackQuery) -> None:
             # Telegram принимает суммы в наименьших единицах валюты (центы для RUB)
             prices.append(types.LabeledPrice(label=component[:30], amount=int(price * 100)))
 
-        bot.send_invoice(
+        outbound.send_invoice(
+            bot,
             chat_id=call.message.chat.id,
             title=f'Оплата расчёта {service_type}',
             description=f'Месячная стоимость инфраструктуры для {service_type}',
@@ -706,7 +1081,8 @@ def handle_payment_request(call: types.CallbackQuery) -> None:
         )
 
         # Удаляем inline-кнопку
-        bot.edit_message_reply_markup(
+        outbound.edit_message_reply_markup(
+            bot,
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
             reply_markup=None
@@ -717,8 +1093,6 @@ def handle_payment_request(call: types.CallbackQuery) -> None:
     except Exception as error:
         logging.error(f'Ошибка при формировании платежа: {error}')
         bot.answer_callback_query(call.id, "Ошибка при формировании платежа")
-    finally:
-        conn.close()
 
 
 # === ОБРАБОТЧИК ПРЕДВАРИТЕЛЬНОЙ ПРОВЕРКИ ПЛАТЕЖА ===
@@ -755,9 +1129,11 @@ def handle_successful_payment(message: types.Message) -> None:
     payload_parts = payment_info.invoice_payload.split('_')
     if len(payload_parts) < 3:
         logging.error(f"Неверный формат payload: {payment_info.invoice_payload}")
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
-            text="Ошибка обработки платежа. Обратитесь в поддержку."
+            text="Ошибка обработки платежа. Обратитесь в поддержку.",
+            priority=outbound.PRIORITY_HIGH
         )
         return
 
@@ -787,35 +1163,65 @@ ID платежа: {payment_id}
 Ваш расчёт оплачен на один месяц использования указанных ресурсов.
 Спасибо за доверие! 🚀
 """
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
             text=success_message,
-            reply_markup=keyboards.main_keyboard(user_id)
+            reply_markup=keyboards.main_keyboard(user_id),
+            priority=outbound.PRIORITY_HIGH
         )
 
         logging.info(f"Успешный платёж от пользователя {full_name} (id {user_id}), ID платежа: {payment_id}")
     else:
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
-            text="Платёж прошёл успешно, но возникла ошибка при обновлении статуса в базе. Обратитесь в поддержку."
+            text="Платёж прошёл успешно, но возникла ошибка при обновлении статуса в базе. Обратитесь в поддержку.",
+            priority=outbound.PRIORITY_HIGH
         )
         logging.error(f"Ошибка обновления статуса платежа {payment_id} для пользователя {user_id}")
 
 
 # === ОБРАБОТЧИК ИСТОРИИ ПЛАТЕЖЕЙ ===
-@bot.message_handler(func=lambda message: message.text == '💰 История платежей')
-def payments_history_handler(message: types.Message) -> None:
-    """Показывает историю платежей пользователя."""
-    user_id = message.from_user.id
-    payments = database.get_user_payments(user_id, limit=5)
+def get_page_cursors(items: list, page_size: int, cursor_id: int | None, direction: str) -> tuple:
+    """
+    Обрезает выборку размером page_size + 1 до страницы и определяет курсоры соседних страниц.
+    :param items: Записи от новых к старым (на одну больше размера страницы)
+    :param page_size: Размер страницы
+    :param cursor_id: Курсор, по которому получена страница (None - первая страница)
+    :param direction: Направление перелистывания ('older' или 'newer')
+    :return: Кортеж (записи страницы, курсор более новых записей, курсор более старых записей)
+    """
+    has_more = len(items) > page_size
+    if direction == 'newer':
+        # Лишняя запись - самая новая, она стоит в начале списка
+        page = items[1:] if has_more else items
+        has_newer, has_older = has_more, True
+    else:
+        page = items[:page_size]
+        has_newer, has_older = cursor_id is not None, has_more
+
+    if not page:
+        return page, None, None
+    return page, page[0]['id'] if has_newer else None, page[-1]['id'] if has_older else None
 
+
+def render_payments_page(user_id: int, cursor_id: int = None, direction: str = 'older') -> tuple:
+    """
+    Формирует страницу истории платежей.
+    :param user_id: ID пользователя
+    :param cursor_id: Курсор страницы
+    :param direction: Направление перелистывания
+    :return: Кортеж (текст, клавиатура) или (None, None), если записей нет
+    """
+    page_size = configs.payments_page_size
+    payments = database.get_user_payments(user_id, page_size + 1, cursor_id, direction)
+    if direction == 'newer' and len(payments) <= page_size:
+        # Дошли до самых новых записей - показываем полную первую страницу
+        return render_payments_page(user_id)
+    payments, newer_cursor, older_cursor = get_page_cursors(payments, page_size, cursor_id, direction)
     if not payments:
-        bot.send_message(
-            chat_id=message.chat.id,
-            text='📋 У вас пока нет платежей.',
-            reply_markup=keyboards.main_keyboard(user_id)
-        )
-        return
+        return None, None
 
     # Формируем сообщение с историей платежей
     history_text = "💰 Ваша история платежей:\n\n"
@@ -829,48 +1235,110 @@ def payments_history_handler(message: types.Message) -> None:
         history_text += f"Статус: {payment['status']}\n"
         history_text += "━━━━━━━━━━━━━━━━━━━━\n\n"
 
-    bot.send_message(
+    return history_text, keyboards.pagination_keyboard('pay_page', newer_cursor, older_cursor)
+
+
+def render_calculations_page(user_id: int, cursor_id: int = None, direction: str = 'older') -> tuple:
+    """
+    Формирует страницу истории расчётов.
+    :param user_id: ID пользователя
+    :param cursor_id: Курсор страницы
+    :param direction: Направление перелистывания
+    :return: Кортеж (текст, клавиатура) или (None, None), если записей нет
+    """
+    page_size = configs.calculations_page_size
+    calculations = database.get_user_calculations_history(user_id, page_size + 1, cursor_id, direction)
+    if direction == 'newer' and len(calculations) <= page_size:
+        # Дошли до самых новых записей - показываем полную первую страницу
+        return render_calculations_page(user_id)
+    calculations, newer_cursor, older_cursor = get_page_cursors(calculations, page_size, cursor_id, direction)
+    if not calculations:
+        return None, None
+
+    # Формируем сообщение с историей
+    history_text = "📋 Ваши расчёты:\n\n"
+    for calc in calculations:
+        history_text += calculators.format_history_item(calc)
+
+    # Добавляем информацию о том, как получить полные детали
+    history_text += "\nДля получения полных результатов и экспорта в Excel выполните новый расчёт или выберите расчёт из списка выше."
+
+    return history_text, keyboards.pagination_keyboard('calc_page', newer_cursor, older_cursor)
+
+
+@router.message_route('payments_history')
+def payments_history_handler(message: types.Message, route: router.TextRoute) -> None:
+    """Показывает первую страницу истории платежей пользователя."""
+    user_id = message.from_user.id
+    history_text, markup = render_payments_page(user_id)
+
+    if not history_text:
+        outbound.send_message(
+            bot,
+            chat_id=message.chat.id,
+            text='📋 У вас пока нет платежей.',
+            reply_markup=keyboards.main_keyboard(user_id)
+        )
+        return
+
+    outbound.send_message(
+        bot,
         chat_id=message.chat.id,
         text=history_text,
-        reply_markup=keyboards.main_keyboard(user_id)
+        reply_markup=markup or keyboards.main_keyboard(user_id)
     )
 
 
 # Обработчик для кнопки "История расчётов"
-@bot.message_handler(func=lambda message: message.text == '📊 История расчётов')
-def history_handler(message: types.Message) -> None:
-    """Показывает историю расчётов пользователя."""
+@router.message_route('calculations_history')
+def history_handler(message: types.Message, route: router.TextRoute) -> None:
+    """Показывает первую страницу истории расчётов пользователя."""
     user_id = message.from_user.id
+    history_text, markup = render_calculations_page(user_id)
 
-    # Получаем историю расчётов
-    calculations = database.get_user_calculations_history(user_id)
-
-    if not calculations:
-        bot.send_message(
+    if not history_text:
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
             text='📋 У вас пока нет сохранённых расчётов.',
             reply_markup=keyboards.main_keyboard(user_id)
         )
         return
 
-    # Формируем сообщение с историей
-    history_text = "📋 Ваши последние расчёты:\n\n"
-    for calc in calculations:
-        history_text += calculators.format_history_item(calc)
+    outbound.send_message(
+        bot,
+        chat_id=message.chat.id,
+        text=history_text,
+        reply_markup=markup or keyboards.main_keyboard(user_id)
+    )
 
-    # Добавляем информацию о том, как получить полные детали
-    history_text += "\nДля получения полных результатов и экспорта в Excel выполните новый расчёт или выберите расчёт из списка выше."
 
-    bot.send_message(
-        chat_id=message.chat.id,
+@router.callback_route('page_newer')
+@router.callback_route('page_older')
+def handle_history_page(call: types.CallbackQuery, route: router.CallbackRoute) -> None:
+    """Перелистывание истории расчётов или платежей в том же сообщении"""
+    # callback_data: calc_page_older_123 / pay_page_newer_45
+    direction = route.action.replace('page_', '')
+    render_page = render_calculations_page if route.param == 'calc_page' else render_payments_page
+
+    history_text, markup = render_page(call.from_user.id, int(route.value), direction)
+    if not history_text:
+        bot.answer_callback_query(call.id, "Больше записей нет")
+        return
+
+    outbound.edit_message_text(
+        bot,
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
         text=history_text,
-        reply_markup=keyboards.main_keyboard(message.from_user.id)  # True так как у пользователя есть расчёты
+        reply_markup=markup
     )
+    bot.answer_callback_query(call.id)
 
 
 # Обработчик для кнопки "Экспорт в Excel"
-@bot.message_handler(func=lambda message: message.text == '📤 Экспорт в Excel')
-def export_excel_handler(message: types.Message) -> None:
+@router.message_route('export_excel')
+def export_excel_handler(message: types.Message, route: router.TextRoute) -> None:
     """Обработчик экспорта расчётов в Excel."""
     try:
         user_id = message.from_user.id
@@ -878,7 +1346,8 @@ def export_excel_handler(message: types.Message) -> None:
         calculations = database.get_user_calculations_history(user_id)
 
         if not calculations:
-            bot.send_message(
+            outbound.send_message(
+                bot,
                 chat_id=message.chat.id,
                 text="У вас нет сохранённых расчётов для экспорта.",
                 reply_markup=keyboards.main_keyboard(user_id)
@@ -889,7 +1358,8 @@ def export_excel_handler(message: types.Message) -> None:
         excel_buffer = excel_exporter.export_calculation_to_excel(calculations[-1])
 
         if not excel_buffer or not isinstance(excel_buffer, BytesIO):
-            bot.send_message(
+            outbound.send_message(
+                bot,
                 chat_id=message.chat.id,
                 text="❌ Ошибка при создании Excel файла. Попробуйте позже.",
                 reply_markup=keyboards.main_keyboard(user_id)
@@ -898,7 +1368,8 @@ def export_excel_handler(message: types.Message) -> None:
 
         # Отправляем файл пользователю
         file_name = f"calculation_{calculations[-1]['created_at'].replace(' ', '_').replace(':', '-')}.xlsx"
-        bot.send_document(
+        outbound.send_document(
+            bot,
             chat_id=message.chat.id,
             document=excel_buffer.getvalue(),
             visible_file_name=file_name,
@@ -912,7 +1383,8 @@ def export_excel_handler(message: types.Message) -> None:
     except Exception as error:
         logging.error(f"Ошибка при экспорте в Excel: {error}")
         errors.error_save(short_error=f"Ошибка экспорта в Excel: {str(error)}", bot=bot)
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=message.chat.id,
             text="❌ Произошла ошибка при экспорте данных. Администраторы уведомлены.",
             reply_markup=keyboards.main_keyboard(message.from_user.id)
@@ -920,13 +1392,47 @@ def export_excel_handler(message: types.Message) -> None:
 
 
 # Обработчик для кнопки "Помощь"
-@bot.message_handler(func=lambda message: message.text == 'ℹ️ Помощь')
-def help_button_handler(message: types.Message) -> None:
+@router.message_route('help')
+def help_button_handler(message: types.Message, route: router.TextRoute) -> None:
     """Обработчик кнопки помощи."""
     help_handler(message)
 
 
+@router.message_route('menu')
+def menu_button_handler(message: types.Message, route: router.TextRoute) -> None:
+    """Обработчик текстовой команды меню."""
+    menu_handler(message)
+
+
+# === МАРШРУТИЗАЦИЯ ===
+# Команды, платежи и pre_checkout обрабатываются собственными обработчиками TeleBot выше,
+# все остальные сообщения и callback-запросы - по таблицам router
+
+@bot.callback_query_handler(func=lambda call: True)
+def route_callback(call: types.CallbackQuery) -> None:
+    """Передаёт callback-запрос обработчику по таблице маршрутов."""
+    handler, route = router.resolve_callback(call.data)
+    if handler is None:
+        # Кнопка устаревшей клавиатуры
+        bot.answer_callback_query(call.id)
+        return
+    handler(call, route)
+
+
 @bot.message_handler(func=lambda message: True)
+def route_message(message: types.Message) -> None:
+    """Передаёт сообщение обработчику: кнопке клавиатуры, FSM-состоянию пользователя, затем синониму."""
+    handler, route = router.resolve_text(message.text, buttons_only=True)
+    if handler is None:
+        handler, route = router.resolve_state(bot.get_state(message.from_user.id, message.chat.id))
+    if handler is None:
+        handler, route = router.resolve_text(message.text)
+    if handler is None:
+        unknown_message(message)
+        return
+    handler(message, route)
+
+
 def unknown_message(message: types.Message) -> None:
     """Обработчик неизвестных сообщений."""
     user_id = message.from_user.id
@@ -934,42 +1440,28 @@ def unknown_message(message: types.Message) -> None:
     current_state = bot.get_state(user_id, chat_id)
 
     if current_state:
-        state_str = str(current_state)
-
-        # Проверяем, находится ли пользователь в состоянии ввода параметра или доп. условий
-        if ':additional_conditions' in state_str:
-            # Пользователь в состоянии ввода дополнительных условий
-            handle_additional_conditions(message)
-        elif ':' in state_str:
-            # Пользователь в состоянии ввода параметра (формат "ServiceSizing:param_name")
-            # Получаем сервис из данных пользователя, а не из state_str
-            with bot.retrieve_data(user_id, chat_id) as data:
-                service_name = data.get('service_name')
-
-            if service_name:
-                # Перенаправляем на универсальный обработчик ввода параметров
-                handle_parameter_input(message)
-            else:
-                # Сервис не определён - сбрасываем состояние
-                bot.delete_state(user_id, chat_id)
-                bot.send_message(
-                    chat_id=chat_id,
-                    text='Произошла ошибка. Пожалуйста, начните заново.',
-                    reply_markup=keyboards.main_keyboard(user_id)
-                )
-        else:
-            # Неизвестное состояние - сбрасываем
-            bot.delete_state(user_id, chat_id)
-            bot.send_message(
-                chat_id=chat_id,
-                text='Произошла ошибка. Пожалуйста, начните заново.',
-                reply_markup=keyboards.main_keyboard(user_id)
-            )
+        # Неизвестное состояние - сбрасываем
+        bot.delete_state(user_id, chat_id)
+        outbound.send_message(
+            bot,
+            chat_id=chat_id,
+            text='Произошла ошибка. Пожалуйста, начните заново.',
+            reply_markup=keyboards.main_keyboard(user_id)
+        )
+    elif state_storage.pop_expired(chat_id, user_id, bot_id=bot.bot_id):
+        outbound.send_message(
+            bot,
+            chat_id=chat_id,
+            text=language_code.messages['ru']['session_expired'],
+            reply_markup=keyboards.main_keyboard(user_id)
+        )
     else:
-        bot.send_message(
+        outbound.send_message(
+            bot,
             chat_id=chat_id,
             text='Неизвестная команда. Используйте меню для выбора действия.',
-            reply_markup=keyboards.main_keyboard(user_id)
+            reply_markup=keyboards.main_keyboard(user_id),
+            priority=outbound.PRIORITY_LOW
         )
 
 
@@ -987,15 +1479,34 @@ def check_internet() -> bool:
 
 def run_bot() -> None:
     """
-    Запускает бота в режиме polling с обработкой ошибок.
+    Запускает бота в режиме configs.run_mode: webhook или polling (по умолчанию) с обработкой ошибок.
     :return: None
     """
     logs.setup_logs()
-    database.create_tables()
+    database.apply_migrations()
+    database.load_banned_users()
+    database.start_ban_listener()
+    ai_queue.start_workers()
+    config_loader.subscribe(lambda catalog: utils.rebuild_index())
+    config_loader.subscribe(lambda catalog: router.rebuild())
+    config_loader.subscribe(calculation_cache.invalidate)
+    config_loader.start()
+    calculation_cache.warm_presets()
+    if isinstance(state_storage, storages.StateExpiringMemoryStorage):
+        state_storage.start_sweeper()
     
     if not configs.openrouter_api_key:
         logging.warning('⚠️ OPENROUTER_API_KEY не установлен! AI-функции будут недоступны.')
-    
+
+    if configs.run_mode == 'webhook':
+        logging.info('Бот запустился в режиме webhook')
+        try:
+            webhook.run_webhook(bot)
+        finally:
+            logging.info('Остановка бота')
+            database.close_pool()
+        return
+
     run = True
     
     while run:
@@ -1011,6 +1522,8 @@ def run_bot() -> None:
                 waiting = True
                 time.sleep(5)
             
+            # Telegram не отдаёт обновления через getUpdates, пока установлен webhook
+            bot.remove_webhook()
             logging.info('Бот запустился')
             bot.polling(interval=2, timeout=30, long_polling_timeout=60, none_stop=True)
             time.sleep(1)
@@ -1028,6 +1541,7 @@ def run_bot() -> None:
         except KeyboardInterrupt:
             logging.info('Остановка бота')
             bot.stop_polling()
+            database.close_pool()
             break
             
         except (Exception, BaseException) as error:
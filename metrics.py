@@ -0,0 +1,45 @@
+"""
+Реестр метрик бота. Модули регистрируют функции-источники, команда /stats выводит их значения.
+"""
+import logging
+from typing import Callable, Dict, Any
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Регистрирует источник метрик.
+    :param name: Название раздела в отчёте
+    :param provider: Функция без аргументов, возвращающая словарь метрик
+    :return: None
+    """
+    _providers[name] = provider
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    """
+    Собирает текущие значения всех зарегистрированных метрик.
+    :return: Словарь {раздел: {метрика: значение}}
+    """
+    snapshot = {}
+    for name, provider in list(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as error:
+            logging.error(f'Ошибка получения метрик "{name}": {error}')
+            snapshot[name] = {'error': str(error)}
+    return snapshot
+
+
+def format_stats() -> str:
+    """
+    Форматирует метрики для отправки в Telegram.
+    :return: Отформатированная строка
+    """
+    lines = ['📈 Метрики бота:']
+    for name, values in collect().items():
+        lines.append(f'\n🔹 {name}')
+        for key, value in values.items():
+            lines.append(f'  • {key}: {value}')
+    return '\n'.join(lines)
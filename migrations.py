@@ -0,0 +1,190 @@
+"""
+Версионированные миграции схемы базы данных.
+
+Применённые версии хранятся в таблице schema_version. При запуске бота выполняются только
+ещё не применённые шаги в порядке возрастания версии, каждый шаг - в отдельной транзакции.
+Все операторы написаны идемпотентно (IF NOT EXISTS), поэтому повторный запуск шага безопасен.
+"""
+import logging
+
+import psycopg
+
+import database_async
+
+
+# Ключ advisory-блокировки, чтобы несколько процессов бота не применяли миграции одновременно
+MIGRATIONS_LOCK_ID = 7_310_001
+
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Базовые таблицы users, calculations, payments',
+        'statements': [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT PRIMARY KEY,
+                user_data JSONB NOT NULL,
+                is_admin BOOLEAN NOT NULL DEFAULT FALSE,
+                is_banned BOOLEAN NOT NULL DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS calculations (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                service_type TEXT NOT NULL,
+                input_params JSONB NOT NULL,
+                result_params JSONB NOT NULL,
+                ai_adjustments TEXT,
+                additional_conditions TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS payments (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                calculation_id INTEGER NOT NULL,
+                amount NUMERIC(10, 2) NOT NULL,
+                currency TEXT NOT NULL DEFAULT 'RUB',
+                provider_payment_charge_id TEXT,
+                telegram_payment_charge_id TEXT,
+                payload TEXT NOT NULL,
+                payment_status TEXT NOT NULL DEFAULT 'pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id),
+                FOREIGN KEY (calculation_id) REFERENCES calculations (id)
+            )
+            """,
+        ]
+    },
+    {
+        'version': 2,
+        'description': 'created_at обязателен для сортировки истории',
+        'statements': [
+            'UPDATE calculations SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL',
+            'ALTER TABLE calculations ALTER COLUMN created_at SET NOT NULL',
+            'UPDATE payments SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL',
+            'ALTER TABLE payments ALTER COLUMN created_at SET NOT NULL',
+        ]
+    },
+    {
+        'version': 3,
+        'description': 'Индексы для истории расчётов, платежей и поиска платежа по расчёту',
+        'statements': [
+            # История расчётов и проверка наличия расчётов у пользователя
+            """
+            CREATE INDEX IF NOT EXISTS calculations_user_created_idx
+                ON calculations (user_id, created_at DESC, id DESC)
+            """,
+            # История платежей
+            """
+            CREATE INDEX IF NOT EXISTS payments_user_created_idx
+                ON payments (user_id, created_at DESC, id DESC)
+            """,
+            # LEFT JOIN платежа к расчёту при оплате
+            """
+            CREATE INDEX IF NOT EXISTS payments_calculation_user_idx
+                ON payments (calculation_id, user_id)
+            """,
+            # Загрузка кэша заблокированных пользователей
+            """
+            CREATE INDEX IF NOT EXISTS users_banned_idx
+                ON users (user_id) WHERE is_banned
+            """,
+        ]
+    },
+    {
+        'version': 4,
+        'description': 'Кэш ответов ИИ, общий для всех процессов бота',
+        'statements': [
+            """
+            CREATE TABLE IF NOT EXISTS ai_response_cache (
+                cache_key TEXT PRIMARY KEY,
+                response JSONB NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL
+            )
+            """,
+            # Очистка истёкших записей
+            """
+            CREATE INDEX IF NOT EXISTS ai_response_cache_expires_idx
+                ON ai_response_cache (expires_at)
+            """,
+        ]
+    },
+    {
+        'version': 5,
+        'description': 'FSM-состояния пользователей, общие для всех процессов бота',
+        'statements': [
+            """
+            CREATE TABLE IF NOT EXISTS bot_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data JSONB NOT NULL DEFAULT '{}'::jsonb,
+                expires_at TIMESTAMP NOT NULL
+            )
+            """,
+            # Очистка истёкших состояний
+            """
+            CREATE INDEX IF NOT EXISTS bot_states_expires_idx
+                ON bot_states (expires_at)
+            """,
+        ]
+    },
+    {
+        'version': 6,
+        'description': 'Группы расчётов: сервисы одного стека сохраняются с общим group_id',
+        'statements': [
+            'ALTER TABLE calculations ADD COLUMN IF NOT EXISTS group_id UUID',
+            """
+            CREATE INDEX IF NOT EXISTS calculations_group_idx
+                ON calculations (group_id) WHERE group_id IS NOT NULL
+            """,
+        ]
+    },
+]
+
+
+async def apply_migrations() -> None:
+    """
+    Применяет все ещё не применённые миграции по порядку.
+    :return: None
+    """
+    try:
+        async with database_async.db_connection() as conn:
+            await conn.execute('SELECT pg_advisory_lock(%s)', (MIGRATIONS_LOCK_ID,))
+            try:
+                await conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                await conn.commit()
+
+                cursor = await conn.execute('SELECT version FROM schema_version')
+                applied = {row[0] for row in await cursor.fetchall()}
+
+                for migration in sorted(MIGRATIONS, key=lambda item: item['version']):
+                    if migration['version'] in applied:
+                        continue
+                    for statement in migration['statements']:
+                        await conn.execute(statement)
+                    await conn.execute(
+                        'INSERT INTO schema_version (version, description) VALUES (%s, %s)',
+                        (migration['version'], migration['description'])
+                    )
+                    await conn.commit()
+                    logging.info(f'Применена миграция {migration["version"]}: {migration["description"]}')
+            finally:
+                await conn.rollback()
+                await conn.execute('SELECT pg_advisory_unlock(%s)', (MIGRATIONS_LOCK_ID,))
+        logging.info(f'Схема БД актуальна (версия {max(item["version"] for item in MIGRATIONS)})')
+    except psycopg.Error as error:
+        logging.error(f'Ошибка применения миграций: {error}')
@@ -0,0 +1,177 @@
+"""
+Расчёт с неопределённостью (метод Монте-Карло): входные параметры задаются распределениями,
+результат - перцентили P50/P90/P99 ключевых показателей и месячной стоимости.
+
+Все выборки считаются одним пакетным проходом batch_calculators, поэтому
+configs.montecarlo_max_samples сценариев укладываются в доли секунды.
+"""
+from collections import namedtuple
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+import batch_calculators
+import configs
+import utils
+
+
+class MonteCarloError(ValueError):
+    """Некорректный запрос расчёта с неопределённостью"""
+
+
+Distribution = namedtuple('Distribution', ['param', 'kind', 'args'])
+MonteCarloRequest = namedtuple('MonteCarloRequest', ['service', 'base_params', 'distributions', 'samples', 'seed'])
+
+PERCENTILES = (50, 90, 99)
+
+
+def parse_distribution(service_name: str, param_name: str, spec: str) -> Distribution:
+    """
+    Разбирает распределение параметра.
+    Форматы: "500;1000;5000" (треугольное: минимум, наиболее вероятное, максимум),
+    "500..5000" (равномерное), "1000±200" или "1000+-200" (нормальное: среднее и стандартное отклонение).
+    :param service_name: Тип сервиса
+    :param param_name: Название параметра
+    :param spec: Текст распределения
+    :return: Distribution
+    """
+    validation = utils.get_service_config(service_name)['parameters'][param_name]['validation']
+    if validation['type'] is bool:
+        raise MonteCarloError(f'{param_name}: для параметра да/нет распределение не задаётся')
+
+    spec = spec.replace(',', '.').replace('+-', '±')
+    try:
+        if ';' in spec:
+            kind, args = 'triangular', tuple(float(token) for token in spec.split(';'))
+            if len(args) != 3 or not args[0] <= args[1] <= args[2]:
+                raise MonteCarloError(f'{param_name}: ожидается минимум;наиболее вероятное;максимум по возрастанию')
+        elif '..' in spec:
+            start, _, stop = spec.partition('..')
+            kind, args = 'uniform', (float(start), float(stop))
+            if args[0] > args[1]:
+                raise MonteCarloError(f'{param_name}: начало диапазона больше конца')
+        elif '±' in spec:
+            mean, _, deviation = spec.partition('±')
+            kind, args = 'normal', (float(mean), float(deviation))
+            if args[1] < 0:
+                raise MonteCarloError(f'{param_name}: отклонение не может быть отрицательным')
+        else:
+            raise MonteCarloError(f'{param_name}: не удалось разобрать распределение "{spec}"')
+    except ValueError as error:
+        if isinstance(error, MonteCarloError):
+            raise
+        raise MonteCarloError(f'{param_name}: не удалось разобрать распределение "{spec}"')
+
+    # Нормальное распределение обрезается по границам validation, у остальных границы должны быть допустимыми
+    low, high = (args[0], args[0]) if kind == 'normal' else (args[0], args[-1])
+    if 'min' in validation and (low < validation['min'] or high > validation['max']):
+        raise MonteCarloError(f'{param_name}: значения должны быть в диапазоне {validation["min"]}..{validation["max"]}')
+    return Distribution(param_name, kind, args)
+
+
+def parse_request(text: str) -> MonteCarloRequest:
+    """
+    Разбирает команду "/montecarlo <сервис> [samples=N] [seed=N] <параметр>=<распределение> ... [<параметр>=<значение>]".
+    :param text: Текст сообщения
+    :return: MonteCarloRequest
+    """
+    service_name, options, base_params, specs, _ = utils.parse_scenario_command(
+        text, MonteCarloError, lambda spec: any(marker in spec for marker in (';', '..', '±', '+-')),
+        options=('samples', 'seed')
+    )
+    samples = options.get('samples', str(configs.montecarlo_default_samples))
+    if not samples.isdigit() or not 100 <= int(samples) <= configs.montecarlo_max_samples:
+        raise MonteCarloError(f'samples: укажите число выборок от 100 до {configs.montecarlo_max_samples}')
+    seed = options.get('seed')
+    if seed is not None and not seed.isdigit():
+        raise MonteCarloError('seed: ожидается целое неотрицательное число')
+
+    distributions = [parse_distribution(service_name, name, spec) for name, spec in specs.items()]
+    if not distributions:
+        raise MonteCarloError('Укажите распределение хотя бы для одного параметра')
+    return MonteCarloRequest(service_name, base_params, distributions, int(samples),
+                             int(seed) if seed is not None else None)
+
+
+def draw_samples(service_name: str, distributions: List[Distribution], samples: int,
+                 rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """
+    Генерирует выборки параметров.
+    :param service_name: Тип сервиса
+    :param distributions: Распределения параметров
+    :param samples: Число выборок
+    :param rng: Генератор случайных чисел
+    :return: {параметр: массив значений}
+    """
+    columns = {}
+    for distribution in distributions:
+        args = distribution.args
+        if distribution.kind == 'triangular':
+            values = rng.triangular(*args, samples) if args[0] < args[2] else np.full(samples, args[0])
+        elif distribution.kind == 'uniform':
+            values = rng.uniform(*args, samples)
+        else:
+            values = rng.normal(*args, samples)
+
+        validation = utils.get_service_config(service_name)['parameters'][distribution.param]['validation']
+        if 'min' in validation:
+            values = np.clip(values, validation['min'], validation['max'])
+        if validation['type'] is int:
+            values = np.round(values).astype(np.int64)
+        else:
+            values = np.round(values, 2)
+        columns[distribution.param] = values
+    return columns
+
+
+def run_simulation(service_name: str, base_params: Dict[str, Any], distributions: List[Distribution],
+                   samples: int, seed: int = None) -> pd.DataFrame:
+    """
+    Считает перцентили ключевых результатов и месячной стоимости по выборкам.
+    :param service_name: Тип сервиса
+    :param base_params: Значения параметров без распределения
+    :param distributions: Распределения параметров
+    :param samples: Число выборок
+    :param seed: Зерно генератора (для воспроизводимости)
+    :return: DataFrame: строка на показатель, столбцы P50, P90, P99
+    """
+    columns = dict(base_params)
+    columns.update(draw_samples(service_name, distributions, samples, np.random.default_rng(seed)))
+
+    results = batch_calculators.calculate_batch(service_name, columns)
+    costs = batch_calculators.calculate_monthly_cost_batch(service_name, results)
+
+    fields = {field: results[field].to_numpy() for field in batch_calculators.KEY_RESULTS[service_name]}
+    fields['total_monthly_rub'] = costs['total_monthly_rub']
+    # inverted_cdf возвращает значения из выборки: число брокеров остаётся целым
+    percentiles = {field: np.percentile(values, PERCENTILES, method='inverted_cdf')
+                   for field, values in fields.items()}
+    return pd.DataFrame.from_dict(percentiles, orient='index', columns=[f'P{share}' for share in PERCENTILES])
+
+
+def format_summary(request: MonteCarloRequest, percentiles: pd.DataFrame) -> str:
+    """
+    Форматирует перцентили в моноширинную таблицу (HTML для Telegram).
+    :param request: Разобранный запрос
+    :param percentiles: Результат run_simulation
+    :return: Текст сообщения
+    """
+    descriptions = []
+    for distribution in request.distributions:
+        args = distribution.args
+        if distribution.kind == 'triangular':
+            descriptions.append(f'{distribution.param}: {"/".join(utils.format_number(value) for value in args)}')
+        elif distribution.kind == 'uniform':
+            descriptions.append(f'{distribution.param}: {utils.format_number(args[0])}..{utils.format_number(args[1])}')
+        else:
+            descriptions.append(f'{distribution.param}: {utils.format_number(args[0])}±{utils.format_number(args[1])}')
+
+    table = percentiles.to_string(float_format=utils.format_number)
+    lines = [
+        f'🎲 Монте-Карло: {utils.get_service_config(request.service)["display_name"]}, {request.samples} выборок',
+        *descriptions,
+        f'<pre>{table}</pre>',
+        'P90 - значение, которого хватит в 90% сценариев.',
+    ]
+    return '\n'.join(lines)
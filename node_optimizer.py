@@ -0,0 +1,217 @@
+"""
+Подбор самого дешёвого набора worker-нод Kubernetes из каталога configs.node_flavors.
+
+calculate_k8s_sizing считает ноды фиксированного размера 8 vCPU / 32 ГБ, из-за чего одно
+из измерений (CPU или RAM) часто оказывается с большим запасом. Оптимизатор ищет пул нод любых
+типов, покрывающий требования по CPU и RAM (с накладными расходами из расчёта), с минимальным
+числом нод для HA и нодами, в которые помещается под.
+
+Начальное решение - лучший пул из одного или двух типов (векторный перебор). В непрерывной
+версии задачи этого достаточно, но из-за округления числа нод вверх и min_nodes целочисленный
+оптимум может включать три типа и больше, поэтому дальше выполняется поиск с ветвями и границами
+по числу нод каждого типа. Нижняя граница ветви - значение линейной релаксации для оставшихся
+типов, она считается через заранее найденные вершины двойственного многогранника.
+"""
+import itertools
+import math
+from collections import namedtuple
+from typing import Dict, Any, List
+
+import numpy as np
+
+import configs
+
+
+NodePool = namedtuple('NodePool', ['flavor', 'count', 'cpu', 'ram_gb', 'price'])
+NodePlan = namedtuple('NodePlan', ['pools', 'nodes', 'cpu', 'ram_gb', 'monthly_cost'])
+
+# Запас на погрешность деления float при округлении вверх
+_EPSILON = 1e-9
+# Допуск сравнения стоимостей при отсечении ветвей
+_COST_TOLERANCE = 1e-6
+
+
+def _ceil_div(required, capacity):
+    """Число нод ёмкостью capacity, покрывающее required (векторно)"""
+    return np.ceil(required / capacity - _EPSILON)
+
+
+def _dual_vertices(cpu: np.ndarray, ram: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """
+    Находит вершины двойственного многогранника линейной релаксации
+    min price·x при cpu·x >= C, ram·x >= R, sum(x) >= N, x >= 0.
+    Значение релаксации для любых (C, R, N) - максимум скалярного произведения вершины на (C, R, N).
+    :param cpu: vCPU типов нод
+    :param ram: RAM типов нод
+    :param price: Цены типов нод
+    :return: Массив вершин (y_cpu, y_ram, y_nodes), форма (число вершин, 3)
+    """
+    # Ограничения двойственной задачи: cpu_i*y1 + ram_i*y2 + y3 <= price_i и -y <= 0
+    planes = np.vstack([np.column_stack([cpu, ram, np.ones_like(cpu)]), -np.eye(3)])
+    bounds = np.concatenate([price, np.zeros(3)])
+    triples = np.array(list(itertools.combinations(range(len(planes)), 3)))
+    matrices, rhs = planes[triples], bounds[triples]
+    solvable = np.abs(np.linalg.det(matrices)) > _EPSILON
+    points = np.linalg.solve(matrices[solvable], rhs[solvable][..., None])[..., 0]
+    feasible = np.all(points @ planes.T <= bounds + 1e-7 * (1 + np.abs(bounds)), axis=1)
+    return np.unique(np.round(points[feasible], 9), axis=0)
+
+
+def optimize(cpu_required: float, ram_required_gb: float, min_nodes: int = 1,
+             max_pod_cpu: float = 0, max_pod_ram_gb: float = 0,
+             flavors: List[Dict[str, Any]] = None) -> NodePlan | None:
+    """
+    Находит самый дешёвый пул нод (при равной стоимости - с меньшим числом нод среди найденных).
+    :param cpu_required: Требуемые vCPU (с накладными расходами)
+    :param ram_required_gb: Требуемая RAM в ГБ (с накладными расходами)
+    :param min_nodes: Минимальное число нод (3 для HA)
+    :param max_pod_cpu: CPU самого крупного пода: ноды меньшего размера не рассматриваются
+    :param max_pod_ram_gb: RAM самого крупного пода
+    :param flavors: Каталог типов нод (по умолчанию configs.node_flavors)
+    :return: NodePlan или None, если ни один тип ноды не подходит
+    """
+    flavors = [flavor for flavor in (flavors or configs.node_flavors)
+               if flavor['cpu'] >= max_pod_cpu and flavor['ram_gb'] >= max_pod_ram_gb]
+    # Тип ноды не нужен, если есть не дороже и не меньше ни по CPU, ни по RAM
+    flavors = [flavor for flavor in flavors if not any(
+        other is not flavor and other['cpu'] >= flavor['cpu'] and other['ram_gb'] >= flavor['ram_gb']
+        and other['price'] <= flavor['price'] and (other['cpu'], other['ram_gb'], -other['price'])
+        != (flavor['cpu'], flavor['ram_gb'], -flavor['price'])
+        for other in flavors
+    )]
+    if not flavors:
+        return None
+
+    cpu = np.array([flavor['cpu'] for flavor in flavors], dtype=np.float64)
+    ram = np.array([flavor['ram_gb'] for flavor in flavors], dtype=np.float64)
+    price = np.array([flavor['price'] for flavor in flavors], dtype=np.float64)
+
+    # Пулы из одного типа нод
+    single = np.maximum(np.maximum(_ceil_div(cpu_required, cpu), _ceil_div(ram_required_gb, ram)), min_nodes)
+    single_cost = single * price
+    first = int(np.argmin(single_cost))
+    best = (single_cost[first], single[first], first, int(single[first]), first, 0)
+
+    # Пулы из двух типов: в оптимальном пуле один из типов стоит не больше половины итога,
+    # поэтому число нод типа i перебирается только до best_cost / 2 / price[i]
+    for i in np.argsort(single_cost):
+        limit = min(single[i], math.floor(best[0] / 2 / price[i]))
+        if limit < 1:
+            continue
+        counts = np.arange(1, limit + 1)
+        rest_cpu = np.maximum(cpu_required - counts * cpu[i], 0)
+        rest_ram = np.maximum(ram_required_gb - counts * ram[i], 0)
+        other = np.maximum(_ceil_div(rest_cpu[:, None], cpu[None, :]), _ceil_div(rest_ram[:, None], ram[None, :]))
+        other = np.maximum(other, (min_nodes - counts)[:, None])
+        cost = counts[:, None] * price[i] + other * price[None, :]
+
+        position = np.unravel_index(np.argmin(cost), cost.shape)
+        candidate = (cost[position], counts[position[0]] + other[position], int(i), int(counts[position[0]]),
+                     int(position[1]), int(other[position]))
+        if candidate[:2] < best[:2]:
+            best = candidate
+
+    cost, _, first, first_count, second, second_count = best
+    counts = np.zeros(len(flavors), dtype=np.int64)
+    counts[first] += first_count
+    counts[second] += second_count
+    if len(flavors) > 2:
+        cost, counts = _branch_and_bound(cpu_required, ram_required_gb, min_nodes, cpu, ram, price, cost, counts)
+
+    pools = [NodePool(flavors[index]['name'], int(count), flavors[index]['cpu'], flavors[index]['ram_gb'],
+                      flavors[index]['price'])
+             for index, count in enumerate(counts) if count]
+
+    return NodePlan(
+        pools=tuple(pools),
+        nodes=sum(pool.count for pool in pools),
+        cpu=sum(pool.count * pool.cpu for pool in pools),
+        ram_gb=sum(pool.count * pool.ram_gb for pool in pools),
+        monthly_cost=round(float(cost), 2),
+    )
+
+
+def _branch_and_bound(cpu_required: float, ram_required_gb: float, min_nodes: int,
+                      cpu: np.ndarray, ram: np.ndarray, price: np.ndarray,
+                      best_cost: float, best_counts: np.ndarray) -> tuple:
+    """
+    Точный поиск пула нод любых типов, начиная с известного решения.
+    Типы нод, невыгодные в линейной релаксации, перебираются первыми: их число нод обычно мало,
+    и ветви с ними быстро отсекаются.
+    :param cpu_required: Требуемые vCPU
+    :param ram_required_gb: Требуемая RAM в ГБ
+    :param min_nodes: Минимальное число нод
+    :param cpu: vCPU типов нод
+    :param ram: RAM типов нод
+    :param price: Цены типов нод
+    :param best_cost: Стоимость начального решения
+    :param best_counts: Число нод каждого типа в начальном решении
+    :return: Кортеж (стоимость, число нод каждого типа)
+    """
+    requirement = np.array([cpu_required, ram_required_gb, min_nodes], dtype=np.float64)
+    # Приведённая стоимость типа относительно оптимума релаксации: у типов оптимума она нулевая
+    vertices = _dual_vertices(cpu, ram, price)
+    dual = vertices[np.argmax(vertices @ requirement)]
+    reduced = price - (cpu * dual[0] + ram * dual[1] + dual[2])
+    order = np.argsort(-reduced, kind='stable')
+    cpu, ram, price = cpu[order], ram[order], price[order]
+    # Вершины релаксации для типов order[level + 1:], по уровню поиска
+    suffix_vertices = [_dual_vertices(cpu[level + 1:], ram[level + 1:], price[level + 1:])
+                       for level in range(len(order) - 1)]
+
+    best = [best_cost, best_counts[order].copy()]
+    chosen = np.zeros(len(order), dtype=np.int64)
+    last = len(order) - 1
+
+    def search(level: int, rest: np.ndarray, cost: float) -> None:
+        limit = max(math.ceil(rest[0] / cpu[level] - _EPSILON), math.ceil(rest[1] / ram[level] - _EPSILON),
+                    math.ceil(rest[2]), 0)
+        if level == last:
+            if cost + limit * price[level] < best[0] - _COST_TOLERANCE:
+                chosen[level] = limit
+                best[0], best[1] = cost + limit * price[level], chosen.copy()
+            return
+
+        counts = np.arange(limit + 1)
+        remaining = np.maximum(rest - counts[:, None] * np.array([cpu[level], ram[level], 1.0]), 0)
+        bounds = cost + counts * price[level] + np.max(remaining @ suffix_vertices[level].T, axis=1)
+        for index in np.argsort(bounds, kind='stable'):
+            if bounds[index] >= best[0] - _COST_TOLERANCE:
+                break
+            chosen[level] = counts[index]
+            chosen[level + 1:] = 0
+            if not remaining[index].any():
+                best[0], best[1] = cost + counts[index] * price[level], chosen.copy()
+                continue
+            search(level + 1, remaining[index], cost + counts[index] * price[level])
+
+    search(0, requirement, 0.0)
+    counts = np.zeros(len(order), dtype=np.int64)
+    counts[order] = best[1]
+    return best[0], counts
+
+
+def recommend_for_k8s(params: Dict[str, Any], result: Dict[str, Any]) -> str:
+    """
+    Формирует рекомендацию по составу worker-нод для результата calculate_k8s_sizing.
+    :param params: Входные параметры расчёта
+    :param result: Результат расчёта (в том числе скорректированный ИИ)
+    :return: Текст рекомендации или пустая строка
+    """
+    if 'total_cpu_required' not in result or 'total_ram_gb_required' not in result:
+        return ''
+
+    min_nodes = 3 if params.get('high_availability', True) else 1
+    plan = optimize(result['total_cpu_required'], result['total_ram_gb_required'], min_nodes,
+                    params.get('avg_cpu_per_pod', 0), params.get('avg_ram_per_pod_gb', 0))
+    if plan is None:
+        return ''
+
+    baseline_cost = result.get('worker_nodes_count', 0) * configs.pricing['kubernetes']['worker_node']
+    lines = ['🧮 Оптимальный состав worker-нод:']
+    for pool in plan.pools:
+        lines.append(f'  • {pool.count} × {pool.flavor} ({pool.cpu} vCPU, {pool.ram_gb} ГБ RAM)')
+    lines.append(f'Итого нод: {plan.nodes}, {plan.cpu} vCPU, {plan.ram_gb} ГБ RAM, {plan.monthly_cost:.2f} RUB/мес')
+    if baseline_cost > plan.monthly_cost:
+        lines.append(f'Экономия относительно стандартных нод: {baseline_cost - plan.monthly_cost:.2f} RUB/мес')
+    return '\n'.join(lines)
@@ -0,0 +1,319 @@
+"""
+Очередь исходящих запросов к Telegram с ограничением скорости.
+
+Отправка сообщений, редактирование, счета и документы проходят через диспетчер, который соблюдает
+лимиты Telegram: общий (configs.outbound['global_rate'] сообщений в секунду) и для каждого чата
+(configs.outbound['chat_rate']), оба - корзины токенов с запасом на короткие всплески.
+Запросы одного чата выполняются строго по очереди, между чатами первыми уходят запросы
+с более высоким приоритетом (платежи раньше меню). На ответ 429 запрос возвращается в начало
+очереди своего чата и повторяется через retry_after секунд; лимит Telegram действует на весь бот,
+поэтому на это время приостанавливаются и остальные чаты.
+
+Вызывающий поток ждёт результат, поэтому функции модуля возвращают то же, что и методы TeleBot.
+"""
+import concurrent.futures
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Any
+
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+import configs
+import metrics
+
+
+PRIORITY_HIGH = 0  # Платежи
+PRIORITY_NORMAL = 1  # Шаги диалога и результаты расчётов
+PRIORITY_LOW = 2  # Меню, справка, прогресс
+
+# Интервал удаления корзин токенов неактивных чатов, секунд
+BUCKET_CLEANUP_INTERVAL = 60
+
+
+class TokenBucket:
+    """
+    Корзина токенов: rate токенов в секунду, не больше capacity.
+    :param rate: Скорость пополнения, токенов в секунду
+    :param capacity: Размер корзины (допустимый всплеск)
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Сколько секунд ждать до появления токена (0 - токен есть).
+        """
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        """
+        Запрещает отправку до момента until (ответ 429 с retry_after).
+        """
+        self.blocked_until = max(self.blocked_until, until)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class OutboundRequest:
+    """
+    Запрос к Telegram в очереди.
+    """
+
+    def __init__(self, chat_id: int, priority: int, func: Callable, args: tuple, kwargs: dict) -> None:
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = next(_sequence)
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = concurrent.futures.Future()
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+_sequence = itertools.count()
+_condition = threading.Condition()
+_pending: Dict[Any, list] = {}  # chat_id -> очередь запросов чата (FIFO)
+_in_flight: set = set()
+_chat_buckets: Dict[Any, TokenBucket] = {}
+_global_bucket: TokenBucket | None = None
+_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_dispatcher: threading.Thread | None = None
+_last_cleanup = 0.0
+_stats = {'sent': 0, 'failed': 0, 'retries': 0, 'dispatched': 0, 'wait_total_ms': 0.0, 'wait_max_ms': 0.0}
+
+
+def start() -> None:
+    """
+    Запускает диспетчер и пул отправляющих потоков (повторный вызов ничего не делает).
+    :return: None
+    """
+    global _global_bucket, _executor, _dispatcher
+    with _condition:
+        if _dispatcher is not None:
+            return
+        _global_bucket = TokenBucket(configs.outbound['global_rate'], configs.outbound['global_burst'])
+        _executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=configs.outbound['senders'], thread_name_prefix='outbound'
+        )
+        _dispatcher = threading.Thread(target=_dispatch_loop, name='outbound-dispatcher', daemon=True)
+        _dispatcher.start()
+
+
+def submit(chat_id: int, func: Callable, /, *args, priority: int = PRIORITY_NORMAL,
+           **kwargs) -> concurrent.futures.Future:
+    """
+    Ставит вызов метода TeleBot в очередь чата.
+    chat_id и func передаются только позиционно, чтобы chat_id= в kwargs доходил до метода бота.
+    :param chat_id: ID чата (определяет очередь и лимит)
+    :param func: Метод бота, например bot.send_message
+    :param priority: Приоритет (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+    :return: concurrent.futures.Future с результатом метода
+    """
+    start()
+    request = OutboundRequest(chat_id, priority, func, args, kwargs)
+    with _condition:
+        _pending.setdefault(chat_id, []).append(request)
+        _condition.notify()
+    return request.future
+
+
+def call(func: Callable, *args, priority: int = PRIORITY_NORMAL, **kwargs) -> Any:
+    """
+    Выполняет метод TeleBot через очередь и возвращает его результат.
+    ID чата берётся из аргумента chat_id или первого позиционного аргумента.
+    :param func: Метод бота
+    :param priority: Приоритет запроса
+    :return: Результат метода
+    """
+    chat_id = kwargs.get('chat_id', args[0] if args else None)
+    return submit(chat_id, func, *args, priority=priority, **kwargs).result()
+
+
+def send_message(bot: TeleBot, *args, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Очередь для bot.send_message, аргументы те же."""
+    return call(bot.send_message, *args, priority=priority, **kwargs)
+
+
+def edit_message_text(bot: TeleBot, *args, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Очередь для bot.edit_message_text, аргументы те же."""
+    return call(bot.edit_message_text, *args, priority=priority, **kwargs)
+
+
+def edit_message_reply_markup(bot: TeleBot, *args, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Очередь для bot.edit_message_reply_markup, аргументы те же."""
+    return call(bot.edit_message_reply_markup, *args, priority=priority, **kwargs)
+
+
+def send_invoice(bot: TeleBot, *args, priority: int = PRIORITY_HIGH, **kwargs):
+    """Очередь для bot.send_invoice, аргументы те же."""
+    return call(bot.send_invoice, *args, priority=priority, **kwargs)
+
+
+def send_document(bot: TeleBot, *args, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Очередь для bot.send_document, аргументы те же."""
+    return call(bot.send_document, *args, priority=priority, **kwargs)
+
+
+def _chat_bucket(chat_id: Any) -> TokenBucket:
+    bucket = _chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = TokenBucket(configs.outbound['chat_rate'], configs.outbound['chat_burst'])
+        _chat_buckets[chat_id] = bucket
+    return bucket
+
+
+def _pick(now: float) -> tuple:
+    """
+    Выбирает следующий запрос: из чатов без запроса в работе и с доступным токеном -
+    с наивысшим приоритетом (при равенстве - самый ранний). Вызывается под _condition.
+    :param now: Текущее время time.monotonic()
+    :return: Кортеж (запрос или None, сколько ждать до следующей проверки или None)
+    """
+    if not _pending:
+        return None, None
+    global_wait = _global_bucket.wait_time(now)
+    if global_wait > 0:
+        return None, global_wait
+
+    best = None
+    min_wait = None
+    for chat_id, queue in _pending.items():
+        if chat_id in _in_flight:
+            continue
+        wait = _chat_bucket(chat_id).wait_time(now)
+        if wait > 0:
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+            continue
+        head = queue[0]
+        if best is None or (head.priority, head.seq) < (best.priority, best.seq):
+            best = head
+
+    if best is None:
+        return None, min_wait
+
+    queue = _pending[best.chat_id]
+    queue.pop(0)
+    if not queue:
+        del _pending[best.chat_id]
+    _global_bucket.take(now)
+    _chat_bucket(best.chat_id).take(now)
+    _in_flight.add(best.chat_id)
+    return best, None
+
+
+def _cleanup_buckets(now: float) -> None:
+    """
+    Удаляет полные корзины чатов без запросов. Вызывается под _condition.
+    """
+    global _last_cleanup
+    if now - _last_cleanup < BUCKET_CLEANUP_INTERVAL:
+        return
+    _last_cleanup = now
+    for chat_id in [chat_id for chat_id, bucket in _chat_buckets.items()
+                    if chat_id not in _pending and chat_id not in _in_flight and bucket.is_idle(now)]:
+        del _chat_buckets[chat_id]
+
+
+def _dispatch_loop() -> None:
+    """
+    Цикл диспетчера: передаёт запросы в пул отправки, как только это позволяют лимиты.
+    :return: None
+    """
+    while True:
+        with _condition:
+            while True:
+                now = time.monotonic()
+                _cleanup_buckets(now)
+                request, wait = _pick(now)
+                if request is not None:
+                    break
+                _condition.wait(timeout=wait)
+            if request.attempts == 0:
+                waited_ms = (now - request.enqueued_at) * 1000
+                _stats['dispatched'] += 1
+                _stats['wait_total_ms'] += waited_ms
+                _stats['wait_max_ms'] = max(_stats['wait_max_ms'], waited_ms)
+        _executor.submit(_execute, request)
+
+
+def _execute(request: OutboundRequest) -> None:
+    """
+    Выполняет запрос; при ответе 429 возвращает его в начало очереди чата.
+    :param request: Запрос
+    :return: None
+    """
+    retry_after = None
+    try:
+        result = request.func(*request.args, **request.kwargs)
+    except ApiTelegramException as error:
+        if error.error_code == 429 and request.attempts < configs.outbound['max_retries']:
+            retry_after = (error.result_json or {}).get('parameters', {}).get('retry_after', 1)
+            logging.warning(f'Telegram 429 для чата {request.chat_id}, повтор через {retry_after} с')
+        else:
+            request.future.set_exception(error)
+    except Exception as error:
+        request.future.set_exception(error)
+    else:
+        request.future.set_result(result)
+
+    with _condition:
+        _in_flight.discard(request.chat_id)
+        if retry_after is not None:
+            request.attempts += 1
+            _stats['retries'] += 1
+            blocked_until = time.monotonic() + retry_after
+            _chat_bucket(request.chat_id).block(blocked_until)
+            _global_bucket.block(blocked_until)
+            _pending.setdefault(request.chat_id, []).insert(0, request)
+        elif request.future.exception() is None:
+            _stats['sent'] += 1
+        else:
+            _stats['failed'] += 1
+        _condition.notify()
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику очереди исходящих запросов.
+    :return: Словарь с глубиной очереди, временем ожидания и счётчиками
+    """
+    with _condition:
+        depth = sum(len(queue) for queue in _pending.values())
+        dispatched = _stats['dispatched']
+        return {
+            'queue_depth': depth,
+            'chats_waiting': len(_pending),
+            'in_flight': len(_in_flight),
+            'sent': _stats['sent'],
+            'failed': _stats['failed'],
+            'retries_429': _stats['retries'],
+            'avg_wait_ms': round(_stats['wait_total_ms'] / dispatched, 2) if dispatched else 0.0,
+            'max_wait_ms': round(_stats['wait_max_ms'], 2),
+        }
+
+
+metrics.register('Исходящие сообщения', get_stats)
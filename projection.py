@@ -0,0 +1,170 @@
+"""
+Прогноз роста на несколько месяцев: сайзинг, моменты ступенчатых изменений (нужен ещё один
+брокер или нода) и накопленная стоимость по configs.pricing.
+
+Каждый параметр растёт по сложному проценту: value(m) = base * (1 + rate) ** m.
+Все месяцы считаются одним пакетным проходом batch_calculators по оси времени.
+"""
+from collections import namedtuple
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import batch_calculators
+import configs
+import sweep
+import utils
+
+
+class ProjectionError(ValueError):
+    """Некорректный запрос прогноза"""
+
+
+ProjectionRequest = namedtuple('ProjectionRequest', ['service', 'base_params', 'growth', 'months', 'as_excel'])
+Projection = namedtuple('Projection', ['timeline', 'steps'])
+
+# Результаты, изменение которых означает покупку или освобождение брокера, ноды, инстанса
+STEP_RESULTS = {
+    'kafka': ('brokers_count',),
+    'kubernetes': ('worker_nodes_count',),
+    'redis': ('total_instances',),
+    'rabbitmq': ('nodes_count',),
+}
+
+
+def _parse_growth(param_name: str, spec: str) -> tuple:
+    """
+    Разбирает значение вида "+5%", "1000+5%" или "2000-1.5%".
+    :param param_name: Название параметра
+    :param spec: Текст значения
+    :return: Кортеж (начальное значение или None, месячный прирост в долях)
+    """
+    body = spec.strip().replace(',', '.')[:-1]
+    split_at = max(body.rfind('+'), body.rfind('-'))
+    if split_at < 0:
+        split_at = 0
+    start, rate = body[:split_at], body[split_at:]
+    try:
+        rate = float(rate)
+    except ValueError:
+        raise ProjectionError(f'{param_name}: не удалось разобрать рост "{spec}"')
+    if not -100 < rate <= configs.forecast_max_growth_percent:
+        raise ProjectionError(f'{param_name}: рост должен быть больше -100% и не больше '
+                              f'{configs.forecast_max_growth_percent}% в месяц')
+    return (start or None), rate / 100
+
+
+def parse_request(text: str) -> ProjectionRequest:
+    """
+    Разбирает команду "/forecast <сервис> [months=N] <параметр>=[значение]+<рост>% ... [<параметр>=<значение>] [xlsx]".
+    :param text: Текст сообщения
+    :return: ProjectionRequest
+    """
+    service_name, options, base_params, growth_specs, flags = utils.parse_scenario_command(
+        text, ProjectionError, lambda spec: spec.endswith('%'), options=('months',)
+    )
+    months = options.get('months', str(configs.forecast_default_months))
+    if not months.isdigit() or not 1 <= int(months) <= configs.forecast_max_months:
+        raise ProjectionError(f'months: укажите число месяцев от 1 до {configs.forecast_max_months}')
+
+    growth = {}
+    for name, spec in growth_specs.items():
+        if utils.get_service_config(service_name)['parameters'][name]['validation']['type'] is bool:
+            raise ProjectionError(f'{name}: для параметра да/нет рост не задаётся')
+        value, growth[name] = _parse_growth(name, spec)
+        if value is None:
+            continue
+        try:
+            base_params[name] = utils.parse_parameter_value(service_name, name, value)
+        except ValueError:
+            raise ProjectionError(f'{name}: некорректное значение "{value}"')
+
+    if not growth:
+        raise ProjectionError('Укажите месячный рост хотя бы для одного параметра')
+    return ProjectionRequest(service_name, base_params, growth, int(months), bool(flags & sweep.EXCEL_FLAGS))
+
+
+def run_projection(service_name: str, base_params: Dict, growth: Dict[str, float], months: int) -> Projection:
+    """
+    Считает сайзинг и стоимость по месяцам.
+    :param service_name: Тип сервиса
+    :param base_params: Значения параметров в первом месяце
+    :param growth: Месячный прирост параметров в долях {параметр: 0.05}
+    :param months: Число месяцев
+    :return: Projection: помесячная таблица и таблица ступенчатых изменений
+    """
+    month_index = np.arange(months)
+    columns = dict(base_params)
+    for name, rate in growth.items():
+        values = base_params[name] * (1 + rate) ** month_index
+        # Рост останавливается на границах параметра (и не переполняет int64 при приведении)
+        validation = utils.get_service_config(service_name)['parameters'][name]['validation']
+        if 'min' in validation:
+            values = np.clip(values, validation['min'], validation['max'])
+        if validation['type'] is int:
+            values = np.round(values).astype(np.int64)
+        else:
+            values = np.round(values, 2)
+        columns[name] = values
+
+    results = batch_calculators.calculate_batch(service_name, columns)
+    costs = batch_calculators.calculate_monthly_cost_batch(service_name, results)
+
+    timeline = pd.DataFrame({'month': month_index + 1})
+    for name in growth:
+        timeline[name] = columns[name]
+    key_results = batch_calculators.KEY_RESULTS[service_name]
+    for field in key_results:
+        timeline[field] = results[field].to_numpy()
+    timeline['monthly_cost_rub'] = costs['total_monthly_rub']
+    timeline['cumulative_cost_rub'] = np.round(np.cumsum(costs['total_monthly_rub']), 2)
+
+    # Ступенчатые изменения: месяцы, в которых меняется число брокеров, нод или инстансов
+    steps = []
+    for field in STEP_RESULTS[service_name]:
+        values = results[field].to_numpy()
+        for position in np.flatnonzero(np.diff(values)) + 1:
+            steps.append({'month': position + 1, 'field': field,
+                          'old_value': values[position - 1], 'new_value': values[position]})
+    steps = pd.DataFrame(steps, columns=['month', 'field', 'old_value', 'new_value']).sort_values('month', kind='stable')
+    return Projection(timeline, steps)
+
+
+def format_summary(request: ProjectionRequest, projection: Projection) -> str:
+    """
+    Форматирует прогноз для сообщения: начало и конец периода, ступенчатые изменения и итоговая стоимость.
+    :param request: Разобранный запрос
+    :param projection: Результат run_projection
+    :return: Текст сообщения
+    """
+    timeline, steps = projection
+    first, last = timeline.iloc[0], timeline.iloc[-1]
+    growth = ', '.join(f'{name} {"+" if rate >= 0 else "-"}{utils.format_number(abs(rate) * 100)}%/мес'
+                       for name, rate in request.growth.items())
+
+    lines = [
+        f'📈 Прогноз на {request.months} мес.: {utils.get_service_config(request.service)["display_name"]}',
+        f'Рост: {growth}',
+        '',
+        f'Показатель: месяц 1 → месяц {request.months}',
+    ]
+    for field in list(request.growth) + list(batch_calculators.KEY_RESULTS[request.service]):
+        lines.append(f'🔸 {field}: {utils.format_number(first[field])} → {utils.format_number(last[field])}')
+    lines.append(f'🔸 Стоимость в месяц: {first["monthly_cost_rub"]:.2f} → {last["monthly_cost_rub"]:.2f} RUB')
+    lines.append(f'💰 Накопленная стоимость: {last["cumulative_cost_rub"]:.2f} RUB')
+
+    for name in request.growth:
+        validation = utils.get_service_config(request.service)['parameters'][name]['validation']
+        if 'min' in validation and timeline[name].isin([validation['min'], validation['max']]).iloc[1:].any():
+            lines.append(f'⚠️ {name} упирается в допустимый диапазон {validation["min"]}..{validation["max"]}, '
+                         f'дальше значение не меняется')
+
+    if len(steps):
+        lines.append('')
+        lines.append('Ступенчатые изменения:')
+        for step in steps.head(configs.forecast_text_steps).itertuples(index=False):
+            lines.append(f'  • месяц {step.month}: {step.field} {step.old_value} → {step.new_value}')
+        if len(steps) > configs.forecast_text_steps:
+            lines.append(f'  … ещё {len(steps) - configs.forecast_text_steps}, полная таблица: добавьте к команде xlsx')
+    return '\n'.join(lines)
@@ -0,0 +1,193 @@
+"""
+Маршрутизация сообщений и callback-запросов через таблицы со словарным поиском.
+
+Вместо цепочки фильтров TeleBot (каждый лямбда-фильтр проверяется по очереди для каждого обновления)
+обновление разбирается один раз и обработчик находится по ключу:
+- текст сообщения (кнопки меню, названия сервисов и их синонимы из configs.sizing_keywords) -> TextRoute;
+- FSM-состояние пользователя ("KafkaSizing:messages_per_sec") -> StateRoute;
+- callback_data -> CallbackRoute(action, service, param, value): сначала точное совпадение
+  (custom_*, back_from_*, back_*, skip_conditions), затем префикс до последнего "_"
+  для кнопок со значением (range_<param>_<value>, pay_calc_<id>, calc_page_<direction>_<id>).
+
+Кнопки клавиатуры (меню и названия сервисов) проверяются раньше FSM-состояния, а набранные
+вручную синонимы (help, меню, kafka) - после него: во время ввода параметра или дополнительных
+условий такое слово считается ответом, а не командой.
+
+Таблицы строятся из configs.SERVICE_CONFIGS функцией rebuild().
+"""
+from collections import namedtuple
+from typing import Callable, Dict, Tuple, Optional
+
+import configs
+import utils
+
+
+TextRoute = namedtuple('TextRoute', ['action', 'service'])
+StateRoute = namedtuple('StateRoute', ['action', 'service', 'param'])
+CallbackRoute = namedtuple('CallbackRoute', ['action', 'service', 'param', 'value'])
+
+# Кнопки главного меню -> действие
+MENU_TEXTS = {
+    '💰 история платежей': 'payments_history',
+    '📊 история расчётов': 'calculations_history',
+    '📤 экспорт в excel': 'export_excel',
+    'ℹ️ помощь': 'help',
+}
+
+_button_table: Dict[str, TextRoute] = {}
+_text_table: Dict[str, TextRoute] = {}
+_state_table: Dict[str, StateRoute] = {}
+_callback_table: Dict[str, CallbackRoute] = {}
+_callback_prefixes: Dict[str, CallbackRoute] = {}
+
+_message_handlers: Dict[str, Callable] = {}
+_callback_handlers: Dict[str, Callable] = {}
+
+
+def message_route(action: str) -> Callable:
+    """
+    Декоратор: регистрирует обработчик сообщения для действия.
+    Обработчик вызывается как handler(message, route).
+    :param action: Действие из TextRoute/StateRoute
+    :return: Декоратор
+    """
+    def decorator(handler: Callable) -> Callable:
+        _message_handlers[action] = handler
+        return handler
+    return decorator
+
+
+def callback_route(action: str) -> Callable:
+    """
+    Декоратор: регистрирует обработчик callback-запроса для действия.
+    Обработчик вызывается как handler(call, route).
+    :param action: Действие из CallbackRoute
+    :return: Декоратор
+    """
+    def decorator(handler: Callable) -> Callable:
+        _callback_handlers[action] = handler
+        return handler
+    return decorator
+
+
+def _param_owner(param_name: str) -> str | None:
+    """
+    Сервис, которому принадлежит параметр (None, если параметр есть у нескольких сервисов).
+    """
+    owners = [name for name, config in configs.SERVICE_CONFIGS.items() if param_name in config['parameters']]
+    return owners[0] if len(owners) == 1 else None
+
+
+def rebuild() -> None:
+    """
+    Перестраивает таблицы маршрутов по configs.SERVICE_CONFIGS и configs.sizing_keywords.
+    Новые таблицы подменяют старые целиком, поэтому параллельные обработчики видят либо старые, либо новые.
+    :return: None
+    """
+    global _button_table, _text_table, _state_table, _callback_table, _callback_prefixes
+
+    button_table = {text: TextRoute(action, None) for text, action in MENU_TEXTS.items()}
+    text_table = dict(button_table)
+    for text in configs.help_list:
+        text_table[text.lower()] = TextRoute('help', None)
+    for text in configs.menu_list:
+        text_table[text.lower()] = TextRoute('menu', None)
+
+    state_table = {}
+    callback_table = {
+        'skip_conditions': CallbackRoute('skip_conditions', None, 'additional_conditions', None),
+        'custom_conditions': CallbackRoute('custom', None, 'conditions', None),
+        'back_from_additional_conditions': CallbackRoute('back_from', None, 'additional_conditions', None),
+    }
+    callback_prefixes = {
+        'pay_calc': CallbackRoute('pay', None, None, None),
+    }
+    # Листание истории: действие page_newer/page_older, параметр - вид истории, значение - курсор
+    for history in ('calc_page', 'pay_page'):
+        for direction in ('newer', 'older'):
+            callback_prefixes[f'{history}_{direction}'] = CallbackRoute(f'page_{direction}', None, history, None)
+
+    for service_name, service_config in configs.SERVICE_CONFIGS.items():
+        button_table[service_config['display_name'].lower()] = TextRoute('service', service_name)
+        text_table[service_config['display_name'].lower()] = TextRoute('service', service_name)
+        text_table[service_name.lower()] = TextRoute('service', service_name)
+        for keyword in configs.sizing_keywords.get(service_name, []):
+            text_table[keyword.lower()] = TextRoute('service', service_name)
+
+        conditions_state = utils.get_state_enum(service_name, 'additional_conditions')
+        if conditions_state is not None:
+            state_table[conditions_state.name] = StateRoute('conditions', service_name, 'additional_conditions')
+
+        for param_name in service_config['parameters']:
+            state = utils.get_state_enum(service_name, param_name)
+            if state is not None:
+                state_table[state.name] = StateRoute('parameter', service_name, param_name)
+
+            owner = _param_owner(param_name)
+            callback_table[f'custom_{param_name}'] = CallbackRoute('custom', owner, param_name, None)
+            callback_table[f'back_from_{param_name}'] = CallbackRoute('back_from', owner, param_name, None)
+            callback_table[f'back_{param_name}'] = CallbackRoute('back', owner, param_name, None)
+            callback_prefixes[f'range_{param_name}'] = CallbackRoute('range', owner, param_name, None)
+
+    _button_table, _text_table, _state_table = button_table, text_table, state_table
+    _callback_table, _callback_prefixes = callback_table, callback_prefixes
+
+
+def resolve_text(text: str | None, buttons_only: bool = False) -> Tuple[Optional[Callable], Optional[TextRoute]]:
+    """
+    Находит обработчик по тексту сообщения.
+    :param text: Текст сообщения
+    :param buttons_only: Искать только кнопки клавиатуры, без синонимов
+    :return: Кортеж (обработчик, маршрут) или (None, None)
+    """
+    if not text:
+        return None, None
+    route = (_button_table if buttons_only else _text_table).get(text.strip().lower())
+    if route is None:
+        return None, None
+    return _message_handlers.get(route.action), route
+
+
+def resolve_state(state: str | None) -> Tuple[Optional[Callable], Optional[StateRoute]]:
+    """
+    Находит обработчик по FSM-состоянию пользователя.
+    :param state: Имя состояния (например, "KafkaSizing:messages_per_sec")
+    :return: Кортеж (обработчик, маршрут) или (None, None)
+    """
+    route = _state_table.get(str(state)) if state else None
+    if route is None:
+        return None, None
+    return _message_handlers.get(route.action), route
+
+
+def parse_callback(data: str | None) -> CallbackRoute | None:
+    """
+    Разбирает callback_data в CallbackRoute.
+    :param data: callback_data кнопки
+    :return: Маршрут или None для неизвестной кнопки
+    """
+    if not data:
+        return None
+    route = _callback_table.get(data)
+    if route is not None:
+        return route
+    prefix, _, value = data.rpartition('_')
+    route = _callback_prefixes.get(prefix)
+    if route is None or not value:
+        return None
+    return route._replace(value=value)
+
+
+def resolve_callback(data: str | None) -> Tuple[Optional[Callable], Optional[CallbackRoute]]:
+    """
+    Находит обработчик callback-запроса.
+    :param data: callback_data кнопки
+    :return: Кортеж (обработчик, маршрут) или (None, None)
+    """
+    route = parse_callback(data)
+    if route is None:
+        return None, None
+    return _callback_handlers.get(route.action), route
+
+
+rebuild()
@@ -0,0 +1,127 @@
+"""
+Расчёт стека из нескольких сервисов (например, Kafka + Kubernetes + Redis + RabbitMQ) в одном диалоге.
+
+Параметры сервисов вводятся подряд, дополнительные условия - один раз на весь стек.
+Калькуляторы считают все сервисы сразу, а корректировка ИИ выполняется одним запросом на весь
+стек, поэтому ответ приходит за время одного запроса к ИИ, а не их суммы.
+Расчёты сервисов стека сохраняются одной группой (общий group_id).
+"""
+import uuid
+from typing import Dict, Any, List
+
+import calculation_cache
+import calculators
+import configs
+import node_optimizer
+import payment_calculator
+import utils
+
+
+# Тип сервиса, под которым стек передаётся в ai_processor и ai_cache
+STACK_SERVICE = 'stack'
+
+
+class StackError(ValueError):
+    """Некорректный запрос расчёта стека"""
+
+
+def parse_services(text: str) -> List[str]:
+    """
+    Разбирает команду "/stack [<сервис> <сервис> ...]". Без аргументов в стек входят все сервисы.
+    :param text: Текст сообщения с командой
+    :return: Сервисы стека в порядке перечисления, без повторов
+    """
+    aliases = utils.get_index().service_aliases
+    tokens = text.split()[1:]
+    unknown = [token for token in tokens if token.lower() not in aliases]
+    if unknown:
+        raise StackError(f'Неизвестные сервисы: {", ".join(unknown)}')
+
+    services = list(dict.fromkeys(aliases[token.lower()] for token in tokens)) or list(configs.SERVICE_CONFIGS)
+    if len(services) < 2:
+        raise StackError('В стеке должно быть не меньше двух сервисов')
+    return services
+
+
+def format_services(services: List[str]) -> str:
+    """Перечисляет сервисы стека через плюс"""
+    return ' + '.join(utils.get_service_config(service)['display_name'] for service in services)
+
+
+def next_service(services: List[str], service_name: str) -> str | None:
+    """
+    Возвращает сервис, параметры которого вводятся после service_name.
+    :param services: Сервисы стека
+    :param service_name: Текущий сервис
+    :return: Следующий сервис или None для последнего
+    """
+    position = services.index(service_name) + 1
+    return services[position] if position < len(services) else None
+
+
+def service_params(service_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Выбирает из данных состояния параметры сервиса.
+    :param service_name: Тип сервиса
+    :param data: Данные состояния пользователя
+    :return: {параметр: значение}
+    """
+    return {name: data[name] for name in utils.get_ordered_parameters(service_name) if name in data}
+
+
+def calculate(stack_params: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Считает базовые результаты всех сервисов стека.
+    :param stack_params: {сервис: входные параметры}
+    :return: {сервис: результат калькулятора}
+    """
+    return {service_name: calculation_cache.calculate(service_name, params).result
+            for service_name, params in stack_params.items()}
+
+
+def format_result(stack_params: Dict[str, Dict[str, Any]], results: Dict[str, Dict[str, Any]],
+                  ai_comment: str = None) -> str:
+    """
+    Форматирует результаты всех сервисов стека в одно сообщение.
+    :param stack_params: {сервис: входные параметры}
+    :param results: {сервис: результат (в том числе скорректированный ИИ)}
+    :param ai_comment: Комментарий ИИ ко всему стеку
+    :return: Текст сообщения
+    """
+    sections = [f'🧱 Стек: {format_services(list(results))}']
+    for service_name, result in results.items():
+        text = calculators.format_result(service_name, result).strip()
+        if service_name == 'kubernetes':
+            node_plan_text = node_optimizer.recommend_for_k8s(stack_params[service_name], result)
+            if node_plan_text:
+                text = f'{text}\n{node_plan_text}'
+        sections.append(text)
+    if ai_comment:
+        sections.append(f'🤖 Корректировки ИИ:\n{ai_comment}')
+    return '\n\n'.join(sections)
+
+
+def calculate_cost(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Считает месячную стоимость стека в формате payment_calculator.calculate_monthly_cost.
+    :param results: {сервис: результат}
+    :return: Словарь с компонентами всех сервисов и общей стоимостью
+    """
+    services, components, total = [], {}, 0.0
+    for service_name, result in results.items():
+        cost_details = payment_calculator.calculate_monthly_cost(service_name, result)
+        services.append(cost_details['service'])
+        for component, price in cost_details['components'].items():
+            components[f'{cost_details["service"]}: {component}'] = price
+        total += cost_details['total_monthly_rub']
+    return {
+        'service': ' + '.join(services),
+        'components': components,
+        'total_monthly_rub': round(total, 2),
+        'currency': 'RUB'
+    }
+
+
+def new_group_id() -> uuid.UUID:
+    """Создаёт идентификатор группы расчётов стека"""
+    return uuid.uuid4()
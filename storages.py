@@ -0,0 +1,451 @@
+"""
+Хранилища FSM-состояний бота.
+
+StateExpiringMemoryStorage - хранилище в памяти процесса, которое удаляет сессии, простаивающие
+дольше configs.session_idle_ttl секунд (при обращении и фоновым потоком), и запоминает удалённые,
+чтобы вернувшийся пользователь получил уведомление об истёкшей сессии.
+
+StatePostgresStorage хранит состояние и данные retrieve_data() в таблице bot_states, поэтому
+незавершённый расчёт переживает перезапуск, а несколько процессов бота могут обслуживать
+одних и тех же пользователей. У каждой записи есть срок жизни (configs.state_ttl), который
+продлевается при каждой записи; истёкшая запись хранится ещё configs.session_expired_notice_ttl
+секунд, чтобы вернувшийся пользователь получил уведомление об истёкшей сессии. Выход из блока
+retrieve_data() записывает только изменённые ключи одним UPDATE (data || изменения - удалённые
+ключи), поэтому параллельные обработчики одного пользователя не затирают чужие изменения.
+"""
+import copy
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Union, Dict, Any, List
+
+import psycopg
+from telebot.storage import StateStorageBase, StateMemoryStorage
+
+import configs
+import database_async
+import metrics
+
+
+def _approx_size(value: Any) -> int:
+    """
+    Приблизительный объём памяти, занимаемый значением вместе с вложенными объектами.
+    :param value: Значение
+    :return: Размер в байтах
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(key) + _approx_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_approx_size(item) for item in value)
+    return size
+
+
+class StateExpiringMemoryStorage(StateMemoryStorage):
+    """
+    Хранилище состояний в памяти с удалением простаивающих сессий.
+    :param idle_ttl: Время простоя в секундах, после которого сессия удаляется
+    :param sweep_interval: Интервал фоновой очистки в секундах
+    :param notice_ttl: Сколько секунд помнить удалённую сессию для уведомления пользователя
+    """
+
+    def __init__(self, idle_ttl: int, sweep_interval: int, notice_ttl: int,
+                 separator: str = ':', prefix: str = 'telebot') -> None:
+        super().__init__(separator=separator, prefix=prefix)
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.notice_ttl = notice_ttl
+        self._last_activity: Dict[str, float] = {}
+        # Ключ удалённой по простою сессии -> время удаления
+        self._expired: OrderedDict = OrderedDict()
+        self._expired_total = 0
+        self._lock = threading.RLock()
+        self._sweeper: threading.Thread | None = None
+
+    def _key(self, chat_id: int, user_id: int, business_connection_id: Optional[str] = None,
+             message_thread_id: Optional[int] = None, bot_id: Optional[int] = None) -> str:
+        return self._get_key(chat_id, user_id, self.prefix, self.separator,
+                             business_connection_id, message_thread_id, bot_id)
+
+    def _evict(self, key: str, now: float) -> None:
+        self.data.pop(key, None)
+        self._last_activity.pop(key, None)
+        self._expired[key] = now
+        self._expired.move_to_end(key)
+        self._expired_total += 1
+
+    def _expire_if_idle(self, key: str) -> None:
+        """
+        Удаляет сессию, если она простаивает дольше idle_ttl, и продлевает её иначе.
+        """
+        if key not in self.data:
+            return
+        now = time.monotonic()
+        if now - self._last_activity.get(key, now) > self.idle_ttl:
+            self._evict(key, now)
+        else:
+            self._last_activity[key] = now
+
+    def set_state(self, chat_id: int, user_id: int, state: str,
+                  business_connection_id: Optional[str] = None,
+                  message_thread_id: Optional[int] = None,
+                  bot_id: Optional[int] = None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        with self._lock:
+            self._expire_if_idle(key)
+            # Пользователь начал новый диалог - уведомление о старой сессии больше не нужно
+            self._expired.pop(key, None)
+            self._last_activity[key] = time.monotonic()
+            return super().set_state(chat_id, user_id, state, business_connection_id, message_thread_id, bot_id)
+
+    def get_state(self, chat_id: int, user_id: int,
+                  business_connection_id: Optional[str] = None,
+                  message_thread_id: Optional[int] = None,
+                  bot_id: Optional[int] = None) -> Union[str, None]:
+        with self._lock:
+            self._expire_if_idle(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+            return super().get_state(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    def delete_state(self, chat_id: int, user_id: int,
+                     business_connection_id: Optional[str] = None,
+                     message_thread_id: Optional[int] = None,
+                     bot_id: Optional[int] = None) -> bool:
+        with self._lock:
+            self._last_activity.pop(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id), None)
+            return super().delete_state(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    def set_data(self, chat_id: int, user_id: int, key: str, value: Union[str, int, float, dict],
+                 business_connection_id: Optional[str] = None,
+                 message_thread_id: Optional[int] = None,
+                 bot_id: Optional[int] = None) -> bool:
+        with self._lock:
+            self._expire_if_idle(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+            return super().set_data(chat_id, user_id, key, value, business_connection_id, message_thread_id, bot_id)
+
+    def get_data(self, chat_id: int, user_id: int,
+                 business_connection_id: Optional[str] = None,
+                 message_thread_id: Optional[int] = None,
+                 bot_id: Optional[int] = None) -> dict:
+        with self._lock:
+            self._expire_if_idle(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+            return super().get_data(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    def reset_data(self, chat_id: int, user_id: int,
+                   business_connection_id: Optional[str] = None,
+                   message_thread_id: Optional[int] = None,
+                   bot_id: Optional[int] = None) -> bool:
+        with self._lock:
+            self._expire_if_idle(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+            return super().reset_data(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    def save(self, chat_id: int, user_id: int, data: dict,
+             business_connection_id: Optional[str] = None,
+             message_thread_id: Optional[int] = None,
+             bot_id: Optional[int] = None) -> bool:
+        with self._lock:
+            return super().save(chat_id, user_id, data, business_connection_id, message_thread_id, bot_id)
+
+    def pop_expired(self, chat_id: int, user_id: int, bot_id: Optional[int] = None) -> bool:
+        """
+        Проверяет, была ли сессия пользователя удалена по простою (и забывает об этом).
+        :param chat_id: ID чата
+        :param user_id: ID пользователя
+        :param bot_id: ID бота (часть ключа, как у остальных методов)
+        :return: True если сессия истекла и пользователь об этом ещё не уведомлён
+        """
+        with self._lock:
+            return self._expired.pop(self._key(chat_id, user_id, bot_id=bot_id), None) is not None
+
+    def sweep(self) -> int:
+        """
+        Удаляет все простаивающие сессии и устаревшие записи для уведомлений.
+        :return: Количество удалённых сессий
+        """
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, last in self._last_activity.items() if now - last > self.idle_ttl]
+            for key in idle:
+                self._evict(key, now)
+            while self._expired and now - next(iter(self._expired.values())) > self.notice_ttl:
+                self._expired.popitem(last=False)
+        if idle:
+            logging.info(f'Удалено простаивающих сессий: {len(idle)}')
+        return len(idle)
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as error:
+                logging.error(f'Ошибка очистки сессий: {error}', exc_info=True)
+
+    def start_sweeper(self) -> None:
+        """
+        Запускает фоновый поток очистки сессий (повторный вызов ничего не делает).
+        :return: None
+        """
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='session-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает число живых сессий и приблизительный занимаемый ими объём памяти.
+        :return: Словарь со статистикой
+        """
+        with self._lock:
+            approx_bytes = sum(_approx_size(key) + _approx_size(value) for key, value in self.data.items())
+            return {
+                'live': len(self.data),
+                'approx_bytes': approx_bytes,
+                'expired_total': self._expired_total,
+                'pending_notices': len(self._expired),
+            }
+
+
+class StatePostgresDataContext:
+    """
+    Контекст retrieve_data() для StatePostgresStorage: отдаёт копию данных
+    и при выходе атомарно применяет к записи только сделанные изменения.
+    """
+
+    def __init__(self, storage: 'StatePostgresStorage', key: str) -> None:
+        self.storage = storage
+        self.key = key
+        self.original = storage._get_data_by_key(key)
+        self.data = copy.deepcopy(self.original)
+
+    def __enter__(self) -> dict:
+        return self.data
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        changed = {
+            name: value for name, value in self.data.items()
+            if name not in self.original or self.original[name] != value
+        }
+        removed = [name for name in self.original if name not in self.data]
+        if changed or removed:
+            self.storage._merge_data(self.key, changed, removed)
+
+
+class StatePostgresStorage(StateStorageBase):
+    """
+    Хранилище состояний в PostgreSQL (таблица bot_states) с TTL записей.
+    :param ttl: Время жизни записи в секундах с момента последнего изменения
+    :param notice_ttl: Сколько секунд хранить истёкшую запись для уведомления пользователя
+    :param separator: Разделитель частей ключа
+    :param prefix: Префикс ключа
+    """
+
+    # Интервал удаления истёкших записей, секунд
+    PURGE_INTERVAL = 600
+
+    def __init__(self, ttl: int, notice_ttl: int, separator: str = ':', prefix: str = 'telebot') -> None:
+        super().__init__()
+        self.ttl = ttl
+        self.notice_ttl = notice_ttl
+        self.separator = separator
+        self.prefix = prefix
+        self._last_purge = 0.0
+
+    def _key(self, chat_id: int, user_id: int, business_connection_id: Optional[str] = None,
+             message_thread_id: Optional[int] = None, bot_id: Optional[int] = None) -> str:
+        return self._get_key(chat_id, user_id, self.prefix, self.separator,
+                             business_connection_id, message_thread_id, bot_id)
+
+    def _execute(self, query: str, params: tuple) -> int:
+        """
+        Выполняет изменяющий запрос.
+        :return: Количество затронутых строк (0 при ошибке БД)
+        """
+        async def execute() -> int:
+            async with database_async.db_connection() as conn:
+                cursor = await conn.execute(query, params)
+                return cursor.rowcount
+
+        try:
+            return database_async.run_sync(execute())
+        except psycopg.Error as error:
+            logging.error(f'Ошибка записи состояния: {error}')
+            return 0
+
+    def _fetch_one(self, query: str, params: tuple) -> tuple | None:
+        try:
+            return database_async.run_sync(database_async.fetch_one(query, params))
+        except psycopg.Error as error:
+            logging.error(f'Ошибка чтения состояния: {error}')
+            return None
+
+    def _purge_expired(self) -> None:
+        """
+        Периодически удаляет записи, истёкшие больше notice_ttl секунд назад, не дожидаясь результата.
+        Более свежие истёкшие записи остаются для pop_expired().
+        :return: None
+        """
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+
+        async def purge() -> None:
+            try:
+                async with database_async.db_connection() as conn:
+                    await conn.execute(
+                        'DELETE FROM bot_states WHERE expires_at <= CURRENT_TIMESTAMP - make_interval(secs => %s)',
+                        (self.notice_ttl,)
+                    )
+            except psycopg.Error as error:
+                logging.error(f'Ошибка очистки истёкших состояний: {error}')
+
+        database_async.submit(purge())
+
+    def set_state(self, chat_id: int, user_id: int, state: str,
+                  business_connection_id: Optional[str] = None,
+                  message_thread_id: Optional[int] = None,
+                  bot_id: Optional[int] = None) -> bool:
+        if hasattr(state, 'name'):
+            state = state.name
+        self._purge_expired()
+        # Истёкшая запись начинается заново, с пустыми данными
+        self._execute(
+            """
+            INSERT INTO bot_states (key, state, data, expires_at)
+            VALUES (%s, %s, '{}'::jsonb, CURRENT_TIMESTAMP + make_interval(secs => %s))
+            ON CONFLICT (key) DO UPDATE
+            SET state = EXCLUDED.state,
+                data = CASE WHEN bot_states.expires_at > CURRENT_TIMESTAMP
+                            THEN bot_states.data ELSE '{}'::jsonb END,
+                expires_at = EXCLUDED.expires_at
+            """,
+            (self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id), state, self.ttl)
+        )
+        return True
+
+    def get_state(self, chat_id: int, user_id: int,
+                  business_connection_id: Optional[str] = None,
+                  message_thread_id: Optional[int] = None,
+                  bot_id: Optional[int] = None) -> Union[str, None]:
+        result = self._fetch_one(
+            'SELECT state FROM bot_states WHERE key = %s AND expires_at > CURRENT_TIMESTAMP',
+            (self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id),)
+        )
+        return result[0] if result else None
+
+    def delete_state(self, chat_id: int, user_id: int,
+                     business_connection_id: Optional[str] = None,
+                     message_thread_id: Optional[int] = None,
+                     bot_id: Optional[int] = None) -> bool:
+        return self._execute(
+            'DELETE FROM bot_states WHERE key = %s AND expires_at > CURRENT_TIMESTAMP',
+            (self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id),)
+        ) > 0
+
+    def set_data(self, chat_id: int, user_id: int, key: str, value: Union[str, int, float, dict],
+                 business_connection_id: Optional[str] = None,
+                 message_thread_id: Optional[int] = None,
+                 bot_id: Optional[int] = None) -> bool:
+        _key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        if not self._merge_data(_key, {key: value}, []):
+            raise RuntimeError(f'StatePostgresStorage: key {_key} does not exist.')
+        return True
+
+    def get_data(self, chat_id: int, user_id: int,
+                 business_connection_id: Optional[str] = None,
+                 message_thread_id: Optional[int] = None,
+                 bot_id: Optional[int] = None) -> dict:
+        return self._get_data_by_key(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+
+    def reset_data(self, chat_id: int, user_id: int,
+                   business_connection_id: Optional[str] = None,
+                   message_thread_id: Optional[int] = None,
+                   bot_id: Optional[int] = None) -> bool:
+        return self._execute(
+            """
+            UPDATE bot_states SET data = '{}'::jsonb, expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            WHERE key = %s AND expires_at > CURRENT_TIMESTAMP
+            """,
+            (self.ttl, self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        ) > 0
+
+    def get_interactive_data(self, chat_id: int, user_id: int,
+                             business_connection_id: Optional[str] = None,
+                             message_thread_id: Optional[int] = None,
+                             bot_id: Optional[int] = None) -> StatePostgresDataContext:
+        return StatePostgresDataContext(
+            self, self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        )
+
+    def save(self, chat_id: int, user_id: int, data: dict,
+             business_connection_id: Optional[str] = None,
+             message_thread_id: Optional[int] = None,
+             bot_id: Optional[int] = None) -> bool:
+        return self._execute(
+            """
+            UPDATE bot_states SET data = %s, expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            WHERE key = %s AND expires_at > CURRENT_TIMESTAMP
+            """,
+            (json.dumps(data), self.ttl, self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        ) > 0
+
+    def _get_data_by_key(self, key: str) -> dict:
+        result = self._fetch_one(
+            'SELECT data FROM bot_states WHERE key = %s AND expires_at > CURRENT_TIMESTAMP',
+            (key,)
+        )
+        return result[0] if result else {}
+
+    def _merge_data(self, key: str, changed: Dict[str, Any], removed: List[str]) -> bool:
+        """
+        Атомарно применяет изменения к данным записи и продлевает её срок жизни.
+        :param key: Ключ записи
+        :param changed: Новые и изменённые ключи данных
+        :param removed: Удалённые ключи данных
+        :return: True если запись существует
+        """
+        return self._execute(
+            """
+            UPDATE bot_states
+            SET data = (data || %s::jsonb) - %s::text[],
+                expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            WHERE key = %s AND expires_at > CURRENT_TIMESTAMP
+            """,
+            (json.dumps(changed), removed, self.ttl, key)
+        ) > 0
+
+    def pop_expired(self, chat_id: int, user_id: int, bot_id: Optional[int] = None) -> bool:
+        """
+        Проверяет, истёк ли срок жизни сессии пользователя, и удаляет истёкшую запись.
+        :param chat_id: ID чата
+        :param user_id: ID пользователя
+        :param bot_id: ID бота (часть ключа, как у остальных методов)
+        :return: True если сессия истекла и пользователь об этом ещё не уведомлён
+        """
+        return self._execute(
+            'DELETE FROM bot_states WHERE key = %s AND expires_at <= CURRENT_TIMESTAMP',
+            (self._key(chat_id, user_id, bot_id=bot_id),)
+        ) > 0
+
+    def __str__(self) -> str:
+        return f'<StatePostgresStorage: ttl={self.ttl}, notice_ttl={self.notice_ttl}>'
+
+
+def create_state_storage() -> StateStorageBase:
+    """
+    Создаёт хранилище состояний по configs.state_storage_backend.
+    :return: StateExpiringMemoryStorage ('memory') или StatePostgresStorage ('postgres')
+    """
+    if configs.state_storage_backend == 'postgres':
+        return StatePostgresStorage(ttl=configs.state_ttl, notice_ttl=configs.session_expired_notice_ttl)
+    if configs.state_storage_backend != 'memory':
+        logging.error(f'Неизвестное хранилище состояний {configs.state_storage_backend}, используется memory')
+    storage = StateExpiringMemoryStorage(
+        idle_ttl=configs.session_idle_ttl,
+        sweep_interval=configs.session_sweep_interval,
+        notice_ttl=configs.session_expired_notice_ttl
+    )
+    metrics.register('Сессии', storage.get_stats)
+    return storage
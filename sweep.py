@@ -0,0 +1,165 @@
+"""
+Анализ чувствительности (sweep): как меняются ключевые результаты расчёта и стоимость
+при изменении одного или двух входных параметров.
+
+Вся сетка значений считается одним пакетным проходом batch_calculators, поэтому даже
+configs.sweep_max_points точек укладываются в десятки миллисекунд.
+"""
+from collections import namedtuple
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+import batch_calculators
+import configs
+import utils
+
+
+class SweepError(ValueError):
+    """Некорректный запрос анализа чувствительности"""
+
+
+SweepAxis = namedtuple('SweepAxis', ['param', 'values'])
+SweepRequest = namedtuple('SweepRequest', ['service', 'base_params', 'axes', 'as_excel'])
+
+EXCEL_FLAGS = {'xlsx', 'excel'}
+
+
+def _parse_number(token: str, base_value: float) -> float:
+    """
+    Разбирает границу диапазона: число или множитель базового значения ("0.5x").
+    :param token: Текст границы
+    :param base_value: Базовое значение параметра
+    :return: Значение
+    """
+    token = token.strip().lower().replace(',', '.')
+    if token.endswith(('x', 'х')):
+        return float(token[:-1]) * base_value
+    return float(token)
+
+
+def _axis_size(spec: str) -> int:
+    """
+    Число точек диапазона по его записи, без построения массива значений.
+    :param spec: Текст диапазона
+    :return: Число шагов или элементов списка
+    """
+    if '..' in spec:
+        steps = spec.partition(':')[2].strip()
+        return int(steps) if steps.isdigit() else configs.sweep_default_steps
+    return spec.count(';') + 1
+
+
+def parse_axis(service_name: str, param_name: str, spec: str, base_value: float) -> SweepAxis:
+    """
+    Разбирает диапазон значений параметра.
+    Форматы: "100..10000" (configs.sweep_default_steps шагов), "100..10000:50", "0.5x..10x", "100;500;1000".
+    :param service_name: Тип сервиса
+    :param param_name: Название параметра
+    :param spec: Текст диапазона
+    :param base_value: Базовое значение параметра (для множителей)
+    :return: SweepAxis
+    """
+    param_config = utils.get_service_config(service_name)['parameters'][param_name]
+    validation = param_config['validation']
+    if validation['type'] is bool:
+        raise SweepError(f'{param_name}: параметр да/нет нельзя варьировать, задайте его значение')
+
+    try:
+        if '..' in spec:
+            bounds, _, steps = spec.partition(':')
+            start, _, stop = bounds.partition('..')
+            steps = int(steps) if steps else configs.sweep_default_steps
+            if not 2 <= steps <= configs.sweep_max_points:
+                raise SweepError(f'{param_name}: число шагов должно быть от 2 до {configs.sweep_max_points}')
+            values = np.linspace(_parse_number(start, base_value), _parse_number(stop, base_value), steps)
+        else:
+            values = np.array([_parse_number(token, base_value) for token in spec.split(';')])
+    except ValueError as error:
+        if isinstance(error, SweepError):
+            raise
+        raise SweepError(f'{param_name}: не удалось разобрать диапазон "{spec}"')
+
+    # Границы проверяются до приведения к int64, иначе огромные значения переполняются
+    if 'min' in validation and (values.min() < validation['min'] or values.max() > validation['max']):
+        raise SweepError(f'{param_name}: значения должны быть в диапазоне {validation["min"]}..{validation["max"]}')
+
+    if validation['type'] is int:
+        values = np.round(values).astype(np.int64)
+    else:
+        values = np.round(values, 2)
+    values = np.unique(values)
+    return SweepAxis(param_name, values)
+
+
+def parse_request(text: str) -> SweepRequest:
+    """
+    Разбирает команду "/sweep <сервис> <параметр>=<диапазон> [<параметр>=<диапазон>] [<параметр>=<значение>] [xlsx]".
+    :param text: Текст сообщения
+    :return: SweepRequest
+    """
+    service_name, _, base_params, ranges, flags = utils.parse_scenario_command(
+        text, SweepError, lambda spec: '..' in spec or ';' in spec
+    )
+    if not 1 <= len(ranges) <= 2:
+        raise SweepError('Укажите диапазон для одного или двух параметров')
+
+    # Размер сетки проверяется по записи диапазонов, до построения массивов значений
+    points = 1
+    for spec in ranges.values():
+        points *= _axis_size(spec)
+    if points > configs.sweep_max_points:
+        raise SweepError(f'Слишком большая сетка: {points} точек, максимум {configs.sweep_max_points}')
+
+    axes = [parse_axis(service_name, name, spec, base_params[name]) for name, spec in ranges.items()]
+    return SweepRequest(service_name, base_params, axes, bool(flags & EXCEL_FLAGS))
+
+
+def run_sweep(service_name: str, base_params: Dict[str, Any], axes: List[SweepAxis]) -> pd.DataFrame:
+    """
+    Считает результаты и стоимость для всех точек сетки одним пакетным проходом.
+    :param service_name: Тип сервиса
+    :param base_params: Значения остальных параметров
+    :param axes: Варьируемые параметры (один или два)
+    :return: DataFrame: варьируемые параметры, ключевые результаты и месячная стоимость
+    """
+    grids = np.meshgrid(*[axis.values for axis in axes], indexing='ij')
+    columns = dict(base_params)
+    columns.update({axis.param: grid.ravel() for axis, grid in zip(axes, grids)})
+
+    results = batch_calculators.calculate_batch(service_name, columns)
+    costs = batch_calculators.calculate_monthly_cost_batch(service_name, results)
+
+    frame = pd.DataFrame({axis.param: grid.ravel() for axis, grid in zip(axes, grids)})
+    for field in batch_calculators.KEY_RESULTS[service_name]:
+        frame[field] = results[field].to_numpy()
+    frame['total_monthly_rub'] = costs['total_monthly_rub']
+    return frame
+
+
+def format_table(request: SweepRequest, frame: pd.DataFrame) -> str:
+    """
+    Форматирует результаты в моноширинную таблицу (HTML для Telegram).
+    Если точек больше configs.sweep_text_rows, показываются равномерно выбранные строки.
+    :param request: Разобранный запрос
+    :param frame: Результат run_sweep
+    :return: Текст сообщения
+    """
+    shown = frame
+    if len(frame) > configs.sweep_text_rows:
+        rows = np.unique(np.linspace(0, len(frame) - 1, configs.sweep_text_rows).round().astype(int))
+        shown = frame.iloc[rows]
+
+    table = shown.to_string(index=False, float_format=utils.format_number)
+    fixed = [f'{name}={value}' for name, value in request.base_params.items()
+             if name not in {axis.param for axis in request.axes}]
+
+    lines = [
+        f'📐 Анализ чувствительности: {utils.get_service_config(request.service)["display_name"]}',
+        f'Фиксированные параметры: {", ".join(fixed)}' if fixed else '',
+        f'<pre>{table}</pre>',
+    ]
+    if len(shown) < len(frame):
+        lines.append(f'Показано {len(shown)} из {len(frame)} строк. Полная таблица: добавьте к команде xlsx.')
+    return '\n'.join(line for line in lines if line)
@@ -1,8 +1,118 @@
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Any, Callable
+
 from telebot import TeleBot
 
+import batch_calculators
 import configs
 import classes
 import keyboards
+import outbound
+
+
+# Неизменяемый индекс SERVICE_CONFIGS. Строится один раз при импорте и целиком заменяется
+# в rebuild_index(), поэтому читающие потоки всегда видят согласованную версию.
+ConfigIndex = namedtuple('ConfigIndex', [
+    'ordered_params',   # service -> кортеж параметров в порядке order
+    'next_params',      # (service, param) -> следующий параметр
+    'prev_params',      # (service, param) -> предыдущий параметр
+    'states',           # (service, param) -> состояние TeleBot (включая additional_conditions)
+    'state_routes',     # имя состояния -> (service, param)
+    'validators',       # (service, param) -> функция разбора введённого текста
+    'service_aliases',  # название или синоним сервиса в нижнем регистре -> service
+])
+
+
+def _make_validator(param_config: dict):
+    """
+    Создаёт функцию разбора и проверки значения параметра.
+    :param param_config: Конфигурация параметра из SERVICE_CONFIGS
+    :return: Функция text -> значение, бросающая ValueError при ошибке
+    """
+    # Кастомный парсер (например, для boolean)
+    if 'custom_parse' in param_config:
+        return param_config['custom_parse']
+
+    validation = param_config['validation']
+    value_type = validation['type']
+    bounds = (validation['min'], validation['max']) if 'min' in validation and 'max' in validation else None
+    error = validation.get('error')
+
+    def validate(text: str):
+        value = value_type(text)
+        # Проверка диапазона (если есть)
+        if bounds is not None and (value < bounds[0] or value > bounds[1]):
+            raise ValueError(error)
+        return value
+
+    return validate
+
+
+def build_index(service_configs: dict) -> ConfigIndex:
+    """
+    Строит индекс навигации по параметрам сервисов.
+    :param service_configs: Словарь конфигураций сервисов (формат configs.SERVICE_CONFIGS)
+    :return: ConfigIndex
+    """
+    ordered_params, next_params, prev_params = {}, {}, {}
+    states, state_routes, validators, service_aliases = {}, {}, {}, {}
+
+    for service_name, service_config in service_configs.items():
+        service_aliases[service_name.lower()] = service_name
+        for keyword in configs.sizing_keywords.get(service_name, []):
+            service_aliases[keyword.lower()] = service_name
+
+        parameters = service_config.get('parameters', {})
+        params = tuple(sorted(parameters, key=lambda name: parameters[name]['order']))
+        ordered_params[service_name] = params
+
+        for position, param_name in enumerate(params):
+            next_params[service_name, param_name] = (
+                params[position + 1] if position < len(params) - 1 else 'additional_conditions'
+            )
+            prev_params[service_name, param_name] = params[position - 1] if position > 0 else None
+            validators[service_name, param_name] = _make_validator(parameters[param_name])
+        prev_params[service_name, 'additional_conditions'] = params[-1] if params else None
+
+        # 'classes.KafkaSizing' -> classes.KafkaSizing
+        state_group_name = service_config.get('state_group') or ''
+        state_group = getattr(classes, state_group_name.rpartition('.')[2], None)
+        if state_group is None:
+            continue
+        for param_name in params + ('additional_conditions',):
+            state = getattr(state_group, param_name, None)
+            if state is not None:
+                states[service_name, param_name] = state
+                state_routes[state.name] = (service_name, param_name)
+
+    return ConfigIndex(
+        ordered_params=MappingProxyType(ordered_params),
+        next_params=MappingProxyType(next_params),
+        prev_params=MappingProxyType(prev_params),
+        states=MappingProxyType(states),
+        state_routes=MappingProxyType(state_routes),
+        validators=MappingProxyType(validators),
+        service_aliases=MappingProxyType(service_aliases),
+    )
+
+
+_index = build_index(configs.SERVICE_CONFIGS)
+
+
+def rebuild_index() -> ConfigIndex:
+    """
+    Перестраивает индекс по текущему configs.SERVICE_CONFIGS и атомарно подменяет его.
+    :return: Новый ConfigIndex
+    """
+    global _index
+    _index = build_index(configs.SERVICE_CONFIGS)
+    return _index
+
+
+def get_index() -> ConfigIndex:
+    """Возвращает текущий индекс конфигурации сервисов"""
+    return _index
 
 
 def get_service_config(service_name: str) -> dict:
@@ -10,75 +120,30 @@ def get_service_config(service_name: str) -> dict:
     return configs.SERVICE_CONFIGS.get(service_name, {})
 
 
-def get_ordered_parameters(service_name: str) -> list:
+def get_ordered_parameters(service_name: str) -> tuple:
     """Возвращает параметры сервиса в порядке их следования"""
-    config = get_service_config(service_name)
-    if not config or 'parameters' not in config:
-        return []
-
-    params = config['parameters']
-    return sorted(params.keys(), key=lambda x: params[x]['order'])
+    return _index.ordered_params.get(service_name, ())
 
 
 def get_state_enum(service_name: str, param_name: str):
     """Получает enum состояния по имени сервиса и параметра"""
-    config = get_service_config(service_name)
-    state_group_name = config.get('state_group')
-
-    # Мапинг state groups
-    state_groups = {
-        'classes.KafkaSizing': classes.KafkaSizing,
-        'classes.K8sSizing': classes.K8sSizing,
-        'classes.RedisSizing': classes.RedisSizing,
-        'classes.RabbitMQSizing': classes.RabbitMQSizing
-    }
-
-    state_group = state_groups.get(state_group_name)
-    if not state_group:
-        return None
-
-    # Получаем состояние по имени параметра
-    return getattr(state_group, param_name, None)
+    return _index.states.get((service_name, param_name))
 
 
 def get_service_by_state(state_str: str) -> tuple:
     """Определяет сервис и параметр по строковому представлению состояния"""
-    # Парсим строку типа "KafkaSizing:messages_per_sec"
-    for service_name, service_config in configs.SERVICE_CONFIGS.items():
-        state_group = service_config.get('state_group')
-        if state_str.startswith(state_group):
-            # Извлекаем имя параметра из состояния
-            param_name = state_str.split(':')[-1] if ':' in state_str else None
-            return service_name, param_name
-    return None, None
+    # Строка вида "KafkaSizing:messages_per_sec"
+    return _index.state_routes.get(state_str, (None, None))
 
 
 def get_next_parameter(service_name: str, current_param: str) -> str:
     """Возвращает следующий параметр в последовательности"""
-    params = get_ordered_parameters(service_name)
-    try:
-        current_index = params.index(current_param)
-        if current_index < len(params) - 1:
-            return params[current_index + 1]
-    except (ValueError, IndexError):
-        pass
-    return 'additional_conditions'
+    return _index.next_params.get((service_name, current_param), 'additional_conditions')
 
 
 def get_prev_parameter(service_name: str, current_param: str) -> str:
     """Возвращает предыдущий параметр в последовательности"""
-    if current_param == 'additional_conditions':
-        params = get_ordered_parameters(service_name)
-        return params[-1] if params else None
-
-    params = get_ordered_parameters(service_name)
-    try:
-        current_index = params.index(current_param)
-        if current_index > 0:
-            return params[current_index - 1]
-    except (ValueError, IndexError):
-        pass
-    return None
+    return _index.prev_params.get((service_name, current_param))
 
 
 def format_summary(service_name: str, data: dict, up_to_param: str = None) -> str:
@@ -112,8 +177,7 @@ def show_parameter_screen(bot: TeleBot, service_name: str, chat_id: int, message
     param_config = config['parameters'][param_name]
 
     # Формируем сводку предыдущих параметров
-    params = get_ordered_parameters(service_name)
-    prev_param = params[params.index(param_name) - 1] if params.index(param_name) > 0 else None
+    prev_param = get_prev_parameter(service_name, param_name)
     summary = format_summary(service_name, data, prev_param)
 
     text = summary + param_config['text']
@@ -121,7 +185,8 @@ def show_parameter_screen(bot: TeleBot, service_name: str, chat_id: int, message
 
     if edit:
         try:
-            bot.edit_message_text(
+            outbound.edit_message_text(
+                bot,
                 chat_id=chat_id,
                 message_id=message_id,
                 text=text,
@@ -132,30 +197,82 @@ def show_parameter_screen(bot: TeleBot, service_name: str, chat_id: int, message
             pass
 
     # Если редактирование не удалось или edit=False, отправляем новое
-    msg = bot.send_message(chat_id=chat_id, text=text, reply_markup=markup)
+    msg = outbound.send_message(bot, chat_id=chat_id, text=text, reply_markup=markup)
     return msg.message_id
 
 
 def parse_parameter_value(service_name: str, param_name: str, text: str):
     """Парсит и валидирует введённое значение параметра"""
-    config = get_service_config(service_name)
-    if not config or param_name not in config['parameters']:
+    validator = _index.validators.get((service_name, param_name))
+    if validator is None:
         raise ValueError("Unknown parameter")
-
-    param_config = config['parameters'][param_name]
-    validation = param_config['validation']
-
-    # Кастомный парсер (например, для boolean)
-    if 'custom_parse' in param_config:
-        return param_config['custom_parse'](text)
-
-    # Стандартная валидация
-    value_type = validation['type']
-    value = value_type(text)
-
-    # Проверка диапазона (если есть)
-    if 'min' in validation and 'max' in validation:
-        if value < validation['min'] or value > validation['max']:
-            raise ValueError(validation['error'])
-
-    return value
\ No newline at end of file
+    return validator(text)
+
+
+def parse_command_arguments(text: str) -> tuple:
+    """
+    Разбирает аргументы команды вида "/sweep kafka messages_per_sec=0.5x..10x xlsx".
+    :param text: Текст сообщения с командой
+    :return: Кортеж (сервис или None, {параметр: текст значения}, множество флагов)
+    """
+    service_name, assignments, flags = None, {}, set()
+    for token in text.split()[1:]:
+        name, separator, value = token.partition('=')
+        if separator:
+            assignments[name.strip().lower()] = value.strip()
+        elif service_name is None and token.lower() in _index.service_aliases:
+            service_name = _index.service_aliases[token.lower()]
+        else:
+            flags.add(token.lower())
+    return service_name, assignments, flags
+
+
+def parse_scenario_command(text: str, error: type, is_variable: Callable[[str], bool], options: tuple = ()) -> tuple:
+    """
+    Разбирает команды сценариев (/sweep, /forecast, /montecarlo) вида
+    "<команда> <сервис> [<опция>=N] <параметр>=<значение> ... [флаги]".
+    Фиксированные значения проверяются теми же валидаторами, что и ввод в диалоге,
+    и подставляются поверх значений по умолчанию batch_calculators.DEFAULTS.
+    :param text: Текст сообщения с командой
+    :param error: Класс исключения для ошибок разбора
+    :param is_variable: Возвращает True для текста переменного значения (диапазон, рост, распределение)
+    :param options: Названия служебных аргументов команды (months, samples, seed)
+    :return: Кортеж (сервис, {опция: текст}, параметры расчёта, {параметр: текст переменного значения}, флаги)
+    """
+    service_name, assignments, flags = parse_command_arguments(text)
+    if service_name is None:
+        raise error('Не указан сервис')
+    command_options = {name: assignments.pop(name) for name in options if name in assignments}
+
+    parameters = get_ordered_parameters(service_name)
+    unknown = [name for name in assignments if name not in parameters]
+    if unknown:
+        raise error(f'Неизвестные параметры {", ".join(unknown)}. Доступны: {", ".join(parameters)}')
+
+    base_params = dict(batch_calculators.DEFAULTS[service_name])
+    variable = {}
+    for name, spec in assignments.items():
+        if is_variable(spec):
+            variable[name] = spec
+            continue
+        try:
+            base_params[name] = parse_parameter_value(service_name, name, spec)
+        except ValueError:
+            raise error(f'{name}: некорректное значение "{spec}"')
+    return service_name, command_options, base_params, variable, flags
+
+
+def normalize_value(value: Any) -> Any:
+    """
+    Приводит целые float к int, чтобы 10 и 10.0 давали один ключ кэша.
+    :param value: Значение параметра
+    :return: Нормализованное значение
+    """
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def format_number(value) -> str:
+    """Форматирует число без лишних нулей после запятой"""
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
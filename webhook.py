@@ -0,0 +1,131 @@
+"""
+Режим webhook: встроенный HTTP-сервер aiohttp принимает Update от Telegram
+и передаёт их в обработчики TeleBot через process_new_updates.
+
+Запрос без правильного секретного токена (заголовок X-Telegram-Bot-Api-Secret-Token) отклоняется.
+Передача в process_new_updates выполняется в пуле потоков, не больше configs.webhook['max_concurrency']
+одновременно. Обработчики выполняются в полосах LanedTeleBot (lanes.py): process_new_updates
+ставит обновление в очередь полосы и блокируется, только если она заполнена, - тогда запросы
+ждут, а Telegram не присылает новые, пока не получит ответ (не больше max_connections параллельных запросов).
+"""
+import asyncio
+import concurrent.futures
+import hmac
+import json
+import logging
+from typing import Dict, Any
+
+from aiohttp import web
+from telebot import TeleBot, types
+
+import configs
+import metrics
+
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+_stats = {'received': 0, 'rejected': 0, 'failed': 0, 'in_flight': 0}
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    """
+    Принимает Update от Telegram, проверяет секретный токен и обрабатывает его.
+    :param request: HTTP-запрос aiohttp
+    :return: HTTP-ответ
+    """
+    secret = request.headers.get(SECRET_HEADER, '')
+    if not hmac.compare_digest(secret.encode(), configs.webhook['secret_token'].encode()):
+        _stats['rejected'] += 1
+        logging.warning(f'Webhook: запрос с неверным секретным токеном от {request.remote}')
+        return web.Response(status=403)
+
+    try:
+        update = types.Update.de_json(await request.text())
+    except (ValueError, json.JSONDecodeError) as error:
+        _stats['rejected'] += 1
+        logging.error(f'Webhook: некорректное тело запроса: {error}')
+        return web.Response(status=400)
+
+    _stats['received'] += 1
+    app = request.app
+    async with app['semaphore']:
+        _stats['in_flight'] += 1
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                app['executor'], app['bot'].process_new_updates, [update]
+            )
+        except Exception as error:
+            # Ошибка обработки не должна приводить к повторной доставке того же Update
+            _stats['failed'] += 1
+            logging.error(f'Webhook: ошибка обработки обновления {update.update_id}: {error}', exc_info=True)
+        finally:
+            _stats['in_flight'] -= 1
+    return web.Response()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    """
+    Проверка работоспособности для балансировщика нагрузки.
+    :param request: HTTP-запрос aiohttp
+    :return: HTTP-ответ
+    """
+    return web.Response(text='ok')
+
+
+def create_app(bot: TeleBot) -> web.Application:
+    """
+    Создаёт приложение aiohttp с маршрутами webhook и проверки работоспособности.
+    :param bot: Объект бота
+    :return: Приложение aiohttp
+    """
+    app = web.Application(client_max_size=configs.webhook['max_body_size'])
+    app['bot'] = bot
+    app['semaphore'] = asyncio.Semaphore(configs.webhook['max_concurrency'])
+    app['executor'] = concurrent.futures.ThreadPoolExecutor(
+        max_workers=configs.webhook['max_concurrency'], thread_name_prefix='webhook'
+    )
+    app.router.add_post(configs.webhook['path'], handle_update)
+    app.router.add_get('/healthz', handle_health)
+
+    async def shutdown_executor(application: web.Application) -> None:
+        application['executor'].shutdown(wait=True)
+
+    app.on_cleanup.append(shutdown_executor)
+    return app
+
+
+def run_webhook(bot: TeleBot) -> None:
+    """
+    Регистрирует webhook в Telegram и запускает HTTP-сервер (блокирует поток до остановки).
+    :param bot: Объект бота
+    :return: None
+    """
+    if not configs.webhook['secret_token']:
+        raise ValueError('Для режима webhook нужно задать configs.webhook["secret_token"]')
+
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=configs.webhook['url'].rstrip('/') + configs.webhook['path'],
+        secret_token=configs.webhook['secret_token'],
+        max_connections=configs.webhook['max_connections'],
+        drop_pending_updates=False
+    )
+    logging.info(f'Webhook зарегистрирован: {configs.webhook["url"]}{configs.webhook["path"]}')
+
+    web.run_app(
+        create_app(bot),
+        host=configs.webhook['listen_host'],
+        port=configs.webhook['listen_port'],
+        print=None
+    )
+
+
+def get_stats() -> Dict[str, Any]:
+    """
+    Возвращает статистику обработки webhook.
+    :return: Словарь со счётчиками запросов
+    """
+    return dict(_stats)
+
+
+metrics.register('Webhook', get_stats)